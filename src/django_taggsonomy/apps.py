@@ -7,3 +7,4 @@ class TaggsonomyConfig(AppConfig):
     def ready(self):
         # register signals
         from . import signals
+        signals.connect_all_model_receivers()
@@ -0,0 +1,45 @@
+from django.conf import settings
+
+
+DEFAULTS = {
+    # Maximum number of tags the autocomplete view returns per request.
+    'AUTOCOMPLETE_LIMIT': 20,
+    # Alias of the cache holding version tokens for process-local caches.
+    # It must be shared by all processes for them to notice each other's
+    # changes.
+    'CACHE': 'default',
+    # How to query the tag hierarchy: 'closure' uses the materialized closure
+    # table, 'cte' walks the inclusion relation with recursive queries.
+    'HIERARCHY': 'closure',
+    # Alias of the cache to keep the fragments rendered by the `tags` and
+    # `active_tags` templatetags in (None to not cache them).
+    'FRAGMENT_CACHE': None,
+    # Labels of the models ('app_label.ModelName') to keep in-memory tag
+    # indexes for, and the number of seconds after which those (and the
+    # suggestion index) are rebuilt (None for never).
+    'INDEXED_MODELS': (),
+    'INDEX_TTL': 300,
+    # Maximum number of tag names and IDs to keep in the process-local lookup
+    # cache (0 to disable it), and whether to share lookups among processes
+    # through the above cache.
+    'LOOKUP_CACHE_SIZE': 1000,
+    'LOOKUP_SHARED': False,
+    # Whether to suggest tags from a process-local index of their names
+    # instead of querying the database.
+    'SUGGESTION_INDEX': False,
+    # Labels of models ('app_label.ModelName') to treat as taggable, besides
+    # those inheriting from TaggableMixin or registered in code.
+    'TAGGABLE_MODELS': (),
+}
+
+
+def get_setting(name):
+    """
+    Return the value of the setting `TAGGSONOMY_<name>` from the project's
+    settings, falling back to taggsonomy's default.
+    """
+    return getattr(settings, 'TAGGSONOMY_{}'.format(name), DEFAULTS[name])
+
+
+def uses_closure_table():
+    return get_setting('HIERARCHY') == 'closure'
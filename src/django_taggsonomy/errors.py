@@ -1,7 +1,20 @@
 class TaggsonomyError(Exception):
     pass
 
-class MutualExclusionError(TaggsonomyError):
+class ExclusionPairsError(TaggsonomyError):
+    """
+    Base class for errors caused by pairs of mutually exclusive tags
+
+    The offending pairs, if known, are available as the `pairs` attribute.
+    """
+
+    def __init__(self, pairs=()):
+        self.pairs = set(pairs)
+        super().__init__(', '.join(sorted(
+            '{} excludes {}'.format(*pair) for pair in self.pairs
+        )))
+
+class MutualExclusionError(ExclusionPairsError):
     pass
 
 class NoSuchTagError(TaggsonomyError):
@@ -22,8 +35,14 @@ class CommonSubtagExclusionError(TaggsonomyError):
 class SupertagAdditionWouldRemoveExcludedError(TaggsonomyError):
     pass
 
-class MutuallyExclusiveSupertagsError(TaggsonomyError):
+class MutuallyExclusiveSupertagsError(ExclusionPairsError):
     pass
 
 class TagTypeError(TaggsonomyError):
     pass
+
+class TagExpressionError(TaggsonomyError):
+    pass
+
+class UnindexedModelError(TaggsonomyError):
+    pass
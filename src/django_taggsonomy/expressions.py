@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Boolean tag expressions, such as `(Python OR Rust) AND NOT Deprecated`
+
+Tags are referred to by name or, if the name consists of the digits 0-9 only,
+by ID. Names containing whitespace, parentheses or quotes, or which are also
+keywords or consist of other digits, must be enclosed in double quotes, e.g.
+`"Web Development"`, with any double quotes or backslashes in them escaped by
+a backslash.
+The keywords `AND`, `OR` and `NOT` (in order of increasing precedence) are
+case-insensitive and parentheses may be used for grouping.
+
+Expressions are parsed into trees of tuples:
+- `('name', <tag name>)` or `('id', <tag ID>)` for tag references,
+- `('not', <tree>)`,
+- `('and', (<tree>, <tree>, …))` and `('or', (<tree>, <tree>, …))`.
+"""
+import re
+from functools import lru_cache
+
+from .errors import NoSuchTagError, TagExpressionError
+from .lookup import lookup_version
+
+
+KEYWORDS = ('AND', 'OR', 'NOT')
+ID_PATTERN = re.compile(r'[0-9]+')
+TOKEN_PATTERN = re.compile(r'''
+    \s*(?:
+        (?P<parenthesis>[()])
+        | "(?P<quoted>(?:[^"\\]|\\.)*)"
+        | (?P<word>[^\s()"]+)
+        | (?P<invalid>\S)
+    )
+''', re.VERBOSE)
+
+
+def tokenize(expression):
+    """
+    Return a list of (kind, value, position) tuples for the tokens in the
+    given expression, where kind is one of the KEYWORDS, '(', ')' or 'tag'
+    and the value of a tag token is its tree.
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(expression.rstrip()):
+        position = match.start(match.lastgroup)
+        if match.group('parenthesis'):
+            tokens.append((match.group('parenthesis'), None, position))
+        elif match.group('quoted') is not None:
+            name = re.sub(r'\\(.)', r'\1', match.group('quoted'))
+            tokens.append(('tag', ('name', name), position))
+        elif match.group('word'):
+            word = match.group('word')
+            if word.upper() in KEYWORDS:
+                tokens.append((word.upper(), None, position))
+            elif ID_PATTERN.fullmatch(word):
+                tokens.append(('tag', ('id', int(word)), position))
+            elif word.isdigit():
+                # e.g. superscripts, which `int` rejects
+                raise TagExpressionError(
+                    'Invalid tag ID {!r} at position {}'.format(word, position)
+                )
+            else:
+                tokens.append(('tag', ('name', word), position))
+        else:
+            raise TagExpressionError(
+                'Unexpected {!r} at position {}'.format(
+                    match.group('invalid'), position
+                )
+            )
+    return tokens
+
+
+class Parser(object):
+    """
+    Recursive descent parser for tag expressions
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = tokenize(expression)
+        self.position = 0
+
+    def error(self):
+        if self.position < len(self.tokens):
+            kind, _, position = self.tokens[self.position]
+            message = 'Unexpected {!r} at position {}'.format(
+                self.expression[position:].split()[0] if kind == 'tag'
+                else kind,
+                position
+            )
+        else:
+            message = 'Unexpected end of expression'
+        return TagExpressionError(message)
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][0]
+
+    def take(self, kind):
+        if self.peek() != kind:
+            raise self.error()
+        self.position += 1
+        return self.tokens[self.position - 1][1]
+
+    def parse(self):
+        tree = self.parse_or()
+        if self.peek() is not None:
+            raise self.error()
+        return tree
+
+    def parse_or(self):
+        operands = [self.parse_and()]
+        while self.peek() == 'OR':
+            self.take('OR')
+            operands.append(self.parse_and())
+        return operands[0] if len(operands) == 1 else ('or', tuple(operands))
+
+    def parse_and(self):
+        operands = [self.parse_not()]
+        while self.peek() == 'AND':
+            self.take('AND')
+            operands.append(self.parse_not())
+        return operands[0] if len(operands) == 1 else ('and', tuple(operands))
+
+    def parse_not(self):
+        if self.peek() == 'NOT':
+            self.take('NOT')
+            return ('not', self.parse_not())
+        elif self.peek() == '(':
+            self.take('(')
+            tree = self.parse_or()
+            self.take(')')
+            return tree
+        return self.take('tag')
+
+
+def parse(expression):
+    """
+    Return the tree of the given tag expression.
+
+    raises TagExpressionError if the expression is malformed
+    """
+    return Parser(expression).parse()
+
+
+def normalize(tree):
+    """
+    Return an equivalent, canonical version of the given tree, with nested
+    ANDs and ORs flattened, their operands deduplicated and sorted and double
+    negations removed.
+    """
+    operator = tree[0]
+    if operator == 'not':
+        operand = normalize(tree[1])
+        return operand[1] if operand[0] == 'not' else ('not', operand)
+    elif operator in ('and', 'or'):
+        operands = set()
+        for operand in map(normalize, tree[1]):
+            if operand[0] == operator:
+                operands.update(operand[1])
+            else:
+                operands.add(operand)
+        if len(operands) == 1:
+            return operands.pop()
+        return (operator, tuple(sorted(operands, key=to_string)))
+    return tree
+
+
+def to_string(tree):
+    """
+    Return the given tree as a tag expression.
+    """
+    operator = tree[0]
+    if operator == 'name':
+        return '"{}"'.format(re.sub(r'(["\\])', r'\\\1', tree[1]))
+    elif operator == 'id':
+        return str(tree[1])
+    elif operator == 'not':
+        operand = to_string(tree[1])
+        return 'NOT ' + (
+            '({})'.format(operand) if tree[1][0] in ('and', 'or') else operand
+        )
+    operands = [
+        '({})'.format(to_string(operand))
+        if operator == 'and' and operand[0] == 'or' else to_string(operand)
+        for operand in tree[1]
+    ]
+    return ' {} '.format(operator.upper()).join(operands)
+
+
+def _get_references(tree, kind):
+    if tree[0] == kind:
+        yield tree[1]
+    elif tree[0] == 'not':
+        yield from _get_references(tree[1], kind)
+    elif tree[0] in ('and', 'or'):
+        for operand in tree[1]:
+            yield from _get_references(operand, kind)
+
+
+def _resolve(tree, tags_by_name):
+    if tree[0] == 'name':
+        return ('id', tags_by_name[tree[1]].id)
+    elif tree[0] == 'not':
+        return ('not', _resolve(tree[1], tags_by_name))
+    elif tree[0] in ('and', 'or'):
+        return (tree[0], tuple(_resolve(operand, tags_by_name)
+                               for operand in tree[1]))
+    return tree
+
+
+@lru_cache(maxsize=256)
+def _compile_normalized(expression, version):
+    from .models import Tag
+    tree = parse(expression)
+    names = set(_get_references(tree, 'name'))
+    tags_by_name = Tag.objects.in_bulk(names, field_name='name')
+    ids = set(_get_references(tree, 'id'))
+    if names - tags_by_name.keys() or ids - Tag.objects.in_bulk(ids).keys():
+        raise NoSuchTagError
+    return _resolve(tree, tags_by_name)
+
+
+def compile_expression(expression):
+    """
+    Return the plan for the given tag expression, i.e. its normalized tree
+    with all tags referred to by ID.
+
+    Plans are cached, keyed by the normalized expression and the version of
+    the tag lookups (cf. `django_taggsonomy.lookup`), so that saving or
+    deleting any tag outdates them in all processes.
+
+    raises TagExpressionError if the expression is malformed and
+    NoSuchTagError if it refers to a nonexisting tag
+    """
+    expression = to_string(normalize(parse(expression)))
+    if lookup_version.is_pending():
+        # Plans referring to uncommitted tags must not be kept.
+        return _compile_normalized.__wrapped__(expression, None)
+    return _compile_normalized(expression, lookup_version.get())
+
+
+def clear_plan_cache():
+    _compile_normalized.cache_clear()
+
+
+def get_condition(plan, get_tagged):
+    """
+    Return a Q object for the given plan, using the function `get_tagged`,
+    which takes a tag ID, to build the condition for each tag.
+
+    Any other objects supporting `&`, `|` and `~`, such as the bitmaps of
+    `django_taggsonomy.index`, may be combined just the same.
+    """
+    if plan[0] == 'id':
+        return get_tagged(plan[1])
+    elif plan[0] == 'not':
+        return ~get_condition(plan[1], get_tagged)
+    conditions = [get_condition(operand, get_tagged) for operand in plan[1]]
+    condition = conditions.pop()
+    for other_condition in conditions:
+        condition = (condition & other_condition if plan[0] == 'and'
+                     else condition | other_condition)
+    return condition
@@ -2,38 +2,71 @@
 from django import forms
 from django.core.exceptions import ValidationError
 
-from .errors import TaggsonomyError
+from .errors import (CircularInclusionError, CommonSubtagExclusionError,
+                     MutualExclusionError, MutuallyExclusiveSupertagsError,
+                     SelfExclusionError, SimultaneousInclusionExclusionError)
 from .models import Tag
 
 
+RELATION_ERROR_MESSAGES = {
+    CircularInclusionError:
+        'Including %(name)s would make a tag include itself',
+    CommonSubtagExclusionError:
+        'Cannot exclude %(name)s, which has a subtag in common with this tag',
+    MutualExclusionError:
+        'Cannot exclude %(name)s, which is in a tag set with this tag',
+    MutuallyExclusiveSupertagsError:
+        'Cannot include %(name)s, as some of the supertags would exclude '
+        'each other',
+    SelfExclusionError:
+        'A tag cannot exclude itself',
+    SimultaneousInclusionExclusionError:
+        'Cannot both include and exclude %(name)s',
+}
+
+
 class TagsField(forms.CharField):
 
+    # Tags by name, resolved in advance for all fields of a form at once (cf.
+    # `TagForm.full_clean`)
+    tags_by_name = None
+
+    @staticmethod
+    def get_names(value):
+        """
+        Return the set of tag names in the given (raw) field value.
+        """
+        if not value:
+            return set()
+        return {name.strip() for name in value.split(',')}
+
     def to_python(self, value):
         """
         Turn the field value into a set of tags.
 
-        The field value is presumed to be a comma-separated list of tag names.
+        The field value is presumed to be a comma-separated list of tag names,
+        which are all resolved with a single query, unless the form has
+        resolved them already.
 
         Raises ValidationErrors for tag names without existing tags.
         """
-        if not value:
+        names = self.get_names(value)
+        if not names:
             return set()
-        names = {name.strip() for name in value.split(',')}
-        errors, tags = [], set()
-        for name in names:
-            try:
-                tags.add(Tag.objects.get(name=name))
-            except Tag.DoesNotExist:
-                errors.append(
-                    ValidationError(
-                        'No such Tag: %(name)s',
-                        code='nosuchtag',
-                        params={'name': name}
-                    )
-                )
+        tags_by_name = self.tags_by_name
+        if tags_by_name is None:
+            tags_by_name = Tag.objects.in_bulk(names, field_name='name')
+        errors = [
+            ValidationError(
+                'No such Tag: %(name)s',
+                code='nosuchtag',
+                params={'name': name}
+            )
+            for name in sorted(names) if name not in tags_by_name
+        ]
         if errors:
             raise ValidationError(errors)
-        return tags
+        return {tags_by_name[name] for name in names}
 
 
 class TagForm(forms.ModelForm):
@@ -42,36 +75,57 @@ class TagForm(forms.ModelForm):
     subtags = TagsField(required=False)
     supertags = TagsField(required=False)
 
+    # Keyword arguments of `TagManager.apply_relations` by field name
+    relations = {
+        'exclusions': 'add_exclusions',
+        'subtags': 'add_subtags',
+        'supertags': 'add_supertags',
+    }
+
     class Meta(object):
         fields = ('name', 'color')
         model = Tag
 
-    def _add_subtags(self):
-        for subtag in self.cleaned_data.get('subtags'):
-            try:
-                self.instance.include(subtag)
-            except TaggsonomyError:
-                # TODO: implement some error handling here
-                pass
-
-    def _add_supertags(self):
-        for supertag in self.cleaned_data.get('supertags'):
-            try:
-                supertag.include(self.instance)
-            except TaggsonomyError:
-                # TODO: implement some error handling here
-                pass
-
-    def _exclude_tags(self):
-        for tag in self.cleaned_data.get('exclusions'):
-            try:
-                self.instance.exclude(tag)
-            except TaggsonomyError:
-                # TODO: implement some error handling here
-                pass
-
-    def save(self, *args, **kwargs):
-        self._add_subtags()
-        self._add_supertags()
-        self._exclude_tags()
-        return super().save(*args, **kwargs)
+    def full_clean(self):
+        # Resolve the tag names of all TagsFields with a single query.
+        if self.is_bound:
+            tags_fields = {name: field for name, field in self.fields.items()
+                           if isinstance(field, TagsField)}
+            names = set()
+            for name, field in tags_fields.items():
+                names |= field.get_names(self[name].data)
+            tags_by_name = (Tag.objects.in_bulk(names, field_name='name')
+                            if names else {})
+            for field in tags_fields.values():
+                field.tags_by_name = tags_by_name
+        super().full_clean()
+
+    def _get_relation_changes(self):
+        return {
+            relation: self.cleaned_data.get(field_name) or ()
+            for field_name, relation in self.relations.items()
+        }
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for relation, tag, error in Tag.objects.check_relations(
+                self.instance, **self._get_relation_changes()):
+            field_name = next(field_name for field_name, other_relation
+                              in self.relations.items()
+                              if other_relation == relation)
+            self.add_error(field_name, ValidationError(
+                RELATION_ERROR_MESSAGES.get(
+                    type(error), 'Invalid relation to %(name)s'
+                ),
+                code=type(error).__name__,
+                params={'name': tag}
+            ))
+        return cleaned_data
+
+    def _save_m2m(self):
+        super()._save_m2m()
+        # The tag must have been saved before its relations can be changed.
+        # Changes that have become invalid since the form was cleaned (due to
+        # concurrent edits) are skipped.
+        Tag.objects.apply_relations(self.instance,
+                                    **self._get_relation_changes())
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in cache of the HTML fragments rendered by the `tags` and `active_tags`
+templatetags, in the cache named by the `TAGGSONOMY_FRAGMENT_CACHE` setting
+
+The tags of an object hardly ever change, but are rendered on every view of
+it. So each object gets a version token, which is replaced whenever the tags
+of its tag set change or one of them is renamed, recoloured or deleted, and
+each rendered fragment is cached along with the version it was rendered for.
+A fragment is only reused if its version is still the object's current one,
+and both are fetched from the cache at once.
+"""
+from hashlib import md5
+from uuid import uuid4
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.db import connection, transaction
+
+from .conf import get_setting
+
+
+def _get_cache():
+    alias = get_setting('FRAGMENT_CACHE')
+    return caches[alias] if alias is not None else None
+
+
+def is_enabled():
+    return get_setting('FRAGMENT_CACHE') is not None
+
+
+def _get_version_key(content_type_id, object_id):
+    return 'taggsonomy:tagset-version:{}:{}'.format(content_type_id, object_id)
+
+
+def get_fragment(name, object_, url, render):
+    """
+    Return the fragment rendered with the template of the given name for the
+    given object and URL, calling `render` to render it only if it's not
+    cached (or caching is disabled).
+    """
+    cache = _get_cache()
+    if cache is None or getattr(object_, 'pk', None) is None:
+        return render()
+    content_type_id = ContentType.objects.get_for_model(object_).id
+    version_key = _get_version_key(content_type_id, object_.pk)
+    fragment_key = 'taggsonomy:fragment:{}:{}:{}:{}'.format(
+        name, content_type_id, object_.pk, md5(url.encode()).hexdigest()
+    )
+    values = cache.get_many([version_key, fragment_key])
+    version = values.get(version_key)
+    if version is None:
+        cache.add(version_key, uuid4().hex, timeout=None)
+        version = cache.get(version_key)
+    cached = values.get(fragment_key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    fragment = render()
+    cache.set(fragment_key, (version, fragment))
+    return fragment
+
+
+def invalidate_fragments(objects):
+    """
+    Replace the versions of the objects given as (content type ID, object ID)
+    pairs, so that their fragments are rendered anew.
+    """
+    cache = _get_cache()
+    if cache is None:
+        return
+    keys = {_get_version_key(content_type_id, object_id)
+            for content_type_id, object_id in objects
+            if content_type_id is not None and object_id is not None}
+    if not keys:
+        return
+
+    def replace_versions():
+        cache.set_many({key: uuid4().hex for key in keys}, timeout=None)
+
+    replace_versions()
+    if connection.in_atomic_block:
+        # Other processes may render the old tags again before the change
+        # becomes visible to them, so invalidate once more after the commit.
+        transaction.on_commit(replace_versions)
+
+
+def record_changes(before, after, content_type_ids=None, object_ids=None):
+    """
+    Invalidate the fragments of the objects whose tags have changed, where
+    `before` and `after` map tag set IDs to the sets of the IDs of their tags
+    before and after the change (cf.
+    `django_taggsonomy.models.tagsets.record_tagset_changes`).
+    """
+    from .models import TagSet
+    if not is_enabled():
+        return
+    changed_ids = [tagset_id for tagset_id, tag_ids in before.items()
+                   if after.get(tagset_id, set()) != tag_ids]
+    if not changed_ids:
+        return
+    if content_type_ids is not None and object_ids is not None:
+        objects = [(content_type_ids.get(tagset_id), object_ids.get(tagset_id))
+                   for tagset_id in changed_ids]
+    else:
+        objects = TagSet.objects.filter(id__in=changed_ids).values_list(
+            'content_type', 'object_id'
+        )
+    invalidate_fragments(objects)
+
+
+def get_tagged_objects(tag):
+    """
+    Return a list of (content type ID, object ID) pairs of the objects tagged
+    with the given tag, if fragments are cached at all.
+    """
+    from .models import TagSet
+    if not is_enabled():
+        return []
+    return list(TagSet.objects.filter(_tags=tag).values_list(
+        'content_type', 'object_id'
+    ))
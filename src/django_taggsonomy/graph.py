@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Process-local snapshot of the tag graph, i.e. of the inclusion and exclusion
+relations between all tags, which validating changes needs over and over
+"""
+from collections import defaultdict, deque
+
+from .versioning import Version, VersionedValue
+
+
+class TagGraph(object):
+    """
+    Inclusion and exclusion relations between tags, keyed by tag ID
+    """
+
+    def __init__(self, inclusions=(), exclusions=()):
+        """
+        Build the graph from iterables of (supertag ID, subtag ID) and
+        (tag ID, excluded tag ID) pairs respectively.
+        """
+        self.subtag_ids = defaultdict(set)
+        self.supertag_ids = defaultdict(set)
+        self.excluded_ids = defaultdict(set)
+        for supertag_id, subtag_id in inclusions:
+            self.subtag_ids[supertag_id].add(subtag_id)
+            self.supertag_ids[subtag_id].add(supertag_id)
+        for tag_id, excluded_id in exclusions:
+            self.excluded_ids[tag_id].add(excluded_id)
+            self.excluded_ids[excluded_id].add(tag_id)
+        self._ancestor_ids = {}
+        self._descendant_ids = {}
+
+    @classmethod
+    def load(cls):
+        """
+        Return a new graph with the relations currently stored in the database
+        """
+        from .models import Tag
+        return cls(
+            inclusions=Tag._inclusions.through.objects.values_list(
+                'from_tag', 'to_tag'),
+            exclusions=Tag._exclusions.through.objects.values_list(
+                'from_tag', 'to_tag'),
+        )
+
+    def copy(self):
+        """
+        Return a copy of this graph, which may be changed (e.g. to try out
+        changes before making them) without affecting this one
+        """
+        graph = TagGraph()
+        for name in ('subtag_ids', 'supertag_ids', 'excluded_ids'):
+            getattr(graph, name).update(
+                (tag_id, set(ids)) for tag_id, ids in getattr(self, name).items()
+            )
+        return graph
+
+    def _clear_walks(self):
+        self._ancestor_ids.clear()
+        self._descendant_ids.clear()
+
+    def add_inclusion(self, supertag_id, subtag_id):
+        self.subtag_ids[supertag_id].add(subtag_id)
+        self.supertag_ids[subtag_id].add(supertag_id)
+        self._clear_walks()
+
+    def remove_inclusion(self, supertag_id, subtag_id):
+        self.subtag_ids[supertag_id].discard(subtag_id)
+        self.supertag_ids[subtag_id].discard(supertag_id)
+        self._clear_walks()
+
+    def add_exclusion(self, tag_id, excluded_id):
+        self.excluded_ids[tag_id].add(excluded_id)
+        self.excluded_ids[excluded_id].add(tag_id)
+
+    def remove_exclusion(self, tag_id, excluded_id):
+        self.excluded_ids[tag_id].discard(excluded_id)
+        self.excluded_ids[excluded_id].discard(tag_id)
+
+    @staticmethod
+    def _walk(tag_id, edges, cache):
+        if tag_id not in cache:
+            found, queue = set(), deque([tag_id])
+            while queue:
+                for next_id in edges.get(queue.popleft(), ()):
+                    if next_id not in found:
+                        found.add(next_id)
+                        queue.append(next_id)
+            cache[tag_id] = frozenset(found)
+        return cache[tag_id]
+
+    def get_ancestor_ids(self, *tag_ids):
+        """
+        Return a set of the IDs of all supertags of the given tags (by ID),
+        their supertags etc. ad finitum
+        """
+        return set().union(*(
+            self._walk(tag_id, self.supertag_ids, self._ancestor_ids)
+            for tag_id in tag_ids
+        ))
+
+    def get_descendant_ids(self, *tag_ids):
+        """
+        Return a set of the IDs of all subtags of the given tags (by ID),
+        their subtags etc. ad finitum
+        """
+        return set().union(*(
+            self._walk(tag_id, self.subtag_ids, self._descendant_ids)
+            for tag_id in tag_ids
+        ))
+
+    def get_excluded_ids(self, *tag_ids):
+        """
+        Return a set of the IDs of all tags excluded by any of the given tags
+        (by ID)
+        """
+        return set().union(*(self.excluded_ids.get(tag_id, ())
+                             for tag_id in tag_ids))
+
+    def get_exclusion_pairs(self, tag_ids):
+        """
+        Return a set of (ID, ID) pairs of mutually exclusive tags among the
+        given tags (by ID), with the lower ID first.
+        """
+        tag_ids = set(tag_ids)
+        return {
+            (tag_id, excluded_id)
+            for tag_id in tag_ids
+            for excluded_id in self.excluded_ids.get(tag_id, set()) & tag_ids
+            if tag_id < excluded_id
+        }
+
+    def excludes(self, tag_id, other_id):
+        return other_id in self.excluded_ids.get(tag_id, ())
+
+    def includes(self, tag_id, other_id):
+        return other_id in self.get_descendant_ids(tag_id)
+
+
+_graph = VersionedValue(Version('taggsonomy:graph-version'), TagGraph.load)
+
+
+def get_graph():
+    """
+    Return a current TagGraph, loading it from the database only if necessary
+    """
+    return _graph.get()
+
+
+def invalidate_graph():
+    """
+    Mark all snapshots of the tag graph, in this and any other process, as
+    outdated.
+    """
+    _graph.invalidate()
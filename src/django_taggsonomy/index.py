@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in, process-local inverted indexes from tags to Bitmaps of the objects
+tagged with them, for the models in the `TAGGSONOMY_INDEXED_MODELS` setting
+"""
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from time import monotonic
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from .conf import get_setting
+from .errors import UnindexedModelError
+from .expressions import compile_expression, get_condition
+from .graph import get_graph
+from .versioning import is_within_ttl, Version, VersionedValue
+
+
+# Object IDs are split into their high bits, which select a chunk of a Bitmap,
+# and their low bits, which are kept in the chunk.
+CHUNK_BITS = 16
+LOW_MASK = (1 << CHUNK_BITS) - 1
+
+_indexes = {}
+
+
+def _get_int_bitmap(low_ids):
+    """
+    Return an int with the bits at the given positions set.
+    """
+    if isinstance(low_ids, int):
+        return low_ids
+    if not low_ids:
+        return 0
+    # Set the bits in a mutable buffer, as every change to an int copies it.
+    buffer = bytearray(max(low_ids) // 8 + 1)
+    for low_id in low_ids:
+        buffer[low_id // 8] |= 1 << (low_id % 8)
+    return int.from_bytes(buffer, 'little')
+
+
+def _get_low_ids(chunk):
+    """
+    Return a sorted list or array of the positions of the bits set in the
+    given chunk.
+    """
+    if not isinstance(chunk, int):
+        return chunk
+    # Reverse the binary digits, so that each one's position is its ID.
+    bits = bin(chunk)[:1:-1]
+    low_ids = []
+    position = bits.find('1')
+    while position >= 0:
+        low_ids.append(position)
+        position = bits.find('1', position + 1)
+    return low_ids
+
+
+def _compact(chunk):
+    """
+    Return the given chunk (an int or a sorted sequence of low IDs) in the
+    form that takes less memory, or None if it's empty.
+    """
+    if not chunk:
+        return None
+    low_ids = _get_low_ids(chunk)
+    # Two bytes per ID in an array vs. one bit per ID up to the highest one
+    if len(low_ids) * 16 < low_ids[-1] + 1:
+        return array('H', low_ids)
+    return _get_int_bitmap(chunk)
+
+
+class Bitmap(object):
+    """
+    Set of object IDs, chunked by the high bits of the IDs, with each chunk
+    kept either as a sorted array of the low bits of its IDs (if it has few)
+    or as an int with bit `n` set for low bits `n`
+
+    Thus a Bitmap takes memory in proportion to its objects rather than to the
+    highest object ID, and changing it only copies a single chunk. Chunks are
+    never changed in place, so that Bitmaps may share them.
+
+    Bitmaps support `&`, `|` and `-`, as well as `~`, which returns all
+    objects of the given `universe` not in the Bitmap.
+    """
+
+    def __init__(self, chunks=None, universe=None):
+        self.chunks = dict(chunks or {})
+        self.universe = universe
+
+    @classmethod
+    def from_object_ids(cls, object_ids, universe=None):
+        low_ids_by_chunk = defaultdict(list)
+        for object_id in object_ids:
+            low_ids_by_chunk[object_id >> CHUNK_BITS].append(
+                object_id & LOW_MASK
+            )
+        return cls({high: _compact(sorted(low_ids))
+                    for high, low_ids in low_ids_by_chunk.items()},
+                   universe=universe)
+
+    def __len__(self):
+        return sum(len(chunk) if not isinstance(chunk, int)
+                   else bin(chunk).count('1')
+                   for chunk in self.chunks.values())
+
+    def __iter__(self):
+        """
+        Iterate over the object IDs in ascending order.
+        """
+        for high in sorted(self.chunks):
+            offset = high << CHUNK_BITS
+            for low_id in _get_low_ids(self.chunks[high]):
+                yield offset + low_id
+
+    def __contains__(self, object_id):
+        chunk = self.chunks.get(object_id >> CHUNK_BITS)
+        low_id = object_id & LOW_MASK
+        if chunk is None:
+            return False
+        if isinstance(chunk, int):
+            return bool(chunk >> low_id & 1)
+        position = bisect_left(chunk, low_id)
+        return position < len(chunk) and chunk[position] == low_id
+
+    def _combine(self, other, highs, operation):
+        chunks = {}
+        for high in highs:
+            chunk = operation(_get_int_bitmap(self.chunks.get(high, 0)),
+                              _get_int_bitmap(other.chunks.get(high, 0)))
+            if chunk:
+                chunks[high] = chunk
+        universe = (self.universe if self.universe is not None
+                    else other.universe)
+        return Bitmap(chunks, universe=universe)
+
+    def __and__(self, other):
+        return self._combine(other, self.chunks.keys() & other.chunks.keys(),
+                             lambda chunk, other: chunk & other)
+
+    def __or__(self, other):
+        return self._combine(other, self.chunks.keys() | other.chunks.keys(),
+                             lambda chunk, other: chunk | other)
+
+    def __sub__(self, other):
+        return self._combine(other, self.chunks.keys(),
+                             lambda chunk, other: chunk & ~other)
+
+    def __invert__(self):
+        return self.universe - self
+
+    def add(self, object_id):
+        high, low_id = object_id >> CHUNK_BITS, object_id & LOW_MASK
+        chunk = self.chunks.get(high)
+        if chunk is None:
+            self.chunks[high] = _compact(array('H', [low_id]))
+        elif isinstance(chunk, int):
+            self.chunks[high] = chunk | 1 << low_id
+        elif low_id not in chunk:
+            position = bisect_left(chunk, low_id)
+            self.chunks[high] = _compact(
+                chunk[:position] + array('H', [low_id]) + chunk[position:]
+            )
+
+    def discard(self, object_id):
+        high, low_id = object_id >> CHUNK_BITS, object_id & LOW_MASK
+        chunk = self.chunks.get(high)
+        if chunk is None:
+            return
+        if isinstance(chunk, int):
+            chunk = _compact(chunk & ~(1 << low_id))
+        else:
+            chunk = _compact(array('H', (other_id for other_id in chunk
+                                         if other_id != low_id)))
+        if chunk is None:
+            del self.chunks[high]
+        else:
+            self.chunks[high] = chunk
+
+
+def count(bitmap):
+    """
+    Return the number of objects in the given bitmap.
+    """
+    return len(bitmap)
+
+
+def get_object_ids(bitmap):
+    """
+    Return a sorted list of the IDs of the objects in the given bitmap.
+    """
+    return list(bitmap)
+
+
+def get_bitmap(object_ids):
+    """
+    Return a bitmap of the given object IDs.
+    """
+    return Bitmap.from_object_ids(object_ids)
+
+
+class TagIndex(object):
+    """
+    Inverted index from tags to the objects of one content type tagged with
+    them, as well as the set of all those objects
+    """
+
+    def __init__(self, content_type, object_ids=(), tagged_pairs=()):
+        """
+        Build the index from an iterable of the IDs of all objects and one of
+        (object ID, tag ID) pairs.
+        """
+        self.content_type = content_type
+        self.all_objects = get_bitmap(object_ids)
+        object_ids_by_tag = defaultdict(list)
+        for object_id, tag_id in tagged_pairs:
+            object_ids_by_tag[tag_id].append(object_id)
+        self.bitmaps = defaultdict(self._get_empty_bitmap, {
+            tag_id: Bitmap.from_object_ids(object_ids,
+                                           universe=self.all_objects)
+            for tag_id, object_ids in object_ids_by_tag.items()
+        })
+        self.loaded_at = monotonic()
+
+    def _get_empty_bitmap(self):
+        return Bitmap(universe=self.all_objects)
+
+    @classmethod
+    def load(cls, content_type):
+        """
+        Return a new index for the given content type with the objects and
+        tags currently stored in the database
+        """
+        from .models import TagSet
+        model = content_type.model_class()
+        return cls(
+            content_type,
+            object_ids=model._default_manager.values_list(
+                'pk', flat=True).iterator(),
+            tagged_pairs=TagSet._tags.through.objects.filter(
+                tagset__content_type=content_type,
+                tagset__object_id__isnull=False
+            ).values_list('tagset__object_id', 'tag').iterator(),
+        )
+
+    def add_tags(self, object_id, tag_ids):
+        for tag_id in tag_ids:
+            self.bitmaps[tag_id].add(object_id)
+
+    def remove_tags(self, object_id, tag_ids):
+        for tag_id in tag_ids:
+            if tag_id in self.bitmaps:
+                self.bitmaps[tag_id].discard(object_id)
+
+    def get_tag_bitmap(self, tag_id, include_subtags=False):
+        """
+        Return the bitmap of the objects tagged with the tag with the given ID,
+        or, if `include_subtags` is True, with it or any of its descendants.
+        """
+        tag_ids = {tag_id}
+        if include_subtags:
+            tag_ids |= get_graph().get_descendant_ids(tag_id)
+        bitmap = self._get_empty_bitmap()
+        for tag_id in tag_ids:
+            if tag_id in self.bitmaps:
+                bitmap |= self.bitmaps[tag_id]
+        return bitmap
+
+    def filter(self, expression, include_subtags=True):
+        """
+        Return the bitmap of the objects matching the given tag expression
+        (cf. `django_taggsonomy.expressions`).
+
+        Unless `include_subtags` is False, tagging an object with any of a
+        tag's subtags counts as tagging it with the tag itself.
+        """
+        bitmap = get_condition(
+            compile_expression(expression),
+            lambda tag_id: self.get_tag_bitmap(tag_id, include_subtags)
+        )
+        # Tags may still have objects that have been deleted.
+        return bitmap & self.all_objects
+
+    def facet_counts(self, bitmap=None, tag_ids=None, rollup=False):
+        """
+        Return a dict mapping tag IDs to the number of objects in the given
+        bitmap (or of all objects) tagged with the respective tag, or (if
+        `rollup` is True) with the tag or any of its descendants.
+
+        Just like `django_taggsonomy.utils.facet_counts`, only the tags with
+        the given IDs are counted, if any, and tags without objects are left
+        out.
+        """
+        if bitmap is None:
+            bitmap = self.all_objects
+        if tag_ids is None:
+            tag_ids = set(self.bitmaps)
+            if rollup:
+                tag_ids |= get_graph().get_ancestor_ids(*tag_ids)
+        counts = {
+            tag_id: count(self.get_tag_bitmap(tag_id, rollup) & bitmap)
+            for tag_id in tag_ids
+        }
+        return {tag_id: number for tag_id, number in counts.items() if number}
+
+
+def is_indexed(model):
+    return model._meta.label_lower in {
+        label.lower() for label in get_setting('INDEXED_MODELS')
+    }
+
+
+def _get_versioned_index(content_type_id):
+    versioned_index = _indexes.get(content_type_id)
+    if versioned_index is None:
+        versioned_index = _indexes[content_type_id] = VersionedValue(
+            Version('taggsonomy:index-version:{}'.format(content_type_id)),
+            lambda: TagIndex.load(
+                ContentType.objects.get_for_id(content_type_id)
+            ),
+            is_current=is_within_ttl
+        )
+    return versioned_index
+
+
+def _get_indexed_content_type_ids():
+    return {ContentType.objects.get_for_model(apps.get_model(label)).id
+            for label in get_setting('INDEXED_MODELS')}
+
+
+def get_index(model):
+    """
+    Return a current TagIndex for the given model, (re)building it only if
+    necessary
+
+    raises UnindexedModelError if the model is not listed in the
+    `TAGGSONOMY_INDEXED_MODELS` setting
+    """
+    if not is_indexed(model):
+        raise UnindexedModelError(model._meta.label)
+    content_type = ContentType.objects.get_for_model(model)
+    return _get_versioned_index(content_type.id).get()
+
+
+def clear_indexes():
+    """
+    Drop all indexes of this process, to be rebuilt when next needed.
+    """
+    _indexes.clear()
+
+
+def _update_on_commit(content_type_ids, change):
+    """
+    Once committed, apply a change to the indexes for the content types with
+    the given IDs, by calling `change` with each loaded one, and have all
+    other processes rebuild theirs (cf. `VersionedValue.update`).
+    """
+    def update():
+        for content_type_id in content_type_ids:
+            _get_versioned_index(content_type_id).update(change)
+    transaction.on_commit(update)
+
+
+def record_changes(before, after, content_type_ids=None, object_ids=None):
+    """
+    Apply changes to the tags of tag sets, where `before` and `after` map tag
+    set IDs to the sets of the IDs of their tags before and after the change,
+    to the indexes once they are committed.
+
+    `content_type_ids` and `object_ids` may map the tag set IDs to their
+    content type and object IDs, if known, or else they are looked up (which
+    is impossible once the tag sets have been deleted).
+    """
+    from .models import TagSet
+    if not before or not get_setting('INDEXED_MODELS'):
+        return
+    indexed_ids = _get_indexed_content_type_ids()
+    if content_type_ids is not None and object_ids is not None:
+        tagsets = [
+            (tagset_id, content_type_ids.get(tagset_id),
+             object_ids.get(tagset_id))
+            for tagset_id in before
+        ]
+    else:
+        tagsets = TagSet.objects.filter(
+            id__in=before, content_type_id__in=indexed_ids,
+            object_id__isnull=False
+        ).values_list('id', 'content_type', 'object_id')
+    changes = defaultdict(list)
+    for tagset_id, content_type_id, object_id in tagsets:
+        if content_type_id not in indexed_ids or object_id is None:
+            continue
+        old_tag_ids = before[tagset_id]
+        new_tag_ids = after.get(tagset_id, set())
+        if old_tag_ids != new_tag_ids:
+            changes[content_type_id].append((
+                object_id, new_tag_ids - old_tag_ids,
+                old_tag_ids - new_tag_ids
+            ))
+
+    def apply_changes(index):
+        for object_id, added_ids, removed_ids in changes[
+                index.content_type.id]:
+            index.add_tags(object_id, added_ids)
+            index.remove_tags(object_id, removed_ids)
+
+    if changes:
+        _update_on_commit(set(changes), apply_changes)
+
+
+def record_object_created(model, object_id):
+    if is_indexed(model):
+        _update_on_commit(
+            [ContentType.objects.get_for_model(model).id],
+            lambda index: index.all_objects.add(object_id)
+        )
+
+
+def record_object_deleted(model, object_id):
+    if is_indexed(model):
+        _update_on_commit(
+            [ContentType.objects.get_for_model(model).id],
+            lambda index: index.all_objects.discard(object_id)
+        )
+
+
+def record_tag_deleted(tag_id):
+    if get_setting('INDEXED_MODELS'):
+        _update_on_commit(_get_indexed_content_type_ids(),
+                          lambda index: index.bitmaps.pop(tag_id, None))
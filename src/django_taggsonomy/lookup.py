@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Process-local LRU cache of the tags looked up by name or ID, which may also be
+shared through the cache (cf. the `TAGGSONOMY_LOOKUP_SHARED` setting)
+"""
+from collections import namedtuple, OrderedDict
+from threading import Lock
+
+from django.core.cache import caches
+
+from .conf import get_setting
+from .versioning import Version
+
+
+lookup_version = Version('taggsonomy:lookup-version')
+
+# Stand-in for names and IDs without tags
+MISSING = 'missing'
+
+TagRecord = namedtuple('TagRecord', ('id', 'name', 'color'))
+
+_records = OrderedDict()
+_version = None
+# Guards `_records` and `_version` against threads evicting records that
+# others are about to move to the end
+_lock = Lock()
+
+
+def _get_cache():
+    return caches[get_setting('CACHE')]
+
+
+def _get_version():
+    """
+    Return the current version token, dropping all local records if they
+    belong to another version.
+    """
+    global _version
+    current = lookup_version.get()
+    with _lock:
+        if current != _version:
+            _records.clear()
+            _version = current
+    return current
+
+
+def _get_shared_key(version, key):
+    return 'taggsonomy:tag:{}:{}:{}'.format(version, *key)
+
+
+def _store(version, records):
+    """
+    Store the given dict mapping keys to records or MISSING, unless changes to
+    tags are still uncommitted, as they might yet be rolled back.
+    """
+    size = get_setting('LOOKUP_CACHE_SIZE')
+    if lookup_version.is_pending() or not size:
+        return
+    with _lock:
+        for key, record in records.items():
+            _records[key] = record
+            _records.move_to_end(key)
+        while len(_records) > size:
+            _records.popitem(last=False)
+    if get_setting('LOOKUP_SHARED'):
+        _get_cache().set_many({_get_shared_key(version, key): record
+                               for key, record in records.items()})
+
+
+def get_tag_record(name=None, id=None):
+    """
+    Return the TagRecord of the tag with the given name or ID, or None if no
+    such tag exists.
+    """
+    from .models import Tag
+    key = ('name', name) if name is not None else ('id', id)
+    version = _get_version()
+    with _lock:
+        record = _records.get(key)
+        if record is not None:
+            _records.move_to_end(key)
+    if record is not None:
+        return None if record == MISSING else record
+    if get_setting('LOOKUP_SHARED'):
+        record = _get_cache().get(_get_shared_key(version, key))
+        if record is not None:
+            _store(version, {key: record})
+            return None if record == MISSING else record
+    values = Tag.objects.filter(**{key[0]: key[1]}).values_list(
+        'id', 'name', 'color').first()
+    if values is None:
+        _store(version, {key: MISSING})
+        return None
+    record = TagRecord(*values)
+    _store(version, {('name', record.name): record, ('id', record.id): record})
+    return record
+
+
+def get_tag(name=None, id=None):
+    """
+    Return a Tag (without querying the database, if it's cached) with the given
+    name or ID, or None if no such tag exists.
+    """
+    from .models import Tag
+    record = get_tag_record(name=name, id=id)
+    if record is None:
+        return None
+    return Tag.from_db(Tag.objects.db, TagRecord._fields, record)
+
+
+def invalidate_lookups():
+    """
+    Drop the cached tags of this and any other process.
+    """
+    with _lock:
+        _records.clear()
+    lookup_version.invalidate()
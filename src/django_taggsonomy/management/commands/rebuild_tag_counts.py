@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from django_taggsonomy.models import TagUsage
+
+
+class Command(BaseCommand):
+    help = 'Recompute the usage counts of all tags from their tag sets.'
+
+    def handle(self, *args, **options):
+        TagUsage.objects.rebuild()
+        self.stdout.write('Rebuilt {} tag usage counts.'.format(
+            TagUsage.objects.count()
+        ))
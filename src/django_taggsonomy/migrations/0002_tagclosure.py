@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:32
+
+from collections import defaultdict, deque
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_tag_closure(apps, schema_editor):
+    Tag = apps.get_model('django_taggsonomy', 'Tag')
+    TagClosure = apps.get_model('django_taggsonomy', 'TagClosure')
+    supertag_ids = defaultdict(set)
+    for supertag_id, subtag_id in Tag._inclusions.through.objects.values_list(
+            'from_tag', 'to_tag'):
+        supertag_ids[subtag_id].add(supertag_id)
+    rows = []
+    for tag_id in Tag.objects.values_list('id', flat=True):
+        depths = {tag_id: 0}
+        queue = deque([tag_id])
+        while queue:
+            current_id = queue.popleft()
+            for supertag_id in supertag_ids[current_id]:
+                if supertag_id not in depths:
+                    depths[supertag_id] = depths[current_id] + 1
+                    queue.append(supertag_id)
+        rows.extend(TagClosure(ancestor_id=ancestor_id, descendant_id=tag_id,
+                               depth=depth)
+                    for ancestor_id, depth in depths.items())
+    TagClosure.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_taggsonomy', '0001_squashed_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='_descendant_links', to='django_taggsonomy.tag')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='_ancestor_links', to='django_taggsonomy.tag')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='django_tagg_descend_d5fbc9_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(populate_tag_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_tag_usage(apps, schema_editor):
+    TagSet = apps.get_model('django_taggsonomy', 'TagSet')
+    TagUsage = apps.get_model('django_taggsonomy', 'TagUsage')
+    counts = TagSet._tags.through.objects.filter(
+        tagset__content_type__isnull=False
+    ).values_list('tag', 'tagset__content_type').annotate(
+        number=Count('tagset')
+    ).order_by()
+    TagUsage.objects.bulk_create(
+        TagUsage(tag_id=tag_id, content_type_id=content_type_id, count=number)
+        for tag_id, content_type_id, number in counts
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('django_taggsonomy', '0002_tagclosure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usages', to='django_taggsonomy.tag')),
+            ],
+            options={
+                'unique_together': {('tag', 'content_type')},
+            },
+        ),
+        migrations.RunPython(populate_tag_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:46
+
+from collections import Counter, defaultdict, deque
+
+from django.db import migrations, models
+
+
+def populate_rollup_counts(apps, schema_editor):
+    Tag = apps.get_model('django_taggsonomy', 'Tag')
+    TagSet = apps.get_model('django_taggsonomy', 'TagSet')
+    TagUsage = apps.get_model('django_taggsonomy', 'TagUsage')
+    supertag_ids = defaultdict(set)
+    for supertag_id, subtag_id in Tag._inclusions.through.objects.values_list(
+            'from_tag', 'to_tag'):
+        supertag_ids[subtag_id].add(supertag_id)
+    tag_ids_by_tagset = defaultdict(set)
+    content_type_ids = {}
+    for tagset_id, content_type_id, tag_id in (
+            TagSet._tags.through.objects.filter(
+                tagset__content_type__isnull=False
+            ).values_list('tagset', 'tagset__content_type', 'tag')):
+        tag_ids_by_tagset[tagset_id].add(tag_id)
+        content_type_ids[tagset_id] = content_type_id
+    rollup_counts = Counter()
+    for tagset_id, tag_ids in tag_ids_by_tagset.items():
+        covered, queue = set(tag_ids), deque(tag_ids)
+        while queue:
+            for supertag_id in supertag_ids[queue.popleft()]:
+                if supertag_id not in covered:
+                    covered.add(supertag_id)
+                    queue.append(supertag_id)
+        for tag_id in covered:
+            rollup_counts[(tag_id, content_type_ids[tagset_id])] += 1
+    for (tag_id, content_type_id), number in rollup_counts.items():
+        TagUsage.objects.update_or_create(
+            tag_id=tag_id, content_type_id=content_type_id,
+            defaults={'rollup_count': number}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_taggsonomy', '0003_tagusage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tagusage',
+            name='rollup_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_rollup_counts,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:06
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_taggsonomy', '0004_tagusage_rollup_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='taggsonomy_tag_name_lower'),
+        ),
+    ]
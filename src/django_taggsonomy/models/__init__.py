@@ -1,2 +1,5 @@
-from .tags import check_common_subtags, check_mutually_exclusive_tags, Tag
-from .tagsets import TagSet
+from .tags import (check_common_subtags, check_mutually_exclusive_tags,
+                   get_mutually_exclusive_pairs, Tag)
+from .tagsets import TagSet, TagSetRelation
+from .closure import TagClosure
+from .usage import TagUsage
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict, deque
+
+from django.db import models, transaction
+
+from .tags import Tag
+
+
+def get_ancestor_depths(tag_id, supertag_ids):
+    """
+    Return a dict mapping the IDs of all ancestors of the tag with the given ID
+    (including the tag itself) to the length of the shortest inclusion path
+    leading from that ancestor down to the tag.
+
+    `supertag_ids` must map tag IDs to sets of the IDs of their direct
+    supertags and cover at least the part of the inclusion graph above the tag.
+    """
+    depths = {tag_id: 0}
+    queue = deque([tag_id])
+    while queue:
+        current_id = queue.popleft()
+        for supertag_id in supertag_ids.get(current_id, ()):
+            if supertag_id not in depths:
+                depths[supertag_id] = depths[current_id] + 1
+                queue.append(supertag_id)
+    return depths
+
+
+class TagClosureManager(models.Manager):
+
+    def get_descendant_ids(self, tag_ids):
+        """
+        Return a set of the IDs of the given tags (by ID) and all their
+        descendants, i.e. subtags, their subtags etc. ad finitum.
+        """
+        return set(self.filter(ancestor__in=tag_ids)
+                       .values_list('descendant', flat=True)) | set(tag_ids)
+
+    def rebuild(self, tag_ids=None):
+        """
+        Recompute the closure rows leading to the given tags (by ID).
+
+        If no tag IDs are given, the whole closure table is rebuilt from the
+        inclusion relation.
+
+        Since the rows leading to a tag only depend on the part of the
+        inclusion graph above it, the given IDs must include all descendants of
+        any tag whose supertags have changed.
+        """
+        Inclusion = Tag._inclusions.through
+        supertag_ids = defaultdict(set)
+        if tag_ids is None:
+            tag_ids = set(Tag.objects.values_list('id', flat=True))
+            rows = self.all()
+            for supertag_id, subtag_id in Inclusion.objects.values_list(
+                    'from_tag', 'to_tag'):
+                supertag_ids[subtag_id].add(supertag_id)
+        else:
+            tag_ids = set(tag_ids)
+            rows = self.filter(descendant__in=tag_ids)
+            # Collect the part of the inclusion graph above the given tags,
+            # one level at a time.
+            seen, frontier = set(tag_ids), set(tag_ids)
+            while frontier:
+                edges = Inclusion.objects.filter(
+                    to_tag__in=frontier
+                ).values_list('from_tag', 'to_tag')
+                frontier = set()
+                for supertag_id, subtag_id in edges:
+                    supertag_ids[subtag_id].add(supertag_id)
+                    if supertag_id not in seen:
+                        seen.add(supertag_id)
+                        frontier.add(supertag_id)
+        new_rows = [
+            self.model(ancestor_id=ancestor_id, descendant_id=tag_id,
+                       depth=depth)
+            for tag_id in tag_ids
+            for ancestor_id, depth in get_ancestor_depths(
+                    tag_id, supertag_ids).items()
+        ]
+        with transaction.atomic():
+            rows.delete()
+            self.bulk_create(new_rows)
+
+
+class TagClosure(models.Model):
+    """
+    Transitive closure of the tag inclusion relation
+
+    There is one row for every pair of tags where the `ancestor` includes the
+    `descendant`, either directly or indirectly, with `depth` being the length
+    of the shortest chain of inclusions between the two.
+    Every tag is also its own ancestor (and descendant) at a depth of 0.
+
+    This table is maintained automatically, whenever tags are created or
+    deleted and whenever inclusions are added or removed, so it should never
+    need to be written to directly.
+    """
+    ancestor = models.ForeignKey(Tag, on_delete=models.CASCADE,
+                                 related_name='_descendant_links')
+    descendant = models.ForeignKey(Tag, on_delete=models.CASCADE,
+                                   related_name='_ancestor_links')
+    depth = models.PositiveIntegerField()
+    objects = TagClosureManager()
+
+    class Meta(object):
+        indexes = [models.Index(fields=('descendant', 'depth'))]
+        unique_together = ('ancestor', 'descendant')
+
+    def __str__(self):
+        return '{} > {} ({})'.format(self.ancestor_id, self.descendant_id,
+                                     self.depth)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Queries along the tag hierarchy, i.e. the transitive inclusion relation
+
+Depending on the `TAGGSONOMY_HIERARCHY` setting these either look up the
+closure table or walk the inclusion relation with a recursive query.
+Either way, they return a subquery selecting tag IDs, which may be passed to
+an `__in` lookup.
+"""
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from ..conf import uses_closure_table
+
+
+RECURSIVE_QUERY = '''
+    WITH RECURSIVE hierarchy(tag_id, depth) AS (
+        {anchor}
+        UNION
+        SELECT i.{end}, h.depth + 1
+        FROM {inclusions} i INNER JOIN hierarchy h ON i.{start} = h.tag_id
+    )
+    SELECT tag_id FROM hierarchy GROUP BY tag_id HAVING MIN(depth) >= %s
+'''
+
+
+def _get_recursive_query(tag_ids, min_depth, downwards):
+    from .tags import Tag
+    qn = connection.ops.quote_name
+    Inclusion = Tag._inclusions.through
+    start, end = ('from_tag', 'to_tag') if downwards else ('to_tag', 'from_tag')
+    start = qn(Inclusion._meta.get_field(start).column)
+    end = qn(Inclusion._meta.get_field(end).column)
+    placeholders = ', '.join(['%s'] * len(tag_ids))
+    if min_depth:
+        anchor = 'SELECT {end}, 1 FROM {inclusions} WHERE {start} IN ({ids})'
+    else:
+        anchor = 'SELECT {pk}, 0 FROM {tags} WHERE {pk} IN ({ids})'
+    anchor = anchor.format(end=end, start=start, ids=placeholders,
+                           inclusions=qn(Inclusion._meta.db_table),
+                           pk=qn(Tag._meta.pk.column),
+                           tags=qn(Tag._meta.db_table))
+    sql = RECURSIVE_QUERY.format(anchor=anchor, end=end, start=start,
+                                 inclusions=qn(Inclusion._meta.db_table))
+    return RawSQL(sql, (*tag_ids, min_depth))
+
+
+def _get_hierarchy_ids(tag_ids, min_depth, downwards):
+    from .closure import TagClosure
+    from .tags import Tag
+    tag_ids = list(tag_ids)
+    if not tag_ids:
+        return Tag.objects.none().values('id')
+    if not uses_closure_table():
+        return _get_recursive_query(tag_ids, min_depth, downwards)
+    if downwards:
+        return TagClosure.objects.filter(
+            ancestor__in=tag_ids, depth__gte=min_depth
+        ).values('descendant')
+    return TagClosure.objects.filter(
+        descendant__in=tag_ids, depth__gte=min_depth
+    ).values('ancestor')
+
+
+def get_descendant_ids(tag_ids, min_depth=1):
+    """
+    Return a subquery selecting the IDs of all descendants (i.e. subtags,
+    their subtags etc.) of the tags with the given IDs.
+
+    Only tags that are at least `min_depth` inclusions below one of the given
+    tags are selected, so a `min_depth` of 0 also selects the given tags
+    themselves, while 2 only selects indirect subtags.
+    """
+    return _get_hierarchy_ids(tag_ids, min_depth, downwards=True)
+
+
+def get_ancestor_ids(tag_ids, min_depth=1):
+    """
+    Return a subquery selecting the IDs of all ancestors (i.e. supertags,
+    their supertags etc.) of the tags with the given IDs.
+
+    `min_depth` works just like for `get_descendant_ids`.
+    """
+    return _get_hierarchy_ids(tag_ids, min_depth, downwards=False)
+
+
+CLOSURE_QUERY = '''
+    WITH RECURSIVE closure(ancestor_id, descendant_id) AS (
+        SELECT {pk}, {pk} FROM {tags}{where}
+        UNION
+        SELECT c.ancestor_id, i.{to_tag}
+        FROM closure c INNER JOIN {inclusions} i ON i.{from_tag} = c.descendant_id
+    )
+'''
+
+
+def get_closure_query(ancestor_ids=None):
+    """
+    Return the SQL and parameters of a `WITH RECURSIVE` clause defining a
+    table `closure(ancestor_id, descendant_id)`, which holds the same pairs of
+    tags as the closure table (including those of each tag with itself),
+    limited to the ancestors with the given IDs, if any.
+
+    This allows joining with the closure of the inclusion relation in raw SQL,
+    regardless of the `TAGGSONOMY_HIERARCHY` setting.
+    """
+    from .tags import Tag
+    qn = connection.ops.quote_name
+    Inclusion = Tag._inclusions.through
+    pk = qn(Tag._meta.pk.column)
+    where, params = '', []
+    if ancestor_ids is not None:
+        params = list(ancestor_ids) or [None]
+        where = ' WHERE {} IN ({})'.format(pk, ', '.join(['%s'] * len(params)))
+    sql = CLOSURE_QUERY.format(
+        pk=pk, tags=qn(Tag._meta.db_table), where=where,
+        inclusions=qn(Inclusion._meta.db_table),
+        from_tag=qn(Inclusion._meta.get_field('from_tag').column),
+        to_tag=qn(Inclusion._meta.get_field('to_tag').column),
+    )
+    return sql, params
@@ -1,14 +1,22 @@
 # -*- coding: utf-8 -*-
 from colorinput.models import ColorField
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Lower
 from django.urls import reverse
 
+from ..conf import uses_closure_table
 from ..errors import (CircularInclusionError, CommonSubtagExclusionError,
                      MutualExclusionError, MutuallyExclusiveSupertagsError,
                      NoSuchTagError, SelfExclusionError,
                      SimultaneousInclusionExclusionError,
                      SupertagAdditionWouldRemoveExcludedError)
+from ..expressions import clear_plan_cache
+from ..graph import get_graph
+from ..lookup import get_tag, invalidate_lookups
+from ..suggestions import invalidate_suggestions
 from .base import ExclusionTagSet, SubTagSet, SuperTagSet
+from .hierarchy import get_ancestor_ids, get_descendant_ids
 
 
 def check_common_subtags(*tags):
@@ -17,8 +25,12 @@ def check_common_subtags(*tags):
 
     returns True if that is the case, False otherwise
     """
-    subtag_sets = set([tag.get_all_subtags() for tag in tags])
-    return Tag.objects.intersection(*subtag_sets).exists()
+    common_subtags = Tag.objects.all()
+    for tag in tags:
+        common_subtags = common_subtags.filter(
+            id__in=get_descendant_ids([tag.id])
+        )
+    return common_subtags.exists()
 
 
 def check_mutually_exclusive_tags(tags):
@@ -27,13 +39,35 @@ def check_mutually_exclusive_tags(tags):
 
     returns True if that is the case, False otherwise
     """
-    found_exclusion = False
-    for tag in tags:
-        for other_tag in tags - set([tag]):
-            if tag.excludes(other_tag):
-                found_exclusion = True
-                break
-    return found_exclusion
+    return bool(get_mutually_exclusive_pairs(tags))
+
+
+def get_mutually_exclusive_pairs(tags):
+    """
+    Return a set of all pairs of mutually exclusive tags among the given tags.
+
+    Each pair is a tuple of two Tag instances, the one with the lower ID first.
+    """
+    tags_by_id = {tag.id: tag for tag in tags}
+    id_pairs = Tag._exclusions.through.objects.filter(
+        from_tag__in=tags_by_id,
+        to_tag__in=tags_by_id,
+        from_tag__lt=F('to_tag'),
+    ).values_list('from_tag', 'to_tag')
+    return {(tags_by_id[tag_id], tags_by_id[excluded_id])
+            for tag_id, excluded_id in id_pairs}
+
+
+def get_prefix_end(prefix):
+    """
+    Return the smallest string after all strings starting with the given
+    prefix, or None if there is no such string (i.e. the prefix consists of
+    the last code point, U+10FFFF).
+    """
+    prefix = prefix.rstrip(chr(0x10ffff))
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
 
 
 class TagManager(models.Manager):
@@ -58,6 +92,31 @@ class TagManager(models.Manager):
         tag, _ = self.get_or_create(name=name)
         return tag
 
+    def with_name_prefix(self, prefix, after=None):
+        """
+        Return a TagQuerySet of the tags whose names start with the given
+        prefix, ignoring case, ordered by name (again ignoring case), which
+        uses the index on the lower-case names.
+
+        If `after` is given, only the tags after the tag with that name are
+        returned, so that the results can be paginated without an offset.
+        """
+        tags = self.alias(name_lower=Lower('name'))
+        prefix = prefix.lower()
+        if prefix:
+            # A range rather than LIKE, so that any database can search the
+            # index for it
+            tags = tags.filter(name_lower__gte=prefix)
+            end = get_prefix_end(prefix)
+            if end is not None:
+                tags = tags.filter(name_lower__lt=end)
+        if after is not None:
+            tags = tags.filter(
+                Q(name_lower__gt=Lower(Value(after)))
+                | Q(name_lower=Lower(Value(after)), name__gt=after)
+            )
+        return tags.order_by('name_lower', 'name')
+
     def get_tag_from_argument(self, argument, create_nonexisting=False):
         """
         Return a Tag object from the positional argument, which may be:
@@ -71,44 +130,263 @@ class TagManager(models.Manager):
 
         raises NoSuchTagError if the argument is an int and no tag with
         such an ID exists.
+
+        Names and IDs are looked up through the lookup cache (cf.
+        `django_taggsonomy.lookup`).
         """
         if isinstance(argument, Tag):
             # It's already a Tag object, let's just use it.
             return argument
         elif isinstance(argument, str):
             # It's a string, i.e. it should be a tag name...
-            if create_nonexisting:
+            tag = get_tag(name=argument)
+            if tag is not None:
+                return tag
+            elif create_nonexisting:
                 return self.get_or_create_by_name(argument)
             else:
-                return self.get_by_name(argument)
+                raise NoSuchTagError
         elif isinstance(argument, int):
             # It's an integer, i.e. it should be the tag's ID.
-            try:
-                return self.get(pk=argument)
-            except Tag.DoesNotExist:
+            tag = get_tag(id=argument)
+            if tag is None:
                 raise NoSuchTagError
+            return tag
         else:
             # Unsupported type
             raise NoSuchTagError
 
+    def get_tag_pairs(self, id_pairs):
+        """
+        Return a set of pairs of Tag objects from pairs of tag IDs.
+        """
+        tags_by_id = self.in_bulk({tag_id for pair in id_pairs
+                                   for tag_id in pair})
+        return {tuple(tags_by_id[tag_id] for tag_id in pair)
+                for pair in id_pairs}
+
+    def get_or_create_by_names(self, names):
+        """
+        Return a dict mapping the given names to Tags with those names
+
+        creates all missing Tags at once, with one query to insert them and
+        one to fetch them, which is also safe from concurrent creation of the
+        same tags
+        """
+        from .closure import TagClosure
+        names = set(names)
+        with transaction.atomic():
+            self.bulk_create([self.model(name=name) for name in names],
+                             ignore_conflicts=True)
+            # Fetch the tags afterwards, as not every database returns the IDs
+            # of bulk inserts, let alone ignored ones.
+            tags_by_name = self.in_bulk(names, field_name='name')
+            # Bulk inserts don't send `post_save`, so do what its receivers
+            # would have done.
+            if uses_closure_table():
+                TagClosure.objects.bulk_create(
+                    [TagClosure(ancestor=tag, descendant=tag, depth=0)
+                     for tag in tags_by_name.values()],
+                    ignore_conflicts=True
+                )
+        clear_plan_cache()
+        invalidate_lookups()
+        invalidate_suggestions()
+        return tags_by_name
+
     def get_tags_from_arguments(self, *args, create_nonexisting=False):
         """
         Return a set of Tag objects from positional arguments, which may be:
         - tag instances (Tag objects),
         - tag names (Tag.name (str)),
         - or tag IDs (Tag.pk (int)).
+
+        All names and all IDs are resolved with one query each. If
+        create_nonexisting is True, all missing tags are created at once (cf.
+        `get_or_create_by_names`).
+
+        raises NoSuchTagError if a tag ID or (unless create_nonexisting is
+        True) a tag name doesn't exist, or if an argument is of another type
+        """
+        if not all(isinstance(argument, (Tag, str, int)) for argument in args):
+            # Unsupported type
+            raise NoSuchTagError
+        tags_by_argument = self.get_tags_by_argument(
+            args, create_nonexisting=create_nonexisting
+        )
+        if len(tags_by_argument) < len(set(args)):
+            raise NoSuchTagError
+        return set(tags_by_argument.values())
+
+    def get_tags_by_argument(self, args, create_nonexisting=False):
+        """
+        Return a dict mapping each of the given arguments, which may be tags,
+        tag names or tag IDs (cf. `get_tags_from_arguments`), to its Tag, with
+        one query each for all names and all IDs
+
+        Arguments without existing tags (unless create_nonexisting is True and
+        they are names) and arguments of other types are left out.
         """
-        # Also validate tags individually.
-        # Collect errors before raising or raise at the first problem
-        # encountered? Currently raises at first error...
-        tags = set()
+        tags_by_argument = {}
+        names, tag_ids = set(), set()
         for argument in args:
-            tags.add(
-                self.get_tag_from_argument(
-                    argument,
-                    create_nonexisting=create_nonexisting)
-            )
-        return tags
+            if isinstance(argument, Tag):
+                tags_by_argument[argument] = argument
+            elif isinstance(argument, str):
+                names.add(argument)
+            elif isinstance(argument, int):
+                tag_ids.add(argument)
+        if tag_ids:
+            tags_by_argument.update(self.in_bulk(tag_ids))
+        if names:
+            tags_by_name = self.in_bulk(names, field_name='name')
+            missing_names = names - tags_by_name.keys()
+            if missing_names and create_nonexisting:
+                tags_by_name.update(self.get_or_create_by_names(missing_names))
+            tags_by_argument.update(tags_by_name)
+        return tags_by_argument
+
+    def check_relations(self, tag, **changes):
+        """
+        Return a list of (relation, argument, error) triples for all invalid
+        items of the given changes to the relations of the given tag, without
+        changing anything (cf. `apply_relations`).
+
+        The tag need not have been saved yet.
+        """
+        return self._validate_relations(tag, changes)[1]
+
+    def apply_relations(self, tag, add_subtags=(), add_supertags=(),
+                        add_exclusions=(), remove_subtags=(),
+                        remove_supertags=(), remove_exclusions=()):
+        """
+        Change the relations of the given tag to other tags, which may be given
+        as tags, tag names or tag IDs, all at once.
+
+        Each addition is subject to the same rules as `include` and `exclude`,
+        but instead of querying the database again and again, the whole change
+        set is validated against an in-memory copy of the tag graph, in order:
+        removals first, then subtags, supertags and exclusions, each checked
+        against the graph with the previous valid changes applied. The valid
+        changes are then made in a single transaction, with one statement per
+        kind of change (and the usual updates of derived data).
+
+        Tag sets are not updated, just like `include` doesn't by default.
+
+        returns a list of (relation, argument, error) triples for the items
+        that were skipped, where `relation` is the name of the keyword
+        argument, `argument` the item as given and `error` the TaggsonomyError
+        its change would have raised
+        """
+        valid, errors = self._validate_relations(tag, {
+            'add_subtags': add_subtags,
+            'add_supertags': add_supertags,
+            'add_exclusions': add_exclusions,
+            'remove_subtags': remove_subtags,
+            'remove_supertags': remove_supertags,
+            'remove_exclusions': remove_exclusions,
+        })
+        with transaction.atomic():
+            for relation, method in (('remove_subtags', tag._inclusions.remove),
+                                     ('remove_supertags', tag.tag_set.remove),
+                                     ('remove_exclusions',
+                                      tag._exclusions.remove),
+                                     ('add_subtags', tag._inclusions.add),
+                                     ('add_supertags', tag.tag_set.add),
+                                     ('add_exclusions', tag._exclusions.add)):
+                if valid[relation]:
+                    method(*valid[relation])
+        return errors
+
+    def _validate_relations(self, tag, changes):
+        """
+        Return a dict mapping each relation of the given changes to the list of
+        the tags to change that are valid, and a list of (relation, argument,
+        error) triples for the invalid ones.
+        """
+        from .tagsets import TagSet
+        changes = {relation: list(arguments)
+                   for relation, arguments in changes.items()}
+        tags_by_argument = self.get_tags_by_argument(
+            argument for arguments in changes.values()
+            for argument in arguments
+        )
+        graph = get_graph().copy()
+        # Unsaved tags have no relations yet, so any ID no tag has will do.
+        tag_id = tag.id if tag.id is not None else -1
+        valid = {relation: [] for relation in changes}
+        errors = []
+
+        def resolve(relation):
+            for argument in changes.get(relation, ()):
+                other = tags_by_argument.get(argument)
+                if other is None:
+                    errors.append((relation, argument, NoSuchTagError()))
+                else:
+                    yield argument, other
+
+        def check_inclusion(supertag_id, subtag_id):
+            if graph.excludes(supertag_id, subtag_id):
+                return SimultaneousInclusionExclusionError()
+            if graph.includes(subtag_id, supertag_id):
+                return CircularInclusionError()
+            if graph.get_exclusion_pairs(
+                    {supertag_id, subtag_id}
+                    | graph.get_ancestor_ids(supertag_id, subtag_id)):
+                return MutuallyExclusiveSupertagsError()
+            return None
+
+        for argument, other in resolve('remove_subtags'):
+            graph.remove_inclusion(tag_id, other.id)
+            valid['remove_subtags'].append(other)
+        for argument, other in resolve('remove_supertags'):
+            graph.remove_inclusion(other.id, tag_id)
+            valid['remove_supertags'].append(other)
+        for argument, other in resolve('remove_exclusions'):
+            graph.remove_exclusion(tag_id, other.id)
+            valid['remove_exclusions'].append(other)
+        for relation, is_subtag in (('add_subtags', True),
+                                    ('add_supertags', False)):
+            for argument, other in resolve(relation):
+                if other.id == tag_id:
+                    # Including itself is a no-op, just like in `include`.
+                    continue
+                supertag_id, subtag_id = ((tag_id, other.id) if is_subtag
+                                          else (other.id, tag_id))
+                error = check_inclusion(supertag_id, subtag_id)
+                if error is not None:
+                    errors.append((relation, argument, error))
+                else:
+                    graph.add_inclusion(supertag_id, subtag_id)
+                    valid[relation].append(other)
+        exclusions = list(resolve('add_exclusions'))
+        # Tags sharing a tag set with the tag must not be excluded, which is
+        # checked for all of them with a single query.
+        shared_ids = set()
+        if tag.id is not None and exclusions:
+            Through = TagSet._tags.through
+            shared_ids = set(Through.objects.filter(
+                tagset_id__in=Through.objects.filter(
+                    tag_id=tag.id).values('tagset_id'),
+                tag_id__in={other.id for _, other in exclusions}
+            ).values_list('tag_id', flat=True).distinct())
+        for argument, other in exclusions:
+            if other.id == tag_id:
+                error = SelfExclusionError()
+            elif (graph.includes(tag_id, other.id)
+                  or graph.includes(other.id, tag_id)):
+                error = SimultaneousInclusionExclusionError()
+            elif (graph.get_descendant_ids(tag_id)
+                  & graph.get_descendant_ids(other.id)):
+                error = CommonSubtagExclusionError()
+            elif other.id in shared_ids:
+                error = MutualExclusionError([(tag, other)])
+            else:
+                graph.add_exclusion(tag_id, other.id)
+                valid['add_exclusions'].append(other)
+                continue
+            errors.append(('add_exclusions', argument, error))
+        return valid, errors
 
 
 class Tag(models.Model):
@@ -118,6 +396,12 @@ class Tag(models.Model):
     color = ColorField(default="d0d0d0")
     objects = TagManager()
 
+    class Meta(object):
+        indexes = [
+            # for case-insensitive prefix searches (cf. `with_name_prefix`)
+            models.Index(Lower('name'), name='taggsonomy_tag_name_lower'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -126,29 +410,34 @@ class Tag(models.Model):
         Add this tags supertags (and their supertags etc. ad finitum)
         to the given tagset
         """
+        # Adding the direct supertags adds all of theirs, too.
         supertags = Tag.objects.filter(_inclusions=self)
-        tagset.add(*supertags)
-        for supertag in supertags:
-            supertag.add_supertags_to_tagset(tagset)
+        if supertags:
+            tagset.add(*supertags)
 
     def add_tag_to_subtagsets(self, tag):
         """
         Add the given tag (instance, id or name) to any tagset
         containing any subtag of this tag.
         """
-        for subtag in self._inclusions.all():
-            subtag.add_tag_to_tagsets(tag)
-            subtag.add_tag_to_subtagsets(tag)
+        self._add_tag_to_tagsets_with(get_graph().get_descendant_ids(self.id),
+                                      tag)
 
     def add_tag_to_tagsets(self, tag):
         """
         Add the given tag (instance, id or name) to any tagset already
         containing this tag.
         """
-        tag_instance = Tag.objects.get_tag_from_argument(tag)
-        from .tagsets import TagSet
-        for tagset in TagSet.objects.filter(_tags__id=self.id):
-            tagset.add(tag_instance)
+        self._add_tag_to_tagsets_with({self.id}, tag)
+
+    def _add_tag_to_tagsets_with(self, tag_ids, tag):
+        from .tagsets import add_to_tagsets, TagSet
+        add_to_tagsets(
+            TagSet._tags.through.objects.filter(
+                tag_id__in=tag_ids
+            ).values_list('tagset_id', flat=True).distinct(),
+            tag
+        )
 
     def exclude(self, tag):
         """
@@ -173,14 +462,19 @@ class Tag(models.Model):
         supertags. Attempts to do this will raise a CommonSubtagExclusionError.
         """
         tag_instance = Tag.objects.get_tag_from_argument(tag)
+        graph = get_graph()
+        from .tagsets import TagSet
         if tag_instance == self:
             raise SelfExclusionError
-        elif self.includes(tag_instance) or tag_instance.includes(self):
+        elif (graph.includes(self.id, tag_instance.id) or
+              graph.includes(tag_instance.id, self.id)):
             raise SimultaneousInclusionExclusionError
-        elif check_common_subtags(self, tag_instance):
+        elif (graph.get_descendant_ids(self.id) &
+              graph.get_descendant_ids(tag_instance.id)):
             raise CommonSubtagExclusionError
-        elif any([tag_instance in tagset for tagset in self.tagsets.all()]):
-            raise MutualExclusionError
+        elif (TagSet.objects.filter(_tags=self)
+                            .filter(_tags=tag_instance).exists()):
+            raise MutualExclusionError([(self, tag_instance)])
         else:
             self._exclusions.add(tag_instance)
 
@@ -204,22 +498,14 @@ class Tag(models.Model):
         Return a TagQuerySet of this tag's subtags
         and their subtags etc. ad finitum
         """
-        direct_subtags = self.get_direct_subtags()
-        all_subtags = Tag.objects.none().union(direct_subtags)
-        for tag in direct_subtags.all():
-            all_subtags = all_subtags.union(tag.get_all_subtags())
-        return all_subtags
+        return Tag.objects.filter(id__in=get_descendant_ids([self.id]))
 
     def get_all_supertags(self):
         """
         Return a TagQuerySet of this tag's supertags
         and their supertags etc. ad finitum
         """
-        direct_supertags = self.get_direct_supertags()
-        all_supertags = Tag.objects.none().union(direct_supertags)
-        for tag in direct_supertags.all():
-            all_supertags = all_supertags.union(tag.get_all_supertags())
-        return all_supertags
+        return Tag.objects.filter(id__in=get_ancestor_ids([self.id]))
 
     def get_direct_subtags(self):
         """
@@ -248,9 +534,9 @@ class Tag(models.Model):
         i.e. subtags of this tag's direct subtags, but excluding the direct
         subtags themselves.
         """
-        direct_subtags = self.get_direct_subtags()
-        all_subtags = self.get_all_subtags()
-        return all_subtags.difference(direct_subtags)
+        return Tag.objects.filter(
+            id__in=get_descendant_ids([self.id], min_depth=2)
+        )
 
     def get_indirect_supertags(self):
         """
@@ -258,9 +544,9 @@ class Tag(models.Model):
         i.e. supertags of this tag's direct supertags, but excluding the
         direct supertags themselves.
         """
-        direct_supertags = self.get_direct_supertags()
-        all_supertags = self.get_all_supertags()
-        return all_supertags.difference(direct_supertags)
+        return Tag.objects.filter(
+            id__in=get_ancestor_ids([self.id], min_depth=2)
+        )
 
     def creates_mutually_exclusive_supertags_with_subtag(self, tag):
         """
@@ -270,12 +556,11 @@ class Tag(models.Model):
         this tag's supertags, otherwise False.
         """
         tag_instance = Tag.objects.get_tag_from_argument(tag)
-        combined_tags = self.get_all_supertags().union(
-            tag_instance.get_all_supertags()
-        ).union(
-            Tag.objects.filter(id__in={self.id, tag.id})
+        graph = get_graph()
+        combined_ids = {self.id, tag_instance.id} | graph.get_ancestor_ids(
+            self.id, tag_instance.id
         )
-        return check_mutually_exclusive_tags(set(combined_tags))
+        return bool(graph.get_exclusion_pairs(combined_ids))
 
     def unexclude(self, tag):
         """
@@ -313,47 +598,50 @@ class Tag(models.Model):
         the included tag.
         """
         tag_instance = Tag.objects.get_tag_from_argument(tag)
+        graph = get_graph()
         if tag_instance == self:
             return
-        elif self.excludes(tag_instance):
+        elif graph.excludes(self.id, tag_instance.id):
             raise SimultaneousInclusionExclusionError
-        elif tag_instance.includes(self):
+        elif graph.includes(tag_instance.id, self.id):
             raise CircularInclusionError
         elif self.creates_mutually_exclusive_supertags_with_subtag(tag_instance):
             raise MutuallyExclusiveSupertagsError
         elif update_tagsets:
             # We're required to update all tag sets containing the newly included
-            # subtag by adding this (new super)tag and all of its respective
-            # supertags, but doing so might lead to the silent removal of other
-            # tags from those tag sets, due to exclusion, which must not be
-            # allowed to happen.
+            # subtag (or any of its own subtags) by adding this (new super)tag
+            # and all of its respective supertags, but doing so might lead to
+            # the silent removal of other tags from those tag sets, due to
+            # exclusion, which must not be allowed to happen.
             # Check whether this tag and all its supertags together exclude any
-            # tag in any tag set containing the newly included subtag and throw
-            # an exception, if so.
+            # tag in any of those tag sets and throw an exception, if so.
             # 1. Get a set of all supertags (of `self`) and add `self` to it.
             # 2. Get a set of all the tags that are excluded by the above set.
-            # 3. Get a set of all tag sets containing the newly included (sub)tag.
-            # 4. Get a set of all tags contained in any of the above tag sets.
-            # 5. Check if there's any overlap (intersection) between the sets
-            #    from 2. and 4. - if there is, raise an error.
-            self_set =  Tag.objects.filter(pk=self.pk)
-            tags_to_add = self_set.union(self.get_all_supertags())
-            tags_excluded_by_tags_to_add = Tag.objects.none()
-            for tag_to_add in tags_to_add:
-                tags_excluded_by_tags_to_add |= tag_to_add._exclusions.all()
-            from .tagsets import TagSet
-            subtag_tagsets = TagSet.objects.filter(_tags=tag_instance)
-            tags_in_subtag_tagsets = Tag.objects.filter(
-                tagsets__in=subtag_tagsets
+            # 3. Get all tag sets containing the newly included (sub)tag or
+            #    any of its subtags.
+            # 4. Check if any of those tag sets contains a tag from 2. - if
+            #    one does, raise an error.
+            tag_ids_to_add = {self.id} | graph.get_ancestor_ids(self.id)
+            tag_ids_excluded_by_tags_to_add = graph.get_excluded_ids(
+                *tag_ids_to_add
             )
-            if tags_in_subtag_tagsets.intersection(
-                    tags_excluded_by_tags_to_add
+            from .tagsets import add_tags_to_tagsets, TagSet
+            subtag_tagset_ids = TagSet._tags.through.objects.filter(
+                tag_id__in={tag_instance.id} | graph.get_descendant_ids(
+                    tag_instance.id
+                )
+            ).values_list('tagset_id', flat=True).distinct()
+            if TagSet._tags.through.objects.filter(
+                    tagset_id__in=subtag_tagset_ids,
+                    tag_id__in=tag_ids_excluded_by_tags_to_add
             ).exists():
                 raise SupertagAdditionWouldRemoveExcludedError
-        self._inclusions.add(tag_instance)
-        if update_tagsets:
-            tag_instance.add_tag_to_tagsets(self)
-            tag_instance.add_tag_to_subtagsets(self)
+        with transaction.atomic():
+            self._inclusions.add(tag_instance)
+            if update_tagsets:
+                # The graph has just changed, so get it once for all chunks.
+                add_tags_to_tagsets(subtag_tagset_ids, tag_ids_to_add,
+                                    graph=get_graph())
 
     def includes(self, tag):
         """
@@ -361,12 +649,7 @@ class Tag(models.Model):
         either directly or indirectly, otherwise False.
         """
         tag_instance = Tag.objects.get_tag_from_argument(tag)
-        if self._inclusions.filter(id=tag_instance.id).exists():
-            return True
-        for included_tag in self._inclusions.all():
-            if included_tag.includes(tag_instance):
-                return True
-        return False
+        return self.get_all_subtags().filter(id=tag_instance.id).exists()
 
     def uninclude(self, tag):
         """
@@ -376,6 +659,30 @@ class Tag(models.Model):
         tag_instance = Tag.objects.get_tag_from_argument(tag)
         self._inclusions.remove(tag_instance)
 
+    def usage_count(self, content_type=None):
+        """
+        Return the number of objects tagged with this tag, or only those of the
+        given content type, from the usage counters.
+
+        Prefetching `usages` makes this answer without querying the database.
+        """
+        return sum(usage.count for usage in self.usages.all()
+                   if content_type is None
+                   or usage.content_type_id == content_type.id)
+
+    def rollup_count(self, content_type=None):
+        """
+        Return the number of objects tagged with this tag or any of its
+        descendants, or only those of the given content type, from the usage
+        counters.
+
+        Each object is counted once, no matter how many of these tags it has.
+        Just like for `usage_count`, prefetching `usages` avoids any query.
+        """
+        return sum(usage.rollup_count for usage in self.usages.all()
+                   if content_type is None
+                   or usage.content_type_id == content_type.id)
+
     @property
     def subtags(self):
         return SubTagSet(self)
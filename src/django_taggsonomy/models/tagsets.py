@@ -1,12 +1,329 @@
 # -*- coding: utf-8 -*-
-from functools import reduce
+from collections import defaultdict
+from itertools import islice
 
-from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.fields import (GenericForeignKey,
+                                                GenericRelation)
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, models, transaction
 
 from ..errors import MutualExclusionError, MutuallyExclusiveSupertagsError
-from .tags import check_mutually_exclusive_tags, Tag
+from ..expressions import compile_expression, get_condition
+from .. import fragments, index
+from ..graph import get_graph
+from .hierarchy import get_descendant_ids
+from .tags import Tag
+from .usage import get_tag_ids_by_tagset, TagUsage
+
+
+BATCH_SIZE = 1000
+
+
+def _chunked(ids, batch_size):
+    ids = iter(ids)
+    chunk = list(islice(ids, batch_size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(ids, batch_size))
+
+
+def record_tagset_changes(before, after, content_type_ids=None,
+                          object_ids=None, graph=None):
+    """
+    Update everything derived from the tags of tag sets, i.e. the usage
+    counts, any in-memory indexes and the cached fragments, for changes to
+    their tags, where `before` and `after` map tag set IDs to the sets of the
+    IDs of their tags before and after the change.
+
+    `content_type_ids` and `object_ids` may map the tag set IDs to their
+    content type and object IDs, if known, or else they are looked up. `graph`
+    may be the current TagGraph, so that callers recording changes chunk by
+    chunk needn't get it for each chunk.
+
+    Any change that bypasses the `m2m_changed` signal must be recorded here.
+    """
+    TagUsage.objects.record_changes(before, after,
+                                    content_type_ids=content_type_ids,
+                                    graph=graph)
+    index.record_changes(before, after, content_type_ids=content_type_ids,
+                         object_ids=object_ids)
+    fragments.record_changes(before, after,
+                             content_type_ids=content_type_ids,
+                             object_ids=object_ids)
+
+
+def add_tags_to_tagsets(tagset_ids, tag_ids, batch_size=BATCH_SIZE,
+                        graph=None):
+    """
+    Add the tags with the given IDs to all tag sets with the given IDs.
+
+    `tagset_ids` may be any iterable of IDs, such as a flat `values_list`
+    queryset, and is processed in chunks of `batch_size` tag sets, inserting
+    only the missing rows into the through table with a few statements per
+    chunk and recording the changes (cf. `record_tagset_changes`).
+
+    This bypasses all validation, as well as the removal of excluded tags, so
+    callers must make sure that adding the tags is valid for every tag set.
+    The tag graph is only fetched once, unless given as `graph`.
+    """
+    Through = TagSet._tags.through
+    tag_ids = set(tag_ids)
+    if not tag_ids:
+        return
+    graph = graph or get_graph()
+    if isinstance(tagset_ids, models.QuerySet):
+        tagset_ids = tagset_ids.iterator(chunk_size=batch_size)
+    for chunk in _chunked(tagset_ids, batch_size):
+        before = get_tag_ids_by_tagset(chunk)
+        with transaction.atomic():
+            Through.objects.bulk_create(
+                [Through(tagset_id=tagset_id, tag_id=tag_id)
+                 for tagset_id, present in before.items()
+                 for tag_id in tag_ids - present],
+                ignore_conflicts=True
+            )
+            record_tagset_changes(before, {
+                tagset_id: present | tag_ids
+                for tagset_id, present in before.items()
+            }, graph=graph)
+
+
+def get_tag_ids_to_add(*args, create_nonexisting=False):
+    """
+    Return the IDs of the tags to add to a tag set when adding the given
+    tag(s), i.e. of the tags themselves and all of their supertags, and the IDs
+    of all tags excluded by those, which are to be removed from the tag set.
+
+    Raises MutualExclusionError or MutuallyExclusiveSupertagsError (just like
+    `TagSet.add`) if the tags to add would exclude one another.
+    """
+    kwargs = dict(create_nonexisting=create_nonexisting)
+    # First, get tags from positional args, validating them individually
+    tags = Tag.objects.get_tags_from_arguments(*args, **kwargs)
+    tag_ids = {tag.id for tag in tags}
+    graph = get_graph()
+    # Next, check that the full set of tags to be added directly does not
+    # contain mutually exclusive tags…
+    exclusion_pairs = graph.get_exclusion_pairs(tag_ids)
+    if exclusion_pairs:
+        raise MutualExclusionError(Tag.objects.get_tag_pairs(exclusion_pairs))
+    # … and that the full set of tags to be added, including all supertags,
+    # does not do so either.
+    combined_tag_ids = tag_ids | graph.get_ancestor_ids(*tag_ids)
+    exclusion_pairs = graph.get_exclusion_pairs(combined_tag_ids)
+    if exclusion_pairs:
+        raise MutuallyExclusiveSupertagsError(
+            Tag.objects.get_tag_pairs(exclusion_pairs)
+        )
+    return combined_tag_ids, graph.get_excluded_ids(*combined_tag_ids)
+
+
+def remove_tags_from_tagsets(tagset_ids, tag_ids, batch_size=BATCH_SIZE,
+                             graph=None):
+    """
+    Remove the tags with the given IDs from all tag sets with the given IDs,
+    with a few statements per chunk of `batch_size` tag sets, recording the
+    changes (cf. `record_tagset_changes`, and `add_tags_to_tagsets` for
+    `graph`).
+    """
+    Through = TagSet._tags.through
+    tag_ids = set(tag_ids)
+    if not tag_ids:
+        return
+    graph = graph or get_graph()
+    for chunk in _chunked(tagset_ids, batch_size):
+        before = get_tag_ids_by_tagset(chunk)
+        if any(present & tag_ids for present in before.values()):
+            with transaction.atomic():
+                Through.objects.filter(tagset_id__in=chunk,
+                                       tag_id__in=tag_ids).delete()
+                record_tagset_changes(before, {
+                    tagset_id: present - tag_ids
+                    for tagset_id, present in before.items()
+                }, graph=graph)
+
+
+def _add_to_tagsets(tagset_ids, tag_ids_to_add, excluded_tag_ids,
+                    batch_size=BATCH_SIZE):
+    graph = get_graph()
+    remove_tags_from_tagsets(tagset_ids, excluded_tag_ids,
+                             batch_size=batch_size, graph=graph)
+    add_tags_to_tagsets(tagset_ids, tag_ids_to_add, batch_size=batch_size,
+                        graph=graph)
+
+
+def add_to_tagsets(tagset_ids, *args, create_nonexisting=False,
+                   batch_size=BATCH_SIZE):
+    """
+    Add the given tag(s) to all tag sets with the given IDs.
+
+    This has the same effect as calling `add` on each of the tag sets, like
+    `TagSetManager.bulk_add` does for the tag sets of objects.
+    """
+    tag_ids_to_add, excluded_tag_ids = get_tag_ids_to_add(
+        *args, create_nonexisting=create_nonexisting
+    )
+    tagset_ids = list(tagset_ids)
+    with transaction.atomic():
+        _add_to_tagsets(tagset_ids, tag_ids_to_add, excluded_tag_ids,
+                        batch_size=batch_size)
+
+
+class TagSetManager(models.Manager):
+
+    def bulk_add(self, objects, *args, create_nonexisting=False,
+                 batch_size=BATCH_SIZE):
+        """
+        Add the given tag(s) to the tag sets of all given objects, which may
+        be a queryset or any iterable of model instances.
+
+        This has the same effect as calling `add` on each object's tag set
+        (creating it, if necessary), including the removal of excluded tags
+        and the errors raised, but resolves and validates the tags only once
+        and changes all tag sets with a few statements per chunk of
+        `batch_size` objects.
+        """
+        tag_ids_to_add, excluded_tag_ids = get_tag_ids_to_add(
+            *args, create_nonexisting=create_nonexisting
+        )
+        with transaction.atomic():
+            tagset_ids = self.get_or_create_ids_for_objects(
+                objects, batch_size=batch_size
+            )
+            _add_to_tagsets(tagset_ids, tag_ids_to_add, excluded_tag_ids,
+                            batch_size=batch_size)
+
+    def delete_for_objects(self, content_type, object_ids,
+                           batch_size=BATCH_SIZE):
+        """
+        Delete the tag sets of the objects of the given content type with the
+        given IDs, per chunk of `batch_size` objects.
+
+        Like the deletions cascading from objects (cf. `TagSetRelation`), the
+        tag sets are loaded along with their tags, so that the changes are
+        recorded all at once by the `post_delete` receiver, with a constant
+        number of queries per chunk.
+        """
+        for chunk in _chunked(object_ids, batch_size):
+            self.filter(
+                content_type=content_type, object_id__in=chunk
+            ).prefetch_related('_tags').delete()
+
+    def get_or_create_ids_for_objects(self, objects, batch_size=BATCH_SIZE):
+        """
+        Return a list of the IDs of the tag sets of all given objects, which
+        may be a queryset or any iterable of model instances, creating any
+        missing tag sets in bulk.
+        """
+        return list(self.get_or_create_ids_by_object(
+            objects, batch_size=batch_size
+        ).values())
+
+    def get_or_create_ids_by_object(self, objects, batch_size=BATCH_SIZE):
+        """
+        Return a dict mapping the (content type ID, object ID) pairs of all
+        given objects (cf. `get_or_create_ids_for_objects`) to the IDs of their
+        tag sets (cf. `get_or_create_by_object`).
+        """
+        return {key: tagset.id for key, tagset in self.get_or_create_by_object(
+            objects, batch_size=batch_size
+        ).items()}
+
+    def get_or_create_by_object(self, objects, batch_size=BATCH_SIZE):
+        """
+        Return a dict mapping the (content type ID, object ID) pairs of all
+        given objects, which may be a queryset or any iterable of model
+        instances, to their tag sets, creating any missing tag sets in bulk,
+        with one query per content type and chunk of `batch_size` objects,
+        plus two more if any need to be created.
+
+        raises ValueError if any of the objects is unsaved
+        """
+        object_ids_by_content_type = defaultdict(set)
+        if isinstance(objects, models.QuerySet):
+            content_type = ContentType.objects.get_for_model(objects.model)
+            object_ids_by_content_type[content_type].update(
+                objects.values_list('pk', flat=True)
+            )
+        else:
+            for object_ in objects:
+                if object_.pk is None:
+                    raise ValueError('Unsaved objects have no tag sets: '
+                                     '{!r}'.format(object_))
+                content_type = ContentType.objects.get_for_model(object_)
+                object_ids_by_content_type[content_type].add(object_.pk)
+        tagsets_by_object = {}
+        for content_type, object_ids in object_ids_by_content_type.items():
+            for chunk in _chunked(object_ids, batch_size):
+                tagsets = self.filter(content_type=content_type,
+                                      object_id__in=chunk)
+                existing = {tagset.object_id: tagset for tagset in tagsets}
+                missing = [object_id for object_id in chunk
+                           if object_id not in existing]
+                if missing:
+                    self.bulk_create(
+                        [self.model(content_type=content_type,
+                                    object_id=object_id)
+                         for object_id in missing],
+                        ignore_conflicts=True
+                    )
+                    # Fetch the tag sets afterwards, as not every database
+                    # returns their IDs from bulk inserts, let alone ignored
+                    # ones.
+                    existing.update(
+                        (tagset.object_id, tagset)
+                        for tagset in tagsets.filter(object_id__in=missing)
+                    )
+                tagsets_by_object.update(
+                    ((content_type.id, object_id), tagset)
+                    for object_id, tagset in existing.items()
+                )
+        return tagsets_by_object
+
+    def matching(self, expression, include_subtags=True):
+        """
+        Return a queryset of the tag sets matching the given tag expression,
+        e.g. `(Python OR Rust) AND NOT Deprecated`, which is evaluated with a
+        single query.
+
+        Unless `include_subtags` is False, a tag set containing any of a tag's
+        subtags counts as containing the tag itself.
+
+        raises TagExpressionError if the expression is malformed and
+        NoSuchTagError if it refers to a nonexisting tag
+        """
+        Through = self.model._tags.through
+
+        def get_tagged(tag_id):
+            tag_ids = ([tag_id] if not include_subtags else
+                       get_descendant_ids([tag_id], min_depth=0))
+            return models.Q(id__in=Through.objects.filter(
+                tag_id__in=tag_ids
+            ).values('tagset_id'))
+
+        return self.filter(
+            get_condition(compile_expression(expression), get_tagged)
+        )
+
+
+class TagSetRelation(GenericRelation):
+    """
+    Generic relation from a taggable model to the tag sets of its objects
+    (cf. `django_taggsonomy.registry.taggable`)
+
+    Deleting objects deletes their tag sets along with them, which Django's
+    deletion collector loads with one query per batch of objects. This relation
+    has the collector load the tag sets' tags with them, too, so that the
+    changes can be recorded without a query per tag set.
+    """
+
+    def __init__(self, to='django_taggsonomy.TagSet', **kwargs):
+        super(TagSetRelation, self).__init__(to, **kwargs)
+
+    def bulk_related_objects(self, objs, using=DEFAULT_DB_ALIAS):
+        return super(TagSetRelation, self).bulk_related_objects(
+            objs, using
+        ).prefetch_related('_tags')
 
 
 class TagSet(models.Model):
@@ -18,11 +335,14 @@ class TagSet(models.Model):
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, null=True)
     object_id = models.PositiveIntegerField(null=True)
     content_object = GenericForeignKey()
+    objects = TagSetManager()
 
     class Meta(object):
         unique_together = ('content_type', 'object_id')
 
     def __contains__(self, tag):
+        if '_tags' in getattr(self, '_prefetched_objects_cache', {}):
+            return tag in self._tags.all()
         return self._tags.filter(id=tag.id).exists()
 
     def __str__(self):
@@ -43,30 +363,17 @@ class TagSet(models.Model):
         to be added.
         Attempting to do so will raise MutuallyExclusiveSupertagsError.
         """
-        kwargs = dict(create_nonexisting=create_nonexisting)
-        # First, get tags from positional args, validating them individually
-        tags = Tag.objects.get_tags_from_arguments(*args, **kwargs)
-        # Next, check that the full set of tags to be added directly does not
-        # contain mutually exclusive tags…
-        if check_mutually_exclusive_tags(tags):
-            raise MutualExclusionError
-        # … and that the full set of tags to be added, including all supertags,
-        # does not do so either.
-        supertags = set(reduce(lambda ts1, ts2: ts1.union(ts2),
-                               [tag.get_all_supertags() for tag in tags],
-                               Tag.objects.none()))
-        combined_tags = set(tags) | supertags
-        if check_mutually_exclusive_tags(combined_tags):
-            raise MutuallyExclusiveSupertagsError
+        tag_ids_to_add, excluded_tag_ids = get_tag_ids_to_add(
+            *args, create_nonexisting=create_nonexisting
+        )
         # Now remove any present tags that are excluded by tags to be added
-        # explicitely.
-        for present_tag in self._tags.all():
-            for new_tag in combined_tags:
-                if new_tag.excludes(present_tag):
-                    self._tags.remove(present_tag)
-                    break
+        # explicitely, all at once.
+        if excluded_tag_ids:
+            self._tags.remove(*self._tags.filter(
+                id__in=excluded_tag_ids
+            ).values_list('id', flat=True))
         # Finally, add the new tags and all the supertags.
-        self._tags.add(*combined_tags)
+        self._tags.add(*tag_ids_to_add)
 
     def all(self, *args, **kwargs):
         return self._tags.all(*args, **kwargs)
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+from collections import Counter, defaultdict
+from itertools import groupby
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import models, transaction
+from django.db.models import Count, F
+
+from .. import suggestions
+from ..graph import get_graph
+from .hierarchy import get_descendant_ids
+from .tags import Tag
+
+
+def get_tag_ids_by_tagset(tagset_ids):
+    """
+    Return a dict mapping each of the given tag set IDs to the set of the IDs
+    of the tags in that tag set, with a single query.
+    """
+    from .tagsets import TagSet
+    tag_ids_by_tagset = {tagset_id: set() for tagset_id in tagset_ids}
+    for tagset_id, tag_id in TagSet._tags.through.objects.filter(
+            tagset_id__in=tag_ids_by_tagset).values_list('tagset_id', 'tag_id'):
+        tag_ids_by_tagset[tagset_id].add(tag_id)
+    return tag_ids_by_tagset
+
+
+class TagUsageManager(models.Manager):
+
+    def update_counts(self, deltas, rollup_deltas=None):
+        """
+        Add the given deltas to the usage counts, where `deltas` maps
+        (tag ID, content type ID) pairs to the number of objects of that
+        content type that started (or, if negative, stopped) using that tag.
+        `rollup_deltas` does the same for the roll-up counts.
+
+        Missing rows are created first, so that all counts can be changed with
+        one relative UPDATE per content type and combination of deltas.
+        """
+        rollup_deltas = rollup_deltas or {}
+        keys = {key for key in {*deltas, *rollup_deltas}
+                if key[1] is not None
+                and (deltas.get(key) or rollup_deltas.get(key))}
+        if not keys:
+            return
+        tag_ids_by_change = defaultdict(set)
+        for tag_id, content_type_id in keys:
+            key = (tag_id, content_type_id)
+            tag_ids_by_change[(content_type_id, deltas.get(key, 0),
+                               rollup_deltas.get(key, 0))].add(tag_id)
+        with transaction.atomic():
+            self.bulk_create(
+                [self.model(tag_id=tag_id, content_type_id=content_type_id)
+                 for tag_id, content_type_id in keys],
+                ignore_conflicts=True
+            )
+            for (content_type_id, delta, rollup_delta), tag_ids in (
+                    tag_ids_by_change.items()):
+                self.filter(content_type_id=content_type_id,
+                            tag_id__in=tag_ids).update(
+                    count=F('count') + delta,
+                    rollup_count=F('rollup_count') + rollup_delta
+                )
+        suggestions.record_count_changes(deltas)
+
+    def record_changes(self, before, after, content_type_ids=None,
+                       graph=None):
+        """
+        Update the usage and roll-up counts for changes to the tags of tag
+        sets, where `before` and `after` map tag set IDs to the sets of the IDs
+        of their tags before and after the change.
+
+        `content_type_ids` may map the tag set IDs to their content type IDs,
+        if known, or else they are looked up. `graph` may be the current
+        TagGraph, or else it is fetched.
+        """
+        from .tagsets import TagSet
+        if not before:
+            return
+        if content_type_ids is None:
+            content_type_ids = dict(TagSet.objects.filter(
+                id__in=before
+            ).values_list('id', 'content_type'))
+        graph = graph or get_graph()
+        deltas, rollup_deltas = Counter(), Counter()
+        for tagset_id, old_tag_ids in before.items():
+            content_type_id = content_type_ids.get(tagset_id)
+            new_tag_ids = after.get(tagset_id, set())
+            if content_type_id is None or old_tag_ids == new_tag_ids:
+                continue
+            for tag_id in new_tag_ids - old_tag_ids:
+                deltas[(tag_id, content_type_id)] += 1
+            for tag_id in old_tag_ids - new_tag_ids:
+                deltas[(tag_id, content_type_id)] -= 1
+            # A tag set counts towards the roll-up counts of its tags and of
+            # all their ancestors.
+            old_covered = old_tag_ids | graph.get_ancestor_ids(*old_tag_ids)
+            new_covered = new_tag_ids | graph.get_ancestor_ids(*new_tag_ids)
+            for tag_id in new_covered - old_covered:
+                rollup_deltas[(tag_id, content_type_id)] += 1
+            for tag_id in old_covered - new_covered:
+                rollup_deltas[(tag_id, content_type_id)] -= 1
+        self.update_counts(deltas, rollup_deltas)
+
+    def rebuild_rollups(self, tag_ids):
+        """
+        Recompute the roll-up counts of the given tags (by ID), with one
+        aggregation query per tag.
+
+        This is needed whenever the descendants of the tags have changed.
+        """
+        from .tagsets import TagSet
+        Through = TagSet._tags.through
+        existing_tag_ids = set(Tag.objects.filter(
+            id__in=tag_ids).values_list('id', flat=True))
+        with transaction.atomic():
+            for tag_id in existing_tag_ids:
+                counts = dict(Through.objects.filter(
+                    tag_id__in=get_descendant_ids([tag_id], min_depth=0),
+                    tagset__content_type__isnull=False
+                ).values_list('tagset__content_type').annotate(
+                    number=Count('tagset', distinct=True)
+                ).order_by())
+                self.filter(tag_id=tag_id).exclude(
+                    content_type_id__in=counts
+                ).update(rollup_count=0)
+                for content_type_id, number in counts.items():
+                    self.update_or_create(
+                        tag_id=tag_id, content_type_id=content_type_id,
+                        defaults={'rollup_count': number}
+                    )
+
+    def rebuild(self):
+        """
+        Recompute all usage and roll-up counts from the tags of all tag sets.
+        """
+        from .tagsets import TagSet
+        graph = get_graph()
+        counts, rollup_counts = Counter(), Counter()
+        rows = TagSet._tags.through.objects.filter(
+            tagset__content_type__isnull=False
+        ).order_by('tagset').values_list('tagset', 'tagset__content_type',
+                                         'tag')
+        # Walk the rows tag set by tag set, to collect each one's tags.
+        for (_, content_type_id), group in groupby(
+                rows.iterator(), key=lambda row: row[:2]):
+            tag_ids = {tag_id for _, _, tag_id in group}
+            for tag_id in tag_ids:
+                counts[(tag_id, content_type_id)] += 1
+            for tag_id in tag_ids | graph.get_ancestor_ids(*tag_ids):
+                rollup_counts[(tag_id, content_type_id)] += 1
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(
+                self.model(tag_id=tag_id, content_type_id=content_type_id,
+                           count=counts[(tag_id, content_type_id)],
+                           rollup_count=rollup_counts[(tag_id,
+                                                       content_type_id)])
+                for tag_id, content_type_id in rollup_counts
+            )
+        suggestions.invalidate_suggestions()
+
+
+class TagUsage(models.Model):
+    """
+    Number of objects of a content type that are tagged with a tag
+
+    `count` is the number of objects tagged with the tag itself, while
+    `rollup_count` is the number of objects tagged with the tag or any of its
+    descendants (i.e. subtags, their subtags etc.).
+
+    These counts are maintained automatically whenever tags are added to or
+    removed from tag sets, including in bulk, whenever tag sets are deleted and
+    whenever inclusions change, so counting tagged objects never needs to
+    aggregate over all tag sets. Only tag sets that belong to an object are
+    counted.
+    """
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE,
+                            related_name='usages')
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+    rollup_count = models.PositiveIntegerField(default=0)
+    objects = TagUsageManager()
+
+    class Meta(object):
+        unique_together = ('tag', 'content_type')
+
+    def __str__(self):
+        return '{} × {}: {} ({})'.format(self.tag, self.content_type,
+                                         self.count, self.rollup_count)
@@ -0,0 +1,120 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+from .expressions import compile_expression, get_condition
+from .models import Tag, TagSet
+from .models.hierarchy import get_descendant_ids
+from .utils import facet_counts, prefetch_tags
+
+
+class TaggableQuerySet(models.QuerySet):
+    """
+    QuerySet for taggable models, providing tag-related methods
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._prefetch_tags = False
+        self._prefetch_tags_done = False
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._prefetch_tags = self._prefetch_tags
+        return clone
+
+    def _fetch_all(self):
+        super()._fetch_all()
+        if self._prefetch_tags and not self._prefetch_tags_done:
+            prefetch_tags(object_ for object_ in self._result_cache
+                          if isinstance(object_, models.Model))
+            self._prefetch_tags_done = True
+
+    def prefetch_tags(self):
+        """
+        Return a new QuerySet that will fetch the tag sets and tags of all its
+        objects at once, with two more queries in total, when evaluated.
+        """
+        clone = self._chain()
+        clone._prefetch_tags = True
+        return clone
+
+    def _get_tagged_object_ids(self, tag_ids, include_subtags):
+        """
+        Return a subquery selecting the IDs of the objects tagged with any of
+        the tags with the given IDs.
+        """
+        if include_subtags:
+            tag_ids = get_descendant_ids(tag_ids, min_depth=0)
+        return TagSet.objects.filter(
+            content_type=ContentType.objects.get_for_model(self.model),
+            object_id__isnull=False,
+            _tags__id__in=tag_ids
+        ).values('object_id')
+
+    def tagged_with(self, all=(), any=(), none=(), include_subtags=False):
+        """
+        Return a new QuerySet of only those objects that are tagged with
+        - all of the tags in `all`,
+        - at least one of the tags in `any` (unless it's empty)
+        - and none of the tags in `none`,
+        each of which may be a tag instance, name or ID.
+
+        If `include_subtags` is True, tagging an object with any of a tag's
+        subtags counts as tagging it with the tag itself.
+
+        The result is filtered with subqueries in SQL, the tag hierarchy
+        included.
+
+        raises NoSuchTagError if any of the given tags doesn't exist
+        """
+        queryset = self._chain()
+        for tag in Tag.objects.get_tags_from_arguments(*all):
+            queryset = queryset.filter(
+                pk__in=self._get_tagged_object_ids([tag.id], include_subtags)
+            )
+        if any:
+            queryset = queryset.filter(pk__in=self._get_tagged_object_ids(
+                {tag.id for tag in Tag.objects.get_tags_from_arguments(*any)},
+                include_subtags
+            ))
+        if none:
+            queryset = queryset.exclude(pk__in=self._get_tagged_object_ids(
+                {tag.id for tag in Tag.objects.get_tags_from_arguments(*none)},
+                include_subtags
+            ))
+        return queryset
+
+    def matching(self, expression, include_subtags=True):
+        """
+        Return a new QuerySet of only those objects whose tags match the given
+        tag expression, e.g. `(Python OR Rust) AND NOT Deprecated`, with tags
+        referred to by name or ID (see `django_taggsonomy.expressions`).
+
+        Unless `include_subtags` is False, tagging an object with any of a
+        tag's subtags counts as tagging it with the tag itself.
+
+        Like `tagged_with`, the result is filtered with subqueries in SQL.
+        Objects without a tag set count as having no tags, so they match
+        `NOT <tag>`.
+
+        raises TagExpressionError if the expression is malformed and
+        NoSuchTagError if it refers to a nonexisting tag
+        """
+        def get_tagged(tag_id):
+            return models.Q(pk__in=self._get_tagged_object_ids(
+                [tag_id], include_subtags
+            ))
+
+        return self.filter(
+            get_condition(compile_expression(expression), get_tagged)
+        )
+
+    def facet_counts(self, tags=None, rollup=False):
+        """
+        Return a dict mapping tag IDs to the number of objects in this
+        QuerySet tagged with them (cf. `django_taggsonomy.utils.facet_counts`)
+        """
+        return facet_counts(self, tags=tags, rollup=rollup)
+
+
+TaggableManager = models.Manager.from_queryset(TaggableQuerySet)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Registry of taggable models
+
+While objects of any model may be tagged, only those of taggable models have
+their tag sets deleted along with them. Models are taggable if they
+- inherit from `TaggableMixin`,
+- have been registered with `register` (or decorated with `taggable`) or
+- are listed in the `TAGGSONOMY_TAGGABLE_MODELS` setting.
+"""
+from .conf import get_setting
+
+
+_registry = set()
+
+
+def register(model):
+    """
+    Register the given model class as taggable and return it, so that this may
+    also be used as a class decorator.
+    """
+    from django.apps import apps
+    _registry.add(model)
+    if apps.ready:
+        from .signals import connect_model_receivers
+        connect_model_receivers(model)
+    return model
+
+
+def taggable(model):
+    """
+    Class decorator that registers the given model class as taggable and adds
+    a generic relation named `tagsets` to the tag sets of its objects to it.
+
+    The relation doesn't change the database, so it needs no migration, but
+    lets Django's deletion collector delete the tag sets of deleted objects
+    and lets querysets join them, e.g. with
+    `Article.objects.prefetch_related('tagsets___tags')` or
+    `Article.objects.filter(tagsets___tags=tag)`.
+    """
+    from .models import TagSetRelation
+    model.add_to_class('tagsets', TagSetRelation())
+    return register(model)
+
+
+def has_tagset_relation(model):
+    from .models import TagSetRelation
+    return any(isinstance(field, TagSetRelation)
+               for field in model._meta.private_fields)
+
+
+def get_taggable_models():
+    """
+    Return a list of all installed taggable model classes.
+    """
+    from django.apps import apps
+    return [model for model in apps.get_models() if is_taggable(model)]
+
+
+def is_taggable(model):
+    from .mixins import TaggableMixin
+    if issubclass(model, TaggableMixin):
+        return True
+    concrete_model = model._meta.concrete_model
+    if model in _registry or concrete_model in _registry:
+        return True
+    return concrete_model._meta.label_lower in {
+        label.lower() for label in get_setting('TAGGABLE_MODELS')
+    }
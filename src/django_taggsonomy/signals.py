@@ -1,17 +1,363 @@
+from collections import defaultdict
+from threading import local
+
+from django.apps import apps
 from django.contrib.contenttypes.models import ContentType
-from django.db.models.signals import pre_delete
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
 from django.dispatch import receiver
+from django.test.signals import setting_changed
+
+from .conf import uses_closure_table
+from .expressions import clear_plan_cache
+from . import fragments, index
+from .graph import get_graph, invalidate_graph
+from .lookup import invalidate_lookups
+from .models import Tag, TagClosure, TagSet, TagUsage
+from .models.tagsets import record_tagset_changes
+from .models.usage import get_tag_ids_by_tagset
+from .registry import has_tagset_relation, is_taggable
+from .suggestions import invalidate_suggestions
+
+
+_pending_deletions = local()
+
+
+def _get_pending_deletions():
+    """
+    Return a dict mapping content types to the IDs of their objects being
+    deleted in this thread
+    """
+    if not hasattr(_pending_deletions, 'object_ids'):
+        _pending_deletions.object_ids = defaultdict(set)
+    return _pending_deletions.object_ids
+
+
+def remember_deleted_object(sender, instance, **kwargs):
+    """
+    Remember the IDs of objects of taggable models about to be deleted, so
+    that their tag sets can be deleted all at once after the fact.
+
+    (Django sends `pre_delete` for all objects to be deleted, then deletes
+    them and sends `post_delete` for all of them.)
+    """
+    if not is_taggable(sender):
+        return
+    content_type = ContentType.objects.get_for_model(sender)
+    _get_pending_deletions()[content_type].add(instance.pk)
+
+
+def delete_tagsets(sender, instance, **kwargs):
+    if not is_taggable(sender):
+        return
+    content_type = ContentType.objects.get_for_model(sender)
+    object_ids = _get_pending_deletions().pop(content_type, set())
+    if not object_ids:
+        return
+    # IDs may remain from deletions that were rolled back, so make sure that
+    # the objects are gone.
+    object_ids -= set(sender._base_manager.filter(
+        pk__in=object_ids).values_list('pk', flat=True))
+    TagSet.objects.delete_for_objects(content_type, object_ids)
+
+
+@receiver(post_save, sender=Tag, dispatch_uid='taggsonomy-tag-post_save-handler')
+def add_tag_to_closure(sender, instance, created, **kwargs):
+    if created and uses_closure_table():
+        TagClosure.objects.get_or_create(ancestor=instance, descendant=instance,
+                                         defaults={'depth': 0})
+
+
+@receiver(pre_delete, sender=Tag, dispatch_uid='taggsonomy-tag-pre_delete-handler')
+def remember_subtags_of_deleted_tag(sender, instance, **kwargs):
+    if not uses_closure_table():
+        return
+    # The descendants' closure rows can only be recomputed once the tag and
+    # its inclusions are gone, but by then, the descendants are unknown.
+    instance._closure_descendant_ids = set(
+        instance._descendant_links.filter(depth__gt=0)
+                                  .values_list('descendant', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Tag, dispatch_uid='taggsonomy-tag-post_delete-handler')
+def remove_tag_from_closure(sender, instance, **kwargs):
+    descendant_ids = getattr(instance, '_closure_descendant_ids', None)
+    if descendant_ids:
+        TagClosure.objects.rebuild(descendant_ids)
+
+
+@receiver(m2m_changed, sender=Tag._inclusions.through,
+          dispatch_uid='taggsonomy-inclusions-m2m_changed-handler')
+def update_closure(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep the closure table in line with any change to tag inclusions.
+
+    Changing the supertags of a tag affects the closure rows of the tag itself
+    and of all its descendants.
+    """
+    if not uses_closure_table():
+        return
+    if action == 'pre_clear':
+        # Like above, the affected tags are no longer known after the fact.
+        instance._closure_cleared_ids = (
+            {instance.id} if reverse else
+            set(instance._inclusions.values_list('id', flat=True))
+        )
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if action == 'post_clear':
+            subtag_ids = instance._closure_cleared_ids
+        else:
+            subtag_ids = {instance.id} if reverse else pk_set
+        if subtag_ids:
+            TagClosure.objects.rebuild(
+                TagClosure.objects.get_descendant_ids(subtag_ids)
+            )
+
+
+@receiver(m2m_changed, sender=Tag._inclusions.through,
+          dispatch_uid='taggsonomy-inclusions-graph-handler')
+@receiver(m2m_changed, sender=Tag._exclusions.through,
+          dispatch_uid='taggsonomy-exclusions-graph-handler')
+def update_graph(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_graph()
+
+
+@receiver(post_delete, sender=Tag, dispatch_uid='taggsonomy-tag-graph-handler')
+def remove_tag_from_graph(sender, **kwargs):
+    invalidate_graph()
+
+
+@receiver(post_save, sender=Tag, dispatch_uid='taggsonomy-tag-lookup-save-handler')
+@receiver(post_delete, sender=Tag, dispatch_uid='taggsonomy-tag-lookup-delete-handler')
+def clear_lookups(sender, **kwargs):
+    invalidate_lookups()
+
+
+@receiver(post_save, sender=Tag, dispatch_uid='taggsonomy-tag-suggestion-save-handler')
+@receiver(post_delete, sender=Tag, dispatch_uid='taggsonomy-tag-suggestion-delete-handler')
+def clear_suggestions(sender, **kwargs):
+    invalidate_suggestions()
+
+
+@receiver(post_save, sender=Tag, dispatch_uid='taggsonomy-tag-expression-save-handler')
+@receiver(post_delete, sender=Tag, dispatch_uid='taggsonomy-tag-expression-delete-handler')
+def clear_expression_plans(sender, **kwargs):
+    # Compiled plans refer to tags by ID, but expressions by name.
+    clear_plan_cache()
+
+
+@receiver(m2m_changed, sender=TagSet._tags.through,
+          dispatch_uid='taggsonomy-tagset-tags-m2m_changed-handler')
+def update_usage_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep the usage and roll-up counts, as well as any in-memory indexes, in
+    line with any change to the tags of tag sets.
+    """
+    if not reverse and instance.content_type_id is None:
+        return
+    if action.startswith('pre_'):
+        # Roll-up counts depend on all tags of a tag set, which are no longer
+        # known after the fact.
+        if not reverse:
+            tagset_ids = [instance.id]
+        elif action == 'pre_clear':
+            tagset_ids = instance.tagsets.values_list('id', flat=True)
+        else:
+            tagset_ids = pk_set
+        instance._usage_tag_ids_before = get_tag_ids_by_tagset(tagset_ids)
+        return
+    before = instance._usage_tag_ids_before
+    # Django only reports the tags (or tag sets) that weren't present yet
+    # when adding, but all given ones when removing.
+    changed_ids = {instance.id} if reverse else (pk_set or set())
+    if action == 'post_add':
+        after = {tagset_id: tag_ids | changed_ids
+                 for tagset_id, tag_ids in before.items()}
+    elif action == 'post_clear' and not reverse:
+        after = {}
+    else:
+        after = {tagset_id: tag_ids - changed_ids
+                 for tagset_id, tag_ids in before.items()}
+    record_tagset_changes(
+        before, after,
+        content_type_ids=None if reverse else {
+            instance.id: instance.content_type_id
+        }
+    )
+
+
+def _get_deleted_tagsets():
+    """
+    Return a dict mapping the IDs of the tag sets being deleted in this thread
+    to their content type IDs, object IDs and sets of tag IDs
+    """
+    if not hasattr(_pending_deletions, 'tagsets'):
+        _pending_deletions.tagsets = {}
+    return _pending_deletions.tagsets
+
+
+@receiver(pre_delete, sender=TagSet,
+          dispatch_uid='taggsonomy-tagset-pre_delete-handler')
+def remember_deleted_tagset(sender, instance, **kwargs):
+    """
+    Remember the tags of tag sets about to be deleted, so that the changes can
+    be recorded all at once after the fact.
+    """
+    if '_tags' in getattr(instance, '_prefetched_objects_cache', {}):
+        # The deletion of the tag sets cascaded from their objects (cf.
+        # `TagSetRelation`).
+        tag_ids = {tag.id for tag in instance._tags.all()}
+    else:
+        tag_ids = get_tag_ids_by_tagset([instance.id])[instance.id]
+    _get_deleted_tagsets()[instance.id] = (
+        instance.content_type_id, instance.object_id, tag_ids
+    )
+
+
+@receiver(post_delete, sender=TagSet,
+          dispatch_uid='taggsonomy-tagset-post_delete-handler')
+def record_deleted_tagsets(sender, instance, **kwargs):
+    deleted_tagsets = _get_deleted_tagsets()
+    if instance.id not in deleted_tagsets:
+        # Already recorded along with another tag set
+        return
+    _pending_deletions.tagsets = {}
+    # Like above, tag sets may remain from deletions that were rolled back.
+    for tagset_id in TagSet.objects.filter(
+            id__in=deleted_tagsets).values_list('id', flat=True):
+        del deleted_tagsets[tagset_id]
+    record_tagset_changes(
+        {tagset_id: tag_ids
+         for tagset_id, (_, _, tag_ids) in deleted_tagsets.items()},
+        {},
+        content_type_ids={tagset_id: content_type_id
+                          for tagset_id, (content_type_id, _, _)
+                          in deleted_tagsets.items()},
+        object_ids={tagset_id: object_id
+                    for tagset_id, (_, object_id, _)
+                    in deleted_tagsets.items()}
+    )
+
+
+@receiver(m2m_changed, sender=Tag._inclusions.through,
+          dispatch_uid='taggsonomy-inclusions-rollup-handler')
+def update_rollup_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Recompute the roll-up counts of all tags whose descendants have changed,
+    i.e. of the supertags whose inclusions have changed and their ancestors.
+
+    (This receiver must run after `update_graph`.)
+    """
+    if action == 'pre_clear':
+        instance._rollup_supertag_ids = (
+            set(instance.tag_set.values_list('id', flat=True)) if reverse
+            else {instance.id}
+        )
+        return
+    if action == 'post_clear':
+        supertag_ids = instance._rollup_supertag_ids
+    elif action in ('post_add', 'post_remove'):
+        supertag_ids = pk_set if reverse else {instance.id}
+    else:
+        return
+    if supertag_ids:
+        TagUsage.objects.rebuild_rollups(
+            supertag_ids | get_graph().get_ancestor_ids(*supertag_ids)
+        )
+
+
+@receiver(pre_delete, sender=Tag,
+          dispatch_uid='taggsonomy-tag-rollup-pre_delete-handler')
+def remember_ancestors_of_deleted_tag(sender, instance, **kwargs):
+    instance._rollup_ancestor_ids = get_graph().get_ancestor_ids(instance.id)
+
+
+@receiver(post_delete, sender=Tag,
+          dispatch_uid='taggsonomy-tag-rollup-post_delete-handler')
+def update_rollup_counts_of_ancestors(sender, instance, **kwargs):
+    TagUsage.objects.rebuild_rollups(
+        getattr(instance, '_rollup_ancestor_ids', ())
+    )
+
+
+@receiver(pre_save, sender=Tag, dispatch_uid='taggsonomy-tag-fragment-pre_save-handler')
+def remember_objects_of_changed_tag(sender, instance, **kwargs):
+    """
+    Remember the objects tagged with a tag whose name or colour is about to
+    change, as their cached fragments show the old ones.
+    """
+    if instance.pk is None or not fragments.is_enabled():
+        return
+    old = Tag.objects.filter(pk=instance.pk).values_list('name', 'color')
+    if old and old[0] != (instance.name, instance.color):
+        instance._fragment_objects = fragments.get_tagged_objects(instance)
+
+
+@receiver(pre_delete, sender=Tag, dispatch_uid='taggsonomy-tag-fragment-pre_delete-handler')
+def remember_objects_of_deleted_tag(sender, instance, **kwargs):
+    instance._fragment_objects = fragments.get_tagged_objects(instance)
+
+
+@receiver(post_save, sender=Tag, dispatch_uid='taggsonomy-tag-fragment-post_save-handler')
+@receiver(post_delete, sender=Tag, dispatch_uid='taggsonomy-tag-fragment-post_delete-handler')
+def invalidate_fragments_of_tag(sender, instance, **kwargs):
+    fragments.invalidate_fragments(getattr(instance, '_fragment_objects', ()))
+
+
+def add_object_to_index(sender, instance, created, **kwargs):
+    if created:
+        index.record_object_created(sender, instance.pk)
+
+
+def remove_object_from_index(sender, instance, **kwargs):
+    index.record_object_deleted(sender, instance.pk)
+
+
+@receiver(post_delete, sender=Tag, dispatch_uid='taggsonomy-tag-index-handler')
+def remove_tag_from_indexes(sender, instance, **kwargs):
+    index.record_tag_deleted(instance.id)
+
+
+def connect_model_receivers(model):
+    """
+    Connect the receivers needed for the objects of the given model, if it is
+    taggable or indexed.
+
+    These receivers are only connected to the models they are needed for,
+    rather than to all models, so that Django may still delete the objects of
+    any other model without loading them and sending signals for each one.
+    """
+    label = model._meta.label_lower
+    # The deletion of the tag sets of models with a `TagSetRelation` cascades
+    # from their objects anyway.
+    if is_taggable(model) and not has_tagset_relation(model):
+        pre_delete.connect(
+            remember_deleted_object, sender=model,
+            dispatch_uid='taggsonomy-pre_delete-handler-' + label
+        )
+        post_delete.connect(
+            delete_tagsets, sender=model,
+            dispatch_uid='taggsonomy-post_delete-handler-' + label
+        )
+    if index.is_indexed(model):
+        post_save.connect(
+            add_object_to_index, sender=model,
+            dispatch_uid='taggsonomy-index-post_save-handler-' + label
+        )
+        post_delete.connect(
+            remove_object_from_index, sender=model,
+            dispatch_uid='taggsonomy-index-post_delete-handler-' + label
+        )
+
 
-from .models import TagSet
-from .utils import (get_tagset_for_object,
-                    get_or_create_tagset_for_object)
+def connect_all_model_receivers():
+    for model in apps.get_models():
+        connect_model_receivers(model)
 
 
-@receiver(pre_delete, dispatch_uid='taggsonomy-pre_delete-handler')
-def delete_tagset(sender, **kwargs):
-    instance = kwargs.get('instance')
-    if instance:
-        content_type = ContentType.objects.get_for_model(instance)
-        tagset = get_tagset_for_object(instance)
-        if tagset:
-            tagset.delete()
+@receiver(setting_changed, dispatch_uid='taggsonomy-setting_changed-handler')
+def reconnect_model_receivers(setting, **kwargs):
+    if setting in ('TAGGSONOMY_INDEXED_MODELS', 'TAGGSONOMY_TAGGABLE_MODELS'):
+        connect_all_model_receivers()
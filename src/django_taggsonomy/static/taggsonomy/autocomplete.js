@@ -0,0 +1,58 @@
+/*
+ * Suggest tag names for the inputs of the forms for adding tags, as the user
+ * types, with the tags fetched from the autocomplete view.
+ *
+ * The inputs take comma-separated lists of names, so only the last name is
+ * completed and each suggestion repeats the names before it.
+ */
+(function () {
+  'use strict';
+
+  // Every form includes this script, but it only needs to run once.
+  if (window.taggsonomyAutocomplete) {
+    return;
+  }
+  window.taggsonomyAutocomplete = true;
+
+  var DELAY = 150;
+
+  function suggest(input) {
+    var names = input.value.split(',');
+    var prefix = names.pop().trim();
+    var datalist = document.getElementById(input.getAttribute('list'));
+    if (!prefix || !datalist) {
+      return;
+    }
+    var preceding = names.map(function (name) {
+      return name.trim() + ', ';
+    }).join('');
+    var url = input.dataset.autocompleteUrl + '&q=' +
+      encodeURIComponent(prefix);
+    fetch(url, {credentials: 'same-origin'})
+      .then(function (response) { return response.json(); })
+      .then(function (data) {
+        // Ignore responses for outdated input.
+        if (input.value.split(',').pop().trim() !== prefix) {
+          return;
+        }
+        datalist.replaceChildren.apply(datalist, data.results.map(
+          function (tag) {
+            var option = document.createElement('option');
+            option.value = preceding + tag.name;
+            return option;
+          }
+        ));
+      });
+  }
+
+  document.addEventListener('input', function (event) {
+    var input = event.target;
+    if (!input.classList || !input.classList.contains('taggsonomy-autocomplete')) {
+      return;
+    }
+    clearTimeout(input.taggsonomyTimeout);
+    input.taggsonomyTimeout = setTimeout(function () {
+      suggest(input);
+    }, DELAY);
+  });
+})();
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in, process-local index of tag names sorted case-insensitively, with the
+tags' usage counts, for suggesting tags as users type
+"""
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from heapq import nsmallest
+from itertools import islice
+from time import monotonic
+
+from django.db import transaction
+
+from .conf import get_setting
+from .graph import get_graph
+from .lookup import TagRecord
+from .versioning import is_within_ttl, Version, VersionedValue
+
+
+ORDERS = ('name', 'popularity')
+
+
+class NameIndex(object):
+    """
+    Tags sorted by name, ignoring case, along with their usage counts
+    """
+
+    def __init__(self, tags=(), counts=None):
+        """
+        Build the index from an iterable of (ID, name, colour) triples and a
+        dict mapping tag IDs to the numbers of objects tagged with them.
+        """
+        # Sorted like `TagManager.with_name_prefix` orders the tags
+        entries = sorted((name.lower(), name, tag_id, color)
+                         for tag_id, name, color in tags)
+        self.keys = [(name_lower, name) for name_lower, name, _, _ in entries]
+        self.records = [TagRecord(tag_id, name, color)
+                        for _, name, tag_id, color in entries]
+        self.counts = Counter(dict(counts or {}))
+        self.loaded_at = monotonic()
+
+    @classmethod
+    def load(cls):
+        """
+        Return a new index of the tags and usage counts currently stored in
+        the database
+        """
+        from django.db.models import Sum
+        from .models import Tag, TagUsage
+        return cls(
+            tags=Tag.objects.values_list('id', 'name', 'color'),
+            counts=TagUsage.objects.values_list('tag').annotate(
+                number=Sum('count')
+            ).order_by(),
+        )
+
+    def get_range(self, prefix, after=None):
+        """
+        Return the (start, end) positions of the tags whose names start with
+        the given prefix, ignoring case, and, if `after` is given, come after
+        the tag with that name.
+        """
+        prefix = prefix.lower()
+        start = bisect_left(self.keys, (prefix,))
+        # No name may continue with a character beyond the last code point.
+        end = bisect_left(self.keys, (prefix + chr(0x10ffff),), lo=start)
+        if after is not None:
+            start = max(start, bisect_right(self.keys, (after.lower(), after),
+                                            hi=end))
+        return start, end
+
+    def suggest(self, prefix, limit, after=None, exclude_ids=(),
+                order='name'):
+        """
+        Return a list of the TagRecords of at most `limit` tags whose names
+        start with the given prefix, ignoring case, leaving out those with
+        the given IDs, ordered by name or by popularity (and then by name).
+
+        `after` (cf. `get_range`) only applies to ordering by name.
+        """
+        start, end = self.get_range(prefix, after=after)
+        records = (record for record in islice(self.records, start, end)
+                   if record.id not in exclude_ids)
+        if order == 'popularity':
+            # Ties keep their order by name, as `nsmallest` is stable.
+            return nsmallest(limit, records,
+                             key=lambda record: -self.counts[record.id])
+        return list(islice(records, limit))
+
+
+_index = VersionedValue(Version('taggsonomy:suggestion-version'),
+                        NameIndex.load, is_current=is_within_ttl)
+
+
+def is_enabled():
+    return bool(get_setting('SUGGESTION_INDEX'))
+
+
+def get_name_index():
+    """
+    Return a current NameIndex, (re)building it only if necessary
+    """
+    return _index.get()
+
+
+def invalidate_suggestions():
+    """
+    Mark the name indexes of this and any other process as outdated.
+    """
+    _index.invalidate()
+
+
+def record_count_changes(deltas):
+    """
+    Apply changes to the usage counts, where `deltas` maps (tag ID, content
+    type ID) pairs to the changes of their counts (cf.
+    `TagUsageManager.update_counts`), to the loaded index once they are
+    committed.
+    """
+    index = _index.value
+    if index is None:
+        return
+    counts = Counter()
+    for (tag_id, _), delta in deltas.items():
+        counts[tag_id] += delta
+
+    def apply_changes():
+        # An index rebuilt in the meantime already has the new counts.
+        if _index.value is index:
+            index.counts.update(counts)
+
+    transaction.on_commit(apply_changes)
+
+
+def get_unsuitable_tag_ids(tagset_id):
+    """
+    Return a set of the IDs of the tags not to suggest for the tag set with
+    the given ID, i.e. of its tags, the tags excluded by them and all their
+    subtags (whose supertags would be excluded).
+    """
+    from .models.usage import get_tag_ids_by_tagset
+    tag_ids = get_tag_ids_by_tagset([tagset_id])[tagset_id]
+    graph = get_graph()
+    excluded_ids = graph.get_excluded_ids(*tag_ids)
+    return tag_ids | excluded_ids | graph.get_descendant_ids(*excluded_ids)
+
+
+def suggest_tags(prefix, limit, after=None, tagset_id=None, order='name'):
+    """
+    Return a list of the TagRecords of at most `limit` tags whose names start
+    with the given prefix, ignoring case, ordered by name or by popularity
+    (`order` being 'name' or 'popularity').
+
+    If `after` is given, only the tags after the tag with that name are
+    returned (which only works when ordering by name). If `tagset_id` is
+    given, tags unsuitable for that tag set (cf. `get_unsuitable_tag_ids`)
+    are left out.
+
+    This uses the name index if enabled, or else the database.
+
+    raises ValueError if `order` is invalid or `after` is given when ordering
+    by popularity
+    """
+    from django.db.models import Sum
+    from django.db.models.functions import Coalesce
+    from .models import Tag
+    if order not in ORDERS or (after is not None and order != 'name'):
+        raise ValueError('Invalid order: {}'.format(order))
+    exclude_ids = (get_unsuitable_tag_ids(tagset_id)
+                   if tagset_id is not None else set())
+    if is_enabled():
+        return get_name_index().suggest(prefix, limit, after=after,
+                                        exclude_ids=exclude_ids, order=order)
+    tags = Tag.objects.with_name_prefix(prefix, after=after).exclude(
+        id__in=exclude_ids
+    )
+    if order == 'popularity':
+        tags = tags.alias(
+            popularity=Coalesce(Sum('usages__count'), 0)
+        ).order_by('-popularity', 'name_lower', 'name')
+    return [TagRecord(*values)
+            for values in tags.values_list('id', 'name', 'color')[:limit]]
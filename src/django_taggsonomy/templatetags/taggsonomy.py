@@ -1,13 +1,55 @@
 from django import template
 from django.urls import reverse
+from django.utils.safestring import mark_safe
 
-from ..models import Tag, TagSet
+from ..fragments import get_fragment
+from ..models import TagSet
 from ..models.base import ExclusionTagSet, SuperTagSet, SubTagSet
 from ..utils import get_tag_object, get_or_create_tagset_for_object
 
 
 register = template.Library()
 
+# Names of the URLs to remove tags from tag sets and dependent tag sets
+REMOVAL_URL_NAMES = (
+    (TagSet, 'taggsonomy:remove-tag'),
+    (ExclusionTagSet, 'taggsonomy:unexclude-tag'),
+    (SuperTagSet, 'taggsonomy:remove-supertag'),
+    (SubTagSet, 'taggsonomy:remove-subtag'),
+)
+
+# Stand-in for the tag ID when reversing removal URLs once for many tags,
+# which the `int` path converter accepts, but which, being zero-padded, is
+# never the ID of an actual tag
+PLACEHOLDER = '0' * 20
+
+def get_removal_url_parts(removable_from):
+    """
+    Return the parts of the URL to remove a tag from the given tag set or
+    dependent tag set before and after the tag's ID, or None if tags can't
+    be removed from it, with a single call to `reverse`.
+    """
+    for cls, url_name in REMOVAL_URL_NAMES:
+        if isinstance(removable_from, cls):
+            container_id = (removable_from.id if cls is TagSet
+                            else removable_from.tag.id)
+            url = reverse(url_name, args=(container_id, PLACEHOLDER))
+            # The tag ID is the last argument of all of these URLs.
+            prefix, _, suffix = url.rpartition(PLACEHOLDER)
+            return prefix, suffix
+    return None
+
+def get_tag_context(tag, removal_url_parts=None, url=''):
+    template_context = {'tag': tag}
+    if removal_url_parts is not None:
+        prefix, suffix = removal_url_parts
+        template_context.update(
+            {'removal_url': '{}{}{}'.format(prefix, tag.id, suffix)}
+        )
+    if url:
+        template_context.update({'url': url.format(tag=tag)})
+    return template_context
+
 @register.inclusion_tag('taggsonomy/tag.html')
 def tag(tag, removable_from=None, url=''):
     """
@@ -21,35 +63,59 @@ def tag(tag, removable_from=None, url=''):
     :param url: An (optionally formattable) string to serve as the tag's target URL
     :type url: str, optional
     """
-    template_context = {'tag': get_tag_object(tag)}
-    if isinstance(removable_from, TagSet):
-        template_context.update({'removal_url': reverse('taggsonomy:remove-tag', args=(removable_from.id, tag.id))})
-    elif isinstance(removable_from, ExclusionTagSet):
-        template_context.update({'removal_url': reverse('taggsonomy:unexclude-tag', args=(removable_from.tag.id, tag.id))})
-    elif isinstance(removable_from, SuperTagSet):
-        template_context.update({'removal_url': reverse('taggsonomy:remove-supertag', args=(removable_from.tag.id, tag.id))})
-    elif isinstance(removable_from, SubTagSet):
-        template_context.update({'removal_url': reverse('taggsonomy:remove-subtag', args=(removable_from.tag.id, tag.id))})
-    if url:
-        template_context.update({'url': url.format(tag=tag)})
-    return template_context
+    return get_tag_context(get_tag_object(tag),
+                           get_removal_url_parts(removable_from), url)
 
-@register.inclusion_tag('taggsonomy/tags.html')
-def tags(tagged_object, url=''):
-    tagset = get_or_create_tagset_for_object(tagged_object)
-    return {'tags' :  tagset.all(), 'url': url}
+@register.simple_tag(takes_context=True)
+def tag_items(context, tags, removable_from=None, url=''):
+    """
+    Templatetag to render many tags, just like calling the `tag` templatetag
+    for each one (with the same indentation as in `tags.html`), but with a
+    single template pass and a single call to `reverse`
 
-@register.inclusion_tag('taggsonomy/active_tags.html')
-def active_tags(tagged_object, url=''):
-    tagset = get_or_create_tagset_for_object(tagged_object)
-    return {'tagset' :  tagset, 'url': url}
+    :param tags: The tags to render
+    :type tags: iterable of Tag objects
+    """
+    removal_url_parts = get_removal_url_parts(removable_from)
+    template = context.template.engine.get_template('taggsonomy/tag_items.html')
+    return template.render(context.new({'items': [
+        get_tag_context(tag, removal_url_parts, url) for tag in tags
+    ]}))
+
+def render_cached_fragment(context, template_name, tagged_object, url,
+                           get_context):
+    """
+    Render the given template with the context returned by `get_context`
+    (like an inclusion tag), or take the fragment from the fragment cache
+    (cf. `django_taggsonomy.fragments`).
+    """
+    def render():
+        template = context.template.engine.get_template(template_name)
+        return template.render(context.new(get_context()))
+    return mark_safe(get_fragment(template_name, tagged_object, url, render))
+
+@register.simple_tag(takes_context=True)
+def tags(context, tagged_object, url=''):
+    def get_context():
+        tagset = get_or_create_tagset_for_object(tagged_object)
+        return {'tags' :  tagset.all(), 'url': url}
+    return render_cached_fragment(context, 'taggsonomy/tags.html',
+                                  tagged_object, url, get_context)
+
+@register.simple_tag(takes_context=True)
+def active_tags(context, tagged_object, url=''):
+    def get_context():
+        tagset = get_or_create_tagset_for_object(tagged_object)
+        return {'tagset' :  tagset, 'url': url}
+    return render_cached_fragment(context, 'taggsonomy/active_tags.html',
+                                  tagged_object, url, get_context)
 
 @register.inclusion_tag('taggsonomy/add_tags.html')
 def add_tags_form(tagged_object):
+    # Suggestions are fetched from the autocomplete view as the user types
+    # (cf. `autocomplete.js`), rather than listing all tags.
     tagset = get_or_create_tagset_for_object(tagged_object)
-    contained_ids = [ tag.id for tag in tagset.all() ]
-    tags = Tag.objects.exclude(id__in=contained_ids)
-    return {'tags': tags, 'tagset' :  tagset}
+    return {'tagset' :  tagset}
 
 @register.inclusion_tag('taggsonomy/tag_manager.html')
 def tag_manager(tagged_object, url=''):
@@ -5,15 +5,16 @@ Taggsonomy URL Configuration
 
 from django.urls import path
 
-from .views import (add_tags, remove_tag, remove_subtag, remove_supertag,
-                    unexclude_tag, TagCreateView, TagDeleteView, TagEditView,
-                    TagListView)
+from .views import (add_tags, autocomplete_tags, remove_tag, remove_subtag,
+                    remove_supertag, unexclude_tag, TagCreateView,
+                    TagDeleteView, TagEditView, TagListView)
 
 app_name = 'taggsonomy'
 
 urlpatterns = [
     path('', TagListView.as_view(), name='tag-list'),
     path('create', TagCreateView.as_view(), name='create-tag'),
+    path('autocomplete', autocomplete_tags, name='autocomplete-tags'),
     path('<int:pk>', TagEditView.as_view(), name='edit-tag'),
     path('<int:pk>/delete', TagDeleteView.as_view(), name='delete-tag'),
     path('<int:tag_id>/remove_subtag/<int:subtag_id>',
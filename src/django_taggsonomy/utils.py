@@ -1,7 +1,16 @@
 from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import Count, prefetch_related_objects
 
+from .conf import uses_closure_table
 from .errors import TagTypeError
-from .models import Tag, TagSet
+from .lookup import get_tag
+from .models import Tag, TagClosure, TagSet
+from .models.hierarchy import get_closure_query
+
+
+PREFETCHED_TAGSET_ATTRIBUTE = '_prefetched_tagset'
 
 
 def get_tag_object(tag):
@@ -11,6 +20,9 @@ def get_tag_object(tag):
     - name (str)
     - object ID (int)
 
+    Names and IDs are looked up through the lookup cache (cf.
+    `django_taggsonomy.lookup`).
+
     Raises:
     - Tag.DoesNotExist (if there's not tag with the given name or ID)
     - TagTypeError if the type of `tag` is not one of the expected types.
@@ -18,13 +30,19 @@ def get_tag_object(tag):
     if isinstance(tag, Tag):
         return tag
     elif isinstance(tag, str):
-        return Tag.objects.get(name=tag)
+        tag_object = get_tag(name=tag)
     elif isinstance(tag, int):
-        return Tag.objects.get(id=tag)
+        tag_object = get_tag(id=tag)
     else:
         raise TagTypeError
+    if tag_object is None:
+        raise Tag.DoesNotExist
+    return tag_object
 
 def get_tagset_for_object(object_):
+    prefetched_tagset = getattr(object_, PREFETCHED_TAGSET_ATTRIBUTE, None)
+    if prefetched_tagset is not None:
+        return prefetched_tagset
     content_type = ContentType.objects.get_for_model(object_)
     try:
         tagset = TagSet.objects.get(content_type=content_type,
@@ -34,7 +52,122 @@ def get_tagset_for_object(object_):
     return tagset
 
 def get_or_create_tagset_for_object(object_):
+    prefetched_tagset = getattr(object_, PREFETCHED_TAGSET_ATTRIBUTE, None)
+    if prefetched_tagset is not None:
+        return prefetched_tagset
     content_type = ContentType.objects.get_for_model(object_)
     tagset, _ = TagSet.objects.get_or_create(content_type=content_type,
                                              object_id=object_.id)
     return tagset
+
+def get_or_create_tagsets_for_objects(objects):
+    """
+    Return a dict mapping each of the given model instances to its tag set,
+    creating any missing tag sets in bulk (cf.
+    `TagSetManager.get_or_create_by_object`).
+
+    Takes one query per content type to find existing tag sets and two more
+    if any need to be created.
+
+    raises ValueError if any of the objects is unsaved
+    """
+    objects = list(objects)
+    tagsets = TagSet.objects.get_or_create_by_object(objects)
+    return {
+        object_: tagsets[
+            (ContentType.objects.get_for_model(object_).id, object_.pk)
+        ]
+        for object_ in objects
+    }
+
+def prefetch_tags(objects):
+    """
+    Fetch the tag sets of all given model instances, including their tags, and
+    attach them to the instances, so that neither the above functions nor the
+    templatetags need to query the database for them anymore.
+
+    Takes two queries in total, unless tag sets need to be created.
+    """
+    objects = list(objects)
+    tagsets = get_or_create_tagsets_for_objects(objects)
+    prefetch_related_objects(list(tagsets.values()), '_tags')
+    for object_ in objects:
+        setattr(object_, PREFETCHED_TAGSET_ATTRIBUTE, tagsets[object_])
+    return objects
+
+FACET_QUERY = '''
+    {closure}
+    SELECT c.ancestor_id, COUNT(DISTINCT s.{tagset_pk})
+    FROM {through} t
+    INNER JOIN {tagsets} s ON s.{tagset_pk} = t.{tagset_id}
+    INNER JOIN closure c ON c.descendant_id = t.{tag_id}
+    WHERE s.{content_type_id} = %s AND s.{object_id} IN ({object_ids})
+    GROUP BY c.ancestor_id
+'''
+
+def _get_rollup_facet_counts(queryset, content_type, tag_ids):
+    if uses_closure_table():
+        rows = TagClosure.objects.filter(
+            descendant__tagsets__content_type=content_type,
+            descendant__tagsets__object_id__in=queryset.values('pk')
+        )
+        if tag_ids is not None:
+            rows = rows.filter(ancestor_id__in=tag_ids)
+        return dict(rows.values_list('ancestor').annotate(
+            count=Count('descendant__tagsets', distinct=True)
+        ).order_by())
+    # Without a closure table, join with a recursive query instead.
+    connection = connections[queryset.db]
+    qn = connection.ops.quote_name
+    Through = TagSet._tags.through
+    closure_sql, closure_params = get_closure_query(tag_ids)
+    compiler = queryset.values('pk').query.get_compiler(connection=connection)
+    try:
+        object_ids_sql, object_ids_params = compiler.as_sql()
+    except EmptyResultSet:
+        # e.g. for `none()` or `filter(pk__in=[])`
+        return {}
+    sql = FACET_QUERY.format(
+        closure=closure_sql, object_ids=object_ids_sql,
+        through=qn(Through._meta.db_table),
+        tagsets=qn(TagSet._meta.db_table),
+        tagset_pk=qn(TagSet._meta.pk.column),
+        tagset_id=qn(Through._meta.get_field('tagset').column),
+        tag_id=qn(Through._meta.get_field('tag').column),
+        content_type_id=qn(TagSet._meta.get_field('content_type').column),
+        object_id=qn(TagSet._meta.get_field('object_id').column),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*closure_params, content_type.id,
+                             *object_ids_params])
+        return dict(cursor.fetchall())
+
+def facet_counts(queryset, tags=None, rollup=False):
+    """
+    Return a dict mapping tag IDs to the number of objects in the given
+    queryset that are tagged with the respective tag, or (if `rollup` is True)
+    with the tag or any of its descendants, each object counted once.
+
+    If `tags` (instances, names or IDs) are given, only those are counted.
+    Tags without any objects are left out.
+
+    Takes a single GROUP BY query, with the queryset as a subquery, so the
+    objects are never loaded.
+
+    raises NoSuchTagError if any of the given tags doesn't exist
+    """
+    content_type = ContentType.objects.get_for_model(queryset.model)
+    tag_ids = None
+    if tags is not None:
+        tag_ids = {tag.id for tag in Tag.objects.get_tags_from_arguments(*tags)}
+    if rollup:
+        return _get_rollup_facet_counts(queryset, content_type, tag_ids)
+    rows = TagSet._tags.through.objects.filter(
+        tagset__content_type=content_type,
+        tagset__object_id__in=queryset.values('pk')
+    )
+    if tag_ids is not None:
+        rows = rows.filter(tag_id__in=tag_ids)
+    return dict(rows.values_list('tag').annotate(
+        count=Count('tagset')
+    ).order_by())
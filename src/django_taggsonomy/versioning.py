@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Version tokens for process-local caches of data derived from the database,
+such as the tag graph (cf. `django_taggsonomy.graph`)
+
+Each cache has a version token in the cache named by the `TAGGSONOMY_CACHE`
+setting, which is replaced whenever the cached data change, so that every
+process knows to reload its copy. (For this to work across several processes,
+the cache must be shared among them, of course.)
+
+Changes made inside a transaction must not be cached by the process before
+they are committed, as they might yet be rolled back, but only the thread
+making them (i.e. the connection whose transaction it is) can see them anyway.
+So such changes are tracked per thread by an `on_commit` callback, which
+replaces the version token once more after the commit, and they count as
+pending for as long as that callback remains scheduled. Rolling back the
+transaction (or the savepoint they were made in) unschedules the callback and
+thus ends their pending state, too.
+
+A process may also apply the changes it has committed to its own copy rather
+than reload it (cf. `VersionedValue.update`). Copies which may miss changes
+made by other processes, such as the usage counts in the suggestion index, are
+reloaded once they are older than `TAGGSONOMY_INDEX_TTL` seconds, too (cf.
+`is_within_ttl`).
+"""
+from threading import local
+from time import monotonic
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.db import connection, transaction
+
+from .conf import get_setting
+
+
+def _get_scheduled_callbacks():
+    return {id(callback) for _, callback, *_ in connection.run_on_commit}
+
+
+class _PendingChanges(object):
+    """
+    Callback replacing the version token once changes are committed
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        self.version.bump()
+
+
+class Version(object):
+    """
+    Version token of a process-local cache, stored under the given key
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self._local = local()
+
+    @staticmethod
+    def _get_cache():
+        return caches[get_setting('CACHE')]
+
+    def get(self):
+        """
+        Return the current version token, creating one if there's none.
+        """
+        cache = self._get_cache()
+        version = cache.get(self.key)
+        if version is None:
+            cache.add(self.key, uuid4().hex, timeout=None)
+            version = cache.get(self.key)
+        return version
+
+    def bump(self):
+        """
+        Replace the version token, returning the new one.
+        """
+        version = uuid4().hex
+        self._get_cache().set(self.key, version, timeout=None)
+        return version
+
+    def is_pending(self):
+        """
+        Return whether this thread has made changes that are not committed
+        yet. Values loaded while they are must not be cached for the process.
+        """
+        changes = getattr(self._local, 'changes', [])
+        if not changes:
+            return False
+        scheduled = (_get_scheduled_callbacks() if connection.in_atomic_block
+                     else set())
+        remaining = [change for change in changes
+                     if not change.done and id(change) in scheduled]
+        if len(remaining) < len(changes):
+            # Some changes were committed or rolled back, so whatever this
+            # thread loaded in the meantime may be outdated.
+            self._local.changes = remaining
+            self._local.value = None
+        return bool(remaining)
+
+    def get_pending_value(self):
+        """
+        Return the value this thread loaded while it has pending changes, if
+        any.
+        """
+        return getattr(self._local, 'value', None)
+
+    def set_pending_value(self, value):
+        self._local.value = value
+
+    def invalidate(self):
+        """
+        Replace the version token, once more after the commit if inside a
+        transaction, as other processes may reload their caches before the
+        change becomes visible to them.
+        """
+        self._local.value = None
+        self.bump()
+        if connection.in_atomic_block:
+            change = _PendingChanges(self)
+            changes = getattr(self._local, 'changes', [])
+            self._local.changes = changes + [change]
+            transaction.on_commit(change)
+
+
+def is_within_ttl(value):
+    """
+    Return whether the given value (with a `loaded_at` time) was loaded less
+    than `TAGGSONOMY_INDEX_TTL` seconds ago, for use as `is_current` of the
+    in-memory indexes, which may miss changes made by other processes
+    """
+    ttl = get_setting('INDEX_TTL')
+    return ttl is None or monotonic() - value.loaded_at <= ttl
+
+
+class VersionedValue(object):
+    """
+    Process-local value computed by `load` (e.g. a snapshot of the tag graph),
+    which is reloaded whenever the given Version changes or `is_current`
+    returns False for it
+
+    While this thread has pending changes (cf. `Version.is_pending`), the
+    value is loaded once for them and only reused by this thread.
+    """
+
+    def __init__(self, version, load, is_current=None):
+        self.version = version
+        self.load = load
+        self.is_current = is_current
+        self.value = None
+        self._loaded_version = None
+
+    def get(self):
+        if self.version.is_pending():
+            value = self.version.get_pending_value()
+            if value is None:
+                value = self.load()
+                self.version.set_pending_value(value)
+            return value
+        version = self.version.get()
+        value = self.value
+        if (value is None or version != self._loaded_version
+                or (self.is_current is not None
+                    and not self.is_current(value))):
+            value = self.load()
+            self.value, self._loaded_version = value, version
+        return value
+
+    def invalidate(self):
+        """
+        Drop the value of this and any other process.
+        """
+        self.value = None
+        self.version.invalidate()
+
+    def update(self, change):
+        """
+        Apply committed changes to the value of this process by calling
+        `change` with it, if it's current, and drop the values of all other
+        processes.
+
+        The value is kept along with the new version token, unless another
+        process replaced the token in the meantime, in which case it's
+        dropped, too.
+        """
+        value = self.value
+        if value is not None and self.version.get() == self._loaded_version:
+            change(value)
+            self._loaded_version = self.version.bump()
+        else:
+            self.value = None
+            self.version.bump()
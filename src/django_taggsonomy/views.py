@@ -1,9 +1,12 @@
+from django.http import JsonResponse
 from django.shortcuts import redirect
 from django.urls import NoReverseMatch, reverse_lazy
 from django.views import generic
 
+from .conf import get_setting
 from .forms import TagForm
 from .models import Tag, TagSet
+from .suggestions import suggest_tags
 
 
 class TagCreateView(generic.CreateView):
@@ -26,7 +29,39 @@ class TagEditView(generic.UpdateView):
 
 class TagListView(generic.ListView):
     template_name = 'taggsonomy/tag_list.html'
-    model = Tag
+    # Usage counts come from the prefetched counters, not from aggregation.
+    queryset = Tag.objects.prefetch_related('usages')
+
+
+def autocomplete_tags(request):
+    """
+    Return a JSON object with a list of the tags (`results`) whose names start
+    with the `q` parameter, ignoring case, and whether there are more (`more`).
+
+    Optional parameters:
+    - `limit`: the maximum number of tags to return (up to the
+      `TAGGSONOMY_AUTOCOMPLETE_LIMIT` setting),
+    - `order`: `name` (the default) or `popularity`, i.e. by the number of
+      objects tagged with the tags,
+    - `after`: the name of the last tag of the previous page (only when
+      ordering by name),
+    - `tagset`: the ID of a tag set whose tags, and the tags excluded by them,
+      are left out.
+    """
+    max_limit = get_setting('AUTOCOMPLETE_LIMIT')
+    try:
+        limit = max(min(int(request.GET.get('limit', max_limit)), max_limit), 0)
+        tagset_id = request.GET.get('tagset')
+        tagset_id = int(tagset_id) if tagset_id else None
+        results = suggest_tags(request.GET.get('q', ''), limit + 1,
+                               after=request.GET.get('after'),
+                               tagset_id=tagset_id,
+                               order=request.GET.get('order', 'name'))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid parameters'}, status=400)
+    return JsonResponse({'results': [record._asdict()
+                                     for record in results[:limit]],
+                         'more': len(results) > limit})
 
 
 def add_tags(request, tagset_id):
@@ -13,5 +13,10 @@ INSTALLED_APPS = (
     'django.contrib.contenttypes',
 
     'django_taggsonomy',
+    'tests.testapp',
 )
 SECRET_KEY = 'not very secret at all, actually'
+TAGGSONOMY_TAGGABLE_MODELS = (
+    'auth.Group',
+    'auth.Permission',
+)
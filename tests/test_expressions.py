@@ -0,0 +1,147 @@
+from django.contrib.auth.models import Group
+from django.test import TestCase, override_settings
+
+from django_taggsonomy.errors import NoSuchTagError, TagExpressionError
+from django_taggsonomy.expressions import (clear_plan_cache,
+                                           compile_expression, normalize,
+                                           parse, to_string)
+from django_taggsonomy.lookup import lookup_version
+from django_taggsonomy.models import Tag, TagSet
+from django_taggsonomy.querysets import TaggableQuerySet
+from django_taggsonomy.utils import get_or_create_tagset_for_object
+
+from .test_models.mixins import create_group, FixtureSetupMixin
+
+
+class ParserTests(TestCase):
+    """
+    Tests for parsing and normalizing tag expressions
+    """
+
+    def test_precedence(self):
+        self.assertEqual(
+            parse('a OR b AND NOT c'),
+            ('or', (('name', 'a'),
+                    ('and', (('name', 'b'), ('not', ('name', 'c'))))))
+        )
+        self.assertEqual(
+            parse('(a or b) and 12'),
+            ('and', (('or', (('name', 'a'), ('name', 'b'))), ('id', 12)))
+        )
+
+    def test_quoted_names(self):
+        self.assertEqual(parse('"Web Development"'),
+                         ('name', 'Web Development'))
+        self.assertEqual(parse(r'"say \"and\"" OR "42"'),
+                         ('or', (('name', 'say "and"'), ('name', '42'))))
+        self.assertEqual(parse('team:infra'), ('name', 'team:infra'))
+
+    def test_normalize(self):
+        self.assertEqual(
+            to_string(normalize(parse('b AND (c AND a) AND NOT NOT b'))),
+            '"a" AND "b" AND "c"'
+        )
+        self.assertEqual(
+            to_string(normalize(parse('NOT (x OR 3) AND (z OR y)'))),
+            '("y" OR "z") AND NOT ("x" OR 3)'
+        )
+
+    def test_normalized_expression_is_parsed_alike(self):
+        tree = normalize(parse(r'(a OR "b \\ c") AND NOT ("d\"" AND e)'))
+        self.assertEqual(parse(to_string(tree)), tree)
+
+    def test_malformed_expressions_ERROR(self):
+        for expression in ('', 'a AND', 'a b', '(a OR b', 'a)', 'NOT',
+                           'a AND OR b', '"a', '\u00b2', 'a OR \u0663'):
+            with self.assertRaises(TagExpressionError):
+                parse(expression)
+        self.assertEqual(parse('"\u00b2"'), ('name', '\u00b2'))
+
+
+class MatchingTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for filtering by tag expressions
+    """
+    fixtures = ['tags.json']
+
+    @classmethod
+    def setUpClass(cls):
+        # Let plans be cached, as if the fixtures had been committed.
+        with cls.captureOnCommitCallbacks(execute=True):
+            super(MatchingTests, cls).setUpClass()
+
+    def setUp(self):
+        super(MatchingTests, self).setUp()
+        self.groups = TaggableQuerySet(model=Group)
+        self.django_group = create_group('Django', self.django)
+        self.js_group = create_group('JavaScript', self.javascript)
+        self.tagging_group = create_group('Tagging', self.taggsonomy)
+        self.untagged_group = Group.objects.create(name='Untagged')
+
+    def tearDown(self):
+        # Tags created by a test case are rolled back, so don't keep plans.
+        clear_plan_cache()
+
+    def assertGroups(self, expression, *groups, **kwargs):
+        self.assertEqual({*self.groups.matching(expression, **kwargs)},
+                         {*groups})
+
+    def test_matching(self):
+        self.assertGroups('Django OR Taggsonomy',
+                          self.django_group, self.tagging_group)
+        self.assertGroups('Programming AND NOT Python', self.js_group)
+        self.assertGroups('NOT Programming',
+                          self.tagging_group, self.untagged_group)
+        self.assertGroups(
+            '("Web Development" OR {}) AND NOT Django'.format(self.python.id),
+            self.js_group
+        )
+
+    def test_matching_includes_subtags(self):
+        TagSet.objects.get(object_id=self.js_group.id)._tags.remove(
+            self.programming
+        )
+        self.assertGroups('Programming', self.django_group, self.js_group)
+        self.assertGroups('Programming', self.django_group,
+                          include_subtags=False)
+
+    def test_matching_is_a_single_query(self):
+        compile_expression('Programming AND NOT (Python OR Tagging)')
+        with self.assertNumQueries(1):
+            self.assertGroups('NOT (Tagging OR Python) AND Programming',
+                              self.js_group)
+
+    def test_plans_are_cached_until_tags_change(self):
+        compile_expression('Python OR Tagging')
+        with self.assertNumQueries(0):
+            compile_expression('Tagging or Python')
+        Tag.objects.create(name='Rust')
+        with self.assertNumQueries(1):
+            compile_expression('Tagging or Python')
+
+    def test_plans_are_outdated_by_other_processes(self):
+        compile_expression('Python OR Tagging')
+        # As if another process had renamed a tag
+        lookup_version.bump()
+        with self.assertNumQueries(1):
+            compile_expression('Python OR Tagging')
+
+    def test_tagset_manager_matching(self):
+        tagset = get_or_create_tagset_for_object(self.js_group)
+        self.assertEqual(
+            {*TagSet.objects.matching('"Web Development" AND NOT Python')},
+            {tagset}
+        )
+
+    def test_nonexisting_tag_ERROR(self):
+        with self.assertRaises(NoSuchTagError):
+            self.groups.matching('Python OR Rust')
+        with self.assertRaises(NoSuchTagError):
+            self.groups.matching('Python OR 999')
+
+
+@override_settings(TAGGSONOMY_HIERARCHY='cte')
+class RecursiveQueryMatchingTests(MatchingTests):
+    """
+    Tests for filtering by tag expressions, without a closure table
+    """
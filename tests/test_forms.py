@@ -0,0 +1,82 @@
+from django.test import TestCase
+
+from django_taggsonomy.forms import TagForm, TagsField
+from django_taggsonomy.graph import get_graph, invalidate_graph
+
+from .test_models.mixins import FixtureSetupMixin
+
+
+class TagFormTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for the form for creating and editing tags
+    """
+    fixtures = ['tags.json']
+
+    def tearDown(self):
+        # The test case's changes are rolled back, so don't keep the graph.
+        invalidate_graph()
+
+    def get_form(self, **data):
+        return TagForm(data=dict({'name': 'New tag', 'color': 'd0d0d0'},
+                                 **data))
+
+    def test_tag_names_are_resolved_at_once(self):
+        form = self.get_form(subtags='Django, JavaScript',
+                             supertags='Web Development',
+                             exclusions='Tagging,Taggsonomy')
+        # Let the tag graph be cached, as if committed.
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_graph()
+        get_graph()
+        with self.assertNumQueries(2):
+            # One query for the tags, one for the uniqueness of the name
+            self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['subtags'],
+                         {self.django, self.javascript})
+        self.assertEqual(form.cleaned_data['supertags'],
+                         {self.web_development})
+        self.assertEqual(form.cleaned_data['exclusions'],
+                         {self.tagging, self.taggsonomy})
+
+    def test_nonexisting_tag_names(self):
+        form = self.get_form(subtags='Django, Rust, Go',
+                             supertags='Programming, Haskell')
+        self.assertFalse(form.is_valid())
+        self.assertEqual(
+            [error.params['name'] for error in
+             form.errors.as_data()['subtags']],
+            ['Go', 'Rust']
+        )
+        self.assertEqual(
+            [error.code for error in form.errors.as_data()['supertags']],
+            ['nosuchtag']
+        )
+
+    def test_relations_are_saved(self):
+        form = self.get_form(subtags='Django', supertags='Web Development',
+                             exclusions='Tagging')
+        tag = form.save()
+        self.assertEqual(set(tag.get_direct_subtags()), {self.django})
+        self.assertEqual(set(tag.get_direct_supertags()),
+                         {self.web_development})
+        self.assertTrue(tag.excludes(self.tagging))
+
+    def test_invalid_relations(self):
+        form = self.get_form(subtags='Django',
+                             supertags='Knowledge Management, Programming',
+                             exclusions='Python, Taggsonomy')
+        self.assertFalse(form.is_valid())
+        self.assertEqual(
+            [error.code for error in form.errors.as_data()['supertags']],
+            ['MutuallyExclusiveSupertagsError']
+        )
+        self.assertEqual(
+            [error.code for error in form.errors.as_data()['exclusions']],
+            ['CommonSubtagExclusionError']
+        )
+        self.assertNotIn('subtags', form.errors)
+
+    def test_standalone_field(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(TagsField().clean('Python, Django'),
+                             {self.python, self.django})
@@ -0,0 +1,78 @@
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.template import Context, Engine
+from django.test import TestCase, override_settings
+
+from django_taggsonomy.models import TagSet
+from django_taggsonomy.utils import get_or_create_tagset_for_object
+
+from .test_models.mixins import FixtureSetupMixin
+
+
+@override_settings(TAGGSONOMY_FRAGMENT_CACHE='default')
+class FragmentCacheTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for caching the fragments rendered by the `tags` templatetag
+    """
+    fixtures = ['tags.json']
+
+    def setUp(self):
+        super(FragmentCacheTests, self).setUp()
+        cache.clear()
+        self.group = Group.objects.create(name='Group')
+        self.other_group = Group.objects.create(name='Other group')
+        get_or_create_tagset_for_object(self.group).add(self.django)
+        get_or_create_tagset_for_object(self.other_group).add(self.tagging)
+        self.template = Engine(
+            loaders=['django.template.loaders.app_directories.Loader'],
+            libraries={'taggsonomy': 'django_taggsonomy.templatetags.taggsonomy'}
+        ).from_string('{% load taggsonomy %}{% tags group url=url %}')
+
+    def tearDown(self):
+        cache.clear()
+
+    def render(self, group=None, url=''):
+        return self.template.render(Context({'group': group or self.group,
+                                             'url': url}))
+
+    def test_fragments_are_cached(self):
+        html = self.render()
+        self.assertIn('Django', html)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.render(), html)
+        self.assertIn('/tags/Python/', self.render(url='/tags/{tag.name}/'))
+
+    def test_tag_changes_invalidate_fragment(self):
+        self.render()
+        self.render(self.other_group)
+        get_or_create_tagset_for_object(self.group).remove(self.django)
+        self.assertNotIn('Django', self.render())
+        TagSet.objects.bulk_add([self.group], self.javascript)
+        self.assertIn('JavaScript', self.render())
+        # The other group's fragment is still cached.
+        with self.assertNumQueries(0):
+            self.render(self.other_group)
+
+    def test_renaming_tag_invalidates_fragments(self):
+        self.render()
+        self.render(self.other_group)
+        self.javascript.color = '000000'
+        self.javascript.save()
+        with self.assertNumQueries(0):
+            self.render()
+        self.python.name = 'Python 3'
+        self.python.save()
+        self.assertIn('Python 3', self.render())
+        with self.assertNumQueries(0):
+            self.render(self.other_group)
+
+    def test_deleting_tag_invalidates_fragments(self):
+        self.render()
+        self.django.delete()
+        self.assertNotIn('Django', self.render())
+
+    @override_settings(TAGGSONOMY_FRAGMENT_CACHE=None)
+    def test_fragments_are_opt_in(self):
+        self.render()
+        with self.assertNumQueries(2):
+            self.render()
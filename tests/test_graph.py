@@ -0,0 +1,148 @@
+from django.db import DatabaseError, transaction
+from django.test import TestCase, TransactionTestCase
+
+from django_taggsonomy.graph import (_graph, get_graph, invalidate_graph,
+                                     TagGraph)
+
+from .test_models.mixins import FixtureSetupMixin
+
+
+class TagGraphTests(TestCase):
+    """
+    Tests for the in-memory representation of the tag graph
+    """
+
+    def setUp(self):
+        self.graph = TagGraph(inclusions=[(1, 2), (2, 3), (4, 3)],
+                              exclusions=[(1, 5), (4, 6)])
+
+    def test_ancestors(self):
+        self.assertEqual(self.graph.get_ancestor_ids(3), {1, 2, 4})
+        self.assertEqual(self.graph.get_ancestor_ids(1), set())
+        self.assertEqual(self.graph.get_ancestor_ids(2, 5), {1})
+
+    def test_descendants(self):
+        self.assertEqual(self.graph.get_descendant_ids(1), {2, 3})
+        self.assertEqual(self.graph.get_descendant_ids(3), set())
+
+    def test_exclusions_are_mutual(self):
+        self.assertTrue(self.graph.excludes(1, 5))
+        self.assertTrue(self.graph.excludes(5, 1))
+        self.assertFalse(self.graph.excludes(1, 6))
+        self.assertEqual(self.graph.get_excluded_ids(1, 6), {4, 5})
+
+    def test_exclusion_pairs(self):
+        self.assertEqual(self.graph.get_exclusion_pairs({1, 4, 5, 6}),
+                         {(1, 5), (4, 6)})
+        self.assertEqual(self.graph.get_exclusion_pairs({1, 4}), set())
+
+    def test_unknown_tags(self):
+        self.assertEqual(self.graph.get_ancestor_ids(7), set())
+        self.assertFalse(self.graph.includes(7, 1))
+        self.assertEqual(self.graph.get_exclusion_pairs({7, 8}), set())
+
+    def test_changing_a_copy(self):
+        self.graph.get_descendant_ids(1)
+        graph = self.graph.copy()
+        graph.add_inclusion(3, 6)
+        graph.remove_inclusion(1, 2)
+        graph.add_exclusion(2, 4)
+        graph.remove_exclusion(5, 1)
+        self.assertEqual(graph.get_descendant_ids(1), set())
+        self.assertEqual(graph.get_ancestor_ids(6), {2, 3, 4})
+        self.assertEqual(graph.get_exclusion_pairs({1, 2, 4, 5, 6}),
+                         {(2, 4), (4, 6)})
+        # The original graph is left alone.
+        self.assertEqual(self.graph.get_descendant_ids(1), {2, 3})
+        self.assertFalse(self.graph.excludes(2, 4))
+        self.assertTrue(self.graph.excludes(1, 5))
+
+
+class GraphCacheTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for the process-local caching of the tag graph
+    """
+    fixtures = ['tags.json']
+
+    def tearDown(self):
+        # The test case's changes are rolled back, so don't keep the graph.
+        invalidate_graph()
+
+    def test_graph_is_reused_once_committed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.web_development.include(self.python)
+        graph = get_graph()
+        with self.assertNumQueries(0):
+            self.assertIs(get_graph(), graph)
+
+    def test_graph_is_not_reused_before_commit(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            self.web_development.include(self.python)
+            graph = get_graph()
+            # The uncommitted graph is reused within its transaction…
+            with self.assertNumQueries(0):
+                self.assertIs(get_graph(), graph)
+        # … but not kept for the process.
+        self.assertIsNone(_graph.value)
+
+    def test_graph_is_reloaded_after_savepoint_rollback(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            try:
+                with transaction.atomic():
+                    self.web_development.include(self.python)
+                    self.assertIn(self.web_development.id,
+                                  get_graph().get_ancestor_ids(self.django.id))
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+            self.assertNotIn(self.web_development.id,
+                             get_graph().get_ancestor_ids(self.django.id))
+
+    def test_inclusion_invalidates_graph(self):
+        self.assertNotIn(self.web_development.id,
+                         get_graph().get_ancestor_ids(self.django.id))
+        self.web_development.include(self.python)
+        self.assertIn(self.web_development.id,
+                      get_graph().get_ancestor_ids(self.django.id))
+
+    def test_exclusion_invalidates_graph(self):
+        self.assertFalse(get_graph().excludes(self.django.id,
+                                              self.javascript.id))
+        self.django.exclude(self.javascript)
+        self.assertTrue(get_graph().excludes(self.django.id,
+                                             self.javascript.id))
+
+    def test_tag_deletion_invalidates_graph(self):
+        self.assertIn(self.python.id,
+                      get_graph().get_ancestor_ids(self.django.id))
+        self.python.delete()
+        self.assertNotIn(self.python.id,
+                         get_graph().get_ancestor_ids(self.django.id))
+
+
+class GraphRollbackTests(FixtureSetupMixin, TransactionTestCase):
+    """
+    Tests for the caching of the tag graph after transactions are rolled back
+    """
+    fixtures = ['tags.json']
+
+    def setUp(self):
+        super(GraphRollbackTests, self).setUp()
+        invalidate_graph()
+
+    def tearDown(self):
+        invalidate_graph()
+
+    def test_graph_is_cached_again_after_rollback(self):
+        try:
+            with transaction.atomic():
+                self.web_development.include(self.python)
+                get_graph()
+                raise DatabaseError
+        except DatabaseError:
+            pass
+        graph = get_graph()
+        self.assertNotIn(self.web_development.id,
+                         graph.get_ancestor_ids(self.django.id))
+        with self.assertNumQueries(0):
+            self.assertIs(get_graph(), graph)
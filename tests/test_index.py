@@ -0,0 +1,186 @@
+from django.contrib.auth.models import Group, Permission
+from django.test import TestCase, override_settings
+
+from django_taggsonomy.errors import UnindexedModelError
+from django_taggsonomy.graph import invalidate_graph
+from django_taggsonomy.index import (_indexes, Bitmap, clear_indexes, count,
+                                     get_bitmap, get_index, get_object_ids)
+from django_taggsonomy.models import TagSet
+from django_taggsonomy.utils import (facet_counts,
+                                     get_or_create_tagset_for_object)
+
+from .test_models.mixins import create_group, FixtureSetupMixin
+
+
+class BitmapTests(TestCase):
+    """
+    Tests for the conversion between object IDs and bitmaps
+    """
+
+    def test_bitmaps(self):
+        object_ids = [0, 3, 8, 9, 1000, 70000, 2 ** 31]
+        bitmap = get_bitmap(object_ids)
+        self.assertEqual(get_object_ids(bitmap), object_ids)
+        self.assertEqual(count(bitmap), 7)
+        self.assertEqual(get_object_ids(get_bitmap([])), [])
+
+    def test_chunks(self):
+        # Few IDs per chunk are kept as arrays, many as ints.
+        bitmap = get_bitmap([2 ** 31 + 5, 2 ** 31 + 60000, *range(1000)])
+        self.assertEqual(sorted(bitmap.chunks), [0, 2 ** 15])
+        self.assertEqual(bitmap.chunks[0], 2 ** 1000 - 1)
+        self.assertEqual(list(bitmap.chunks[2 ** 15]), [5, 60000])
+
+    def test_operations(self):
+        universe = get_bitmap(range(0, 200000, 3))
+        bitmap = Bitmap.from_object_ids(range(0, 200000, 6),
+                                        universe=universe)
+        other = get_bitmap(range(0, 200000, 4))
+        self.assertEqual(get_object_ids(bitmap & other),
+                         list(range(0, 200000, 12)))
+        self.assertEqual(set(bitmap | other),
+                         set(range(0, 200000, 6)) | set(range(0, 200000, 4)))
+        self.assertEqual(get_object_ids(bitmap - other),
+                         [object_id for object_id in range(0, 200000, 6)
+                          if object_id % 4])
+        self.assertEqual(get_object_ids(~bitmap), list(range(3, 200000, 6)))
+
+    def test_add_and_discard(self):
+        bitmap = get_bitmap([70000])
+        for object_id in range(100):
+            bitmap.add(object_id)
+        bitmap.add(70000)
+        self.assertIsInstance(bitmap.chunks[0], int)
+        self.assertIn(99, bitmap)
+        for object_id in range(1, 100):
+            bitmap.discard(object_id)
+        bitmap.discard(70000)
+        bitmap.discard(12345)
+        self.assertEqual(get_object_ids(bitmap), [0])
+        self.assertNotIn(70000, bitmap)
+
+
+@override_settings(TAGGSONOMY_INDEXED_MODELS=['auth.Group'])
+class TagIndexTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for the in-memory inverted tag indexes
+    """
+    fixtures = ['tags.json']
+
+    @classmethod
+    def setUpClass(cls):
+        # Let expression plans be cached, as if the fixtures had been
+        # committed.
+        with cls.captureOnCommitCallbacks(execute=True):
+            super(TagIndexTests, cls).setUpClass()
+
+    def setUp(self):
+        super(TagIndexTests, self).setUp()
+        self.django_group = create_group('Django', self.django)
+        self.js_group = create_group('JavaScript', self.javascript)
+        self.tagging_group = create_group('Tagging', self.taggsonomy)
+        self.untagged_group = Group.objects.create(name='Untagged')
+
+    def tearDown(self):
+        # The test case's changes are rolled back, so don't keep the indexes.
+        clear_indexes()
+        invalidate_graph()
+
+    def assertGroups(self, bitmap, *groups):
+        self.assertEqual(get_object_ids(bitmap),
+                         sorted(group.id for group in groups))
+
+    def test_filter(self):
+        index = get_index(Group)
+        # Let the tag graph be cached, as if committed.
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_graph()
+        # … and the tag expressions be compiled.
+        for expression in ('Programming AND NOT Python', 'NOT Programming',
+                           'Programming'):
+            index.filter(expression)
+        with self.assertNumQueries(0):
+            self.assertGroups(index.filter('Programming AND NOT Python'),
+                              self.js_group)
+            self.assertGroups(index.filter('NOT Programming'),
+                              self.tagging_group, self.untagged_group)
+            self.assertGroups(index.filter('Programming',
+                                           include_subtags=False),
+                              self.django_group, self.js_group)
+
+    def test_filter_includes_subtags(self):
+        get_or_create_tagset_for_object(self.js_group)._tags.remove(
+            self.programming
+        )
+        index = get_index(Group)
+        self.assertGroups(index.filter('Programming'),
+                          self.django_group, self.js_group)
+
+    def test_facet_counts_match_database(self):
+        index = get_index(Group)
+        bitmap = index.filter('Programming OR Taggsonomy')
+        for rollup in (False, True):
+            self.assertEqual(
+                index.facet_counts(bitmap, rollup=rollup),
+                facet_counts(Group.objects.exclude(name='Untagged'),
+                             rollup=rollup)
+            )
+        self.assertEqual(
+            index.facet_counts(tag_ids=[self.python.id, self.taggsonomy.id,
+                                        self.tagging.id]),
+            {self.python.id: 1, self.taggsonomy.id: 1}
+        )
+
+    def test_index_is_updated_on_commit(self):
+        index = get_index(Group)
+        with self.captureOnCommitCallbacks(execute=True):
+            get_or_create_tagset_for_object(self.untagged_group).add(
+                self.python
+            )
+            get_or_create_tagset_for_object(self.js_group).remove(
+                self.javascript
+            )
+            group = create_group('New', self.tagging)
+        self.assertIs(get_index(Group), index)
+        self.assertGroups(index.filter('Python'),
+                          self.django_group, self.untagged_group)
+        self.assertGroups(index.filter('NOT Programming'),
+                          self.tagging_group, group)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.untagged_group.delete()
+            TagSet.objects.bulk_add([self.tagging_group], self.django)
+        self.assertGroups(index.filter('Python'),
+                          self.django_group, self.tagging_group)
+
+    def test_index_is_not_updated_before_commit(self):
+        index = get_index(Group)
+        with self.captureOnCommitCallbacks(execute=False):
+            get_or_create_tagset_for_object(self.untagged_group).add(
+                self.python
+            )
+        self.assertGroups(index.filter('Python'), self.django_group)
+
+    def test_index_is_rebuilt_after_changes_by_other_processes(self):
+        index = get_index(Group)
+        # As if another process had committed a change
+        _indexes[index.content_type.id].version.bump()
+        self.assertIsNot(get_index(Group), index)
+
+    def test_changes_outdate_indexes_of_other_processes(self):
+        index = get_index(Group)
+        version = _indexes[index.content_type.id].version
+        old_version = version.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            get_or_create_tagset_for_object(self.untagged_group).add(
+                self.python
+            )
+        self.assertNotEqual(version.get(), old_version)
+
+    @override_settings(TAGGSONOMY_INDEX_TTL=0)
+    def test_index_is_rebuilt_after_ttl(self):
+        index = get_index(Group)
+        self.assertIsNot(get_index(Group), index)
+
+    def test_unindexed_model_ERROR(self):
+        with self.assertRaises(UnindexedModelError):
+            get_index(Permission)
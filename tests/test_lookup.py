@@ -0,0 +1,131 @@
+from collections import OrderedDict
+from threading import Thread
+from unittest import mock
+
+from django.db import DatabaseError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from django_taggsonomy import lookup
+from django_taggsonomy.errors import NoSuchTagError
+from django_taggsonomy.lookup import _records, get_tag, invalidate_lookups
+from django_taggsonomy.models import Tag
+from django_taggsonomy.utils import get_tag_object
+
+from .test_models.mixins import FixtureSetupMixin
+
+
+class TagLookupTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for the process-local cache of tags by name and ID
+    """
+    fixtures = ['tags.json']
+
+    @classmethod
+    def setUpClass(cls):
+        # Let lookups be cached, as if the fixtures had been committed.
+        with cls.captureOnCommitCallbacks(execute=True):
+            super(TagLookupTests, cls).setUpClass()
+
+    def tearDown(self):
+        # The test case's changes are rolled back, so don't keep the lookups.
+        invalidate_lookups()
+
+    def test_lookups_are_cached(self):
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                tag = Tag.objects.get_tag_from_argument('Python')
+        self.assertEqual(tag, self.python)
+        self.assertEqual((tag.name, tag.color),
+                         (self.python.name, self.python.color))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_tag_object(self.python.id), self.python)
+
+    def test_missing_tags_are_cached(self):
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                with self.assertRaises(NoSuchTagError):
+                    Tag.objects.get_tag_from_argument('Rust')
+        with self.assertRaises(Tag.DoesNotExist):
+            get_tag_object('Rust')
+
+    def test_saving_a_tag_invalidates_lookups(self):
+        get_tag(name='Rust')
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Rust')
+            self.python.name = 'Python 3'
+            self.python.save()
+        self.assertIsNotNone(get_tag(name='Rust'))
+        self.assertEqual(get_tag(id=self.python.id).name, 'Python 3')
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.get_tags_from_arguments('Go', create_nonexisting=True)
+        self.assertIsNotNone(get_tag(name='Go'))
+
+    def test_uncommitted_lookups_are_not_cached(self):
+        Tag.objects.create(name='Rust')
+        get_tag(name='Rust')
+        with self.assertNumQueries(1):
+            get_tag(name='Rust')
+
+    @override_settings(TAGGSONOMY_LOOKUP_CACHE_SIZE=2)
+    def test_cache_is_bounded(self):
+        get_tag(name='Python')  # Caches the tag by name and ID
+        get_tag(name='Django')
+        with self.assertNumQueries(1):
+            get_tag(name='Python')
+
+    @override_settings(TAGGSONOMY_LOOKUP_SHARED=True)
+    def test_shared_lookups(self):
+        get_tag(name='Python')
+        # As if in another process
+        _records.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_tag(name='Python'), self.python)
+
+    @override_settings(TAGGSONOMY_LOOKUP_CACHE_SIZE=1)
+    def test_concurrent_eviction(self):
+        get_tag(name='Rust')
+        threads = []
+
+        class Records(OrderedDict):
+            def get(self, key, default=None):
+                record = super(Records, self).get(key, default)
+                # Another thread stores a record, evicting this one, before
+                # this thread gets to move it to the end (unless it waits).
+                thread = Thread(target=lookup._store, args=(
+                    lookup._version, {('name', 'Go'): lookup.MISSING}
+                ))
+                threads.append(thread)
+                thread.start()
+                thread.join(timeout=0.1)
+                return record
+
+        with mock.patch.object(lookup, '_records', Records(lookup._records)):
+            with self.assertNumQueries(0):
+                self.assertIsNone(get_tag(name='Rust'))
+            threads[0].join()
+
+
+class TagLookupRollbackTests(FixtureSetupMixin, TransactionTestCase):
+    """
+    Tests for the caching of tag lookups after transactions are rolled back
+    """
+    fixtures = ['tags.json']
+
+    def setUp(self):
+        super(TagLookupRollbackTests, self).setUp()
+        invalidate_lookups()
+
+    def tearDown(self):
+        invalidate_lookups()
+
+    def test_lookups_are_cached_again_after_rollback(self):
+        try:
+            with transaction.atomic():
+                self.python.name = 'Python 3'
+                self.python.save()
+                raise DatabaseError
+        except DatabaseError:
+            pass
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                self.assertEqual(get_tag(name='Python'), self.python)
@@ -1,4 +1,17 @@
+from django.contrib.auth.models import Group
+
 from django_taggsonomy.models import Tag, TagSet
+from django_taggsonomy.utils import get_or_create_tagset_for_object
+
+
+def create_group(name, *tags):
+    """
+    Create a group tagged with the given tags.
+    """
+    group = Group.objects.create(name=name)
+    get_or_create_tagset_for_object(group).add(*tags)
+    return group
+
 
 class ExclusionSetupMixin(object):
     """
@@ -0,0 +1,69 @@
+from django.test import TestCase
+
+from django_taggsonomy.models import Tag, TagClosure
+
+from .mixins import FixtureSetupMixin
+
+
+class TagClosureTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for the maintenance of the tag inclusion closure table
+    """
+    fixtures = ['tags.json']
+
+    def get_depth(self, ancestor, descendant):
+        return TagClosure.objects.get(ancestor=ancestor,
+                                      descendant=descendant).depth
+
+    def test_fixture_closure(self):
+        self.assertEqual(self.get_depth(self.django, self.django), 0)
+        self.assertEqual(self.get_depth(self.python, self.django), 1)
+        self.assertEqual(self.get_depth(self.programming, self.django), 2)
+        self.assertFalse(TagClosure.objects.filter(
+            ancestor=self.web_development, descendant=self.django).exists())
+
+    def test_new_tag_is_its_own_ancestor(self):
+        tag = Tag.objects.create(name='Rust')
+        self.assertEqual(self.get_depth(tag, tag), 0)
+        self.assertEqual(TagClosure.objects.filter(descendant=tag).count(), 1)
+
+    def test_include_adds_rows_for_all_descendants(self):
+        self.web_development.include(self.python)
+        self.assertEqual(self.get_depth(self.web_development, self.python), 1)
+        self.assertEqual(self.get_depth(self.web_development, self.django), 2)
+
+    def test_include_shortens_depth(self):
+        self.programming.include(self.django)
+        self.assertEqual(self.get_depth(self.programming, self.django), 1)
+        self.assertNotIn(self.django, self.programming.get_indirect_subtags())
+
+    def test_uninclude_removes_rows_for_all_descendants(self):
+        self.programming.uninclude(self.python)
+        self.assertFalse(TagClosure.objects.filter(
+            ancestor=self.programming, descendant=self.python).exists())
+        self.assertFalse(TagClosure.objects.filter(
+            ancestor=self.programming, descendant=self.django).exists())
+        self.assertEqual(self.get_depth(self.python, self.django), 1)
+
+    def test_uninclude_keeps_rows_reachable_otherwise(self):
+        self.programming.include(self.django)
+        self.programming.uninclude(self.python)
+        self.assertEqual(self.get_depth(self.programming, self.django), 1)
+
+    def test_clearing_supertags(self):
+        self.javascript.tag_set.clear()
+        self.assertFalse(self.javascript.get_all_supertags().exists())
+        self.assertEqual(self.get_depth(self.javascript, self.javascript), 0)
+
+    def test_deleting_intermediate_tag(self):
+        self.python.delete()
+        self.assertFalse(TagClosure.objects.filter(
+            ancestor=self.programming, descendant=self.django).exists())
+        self.assertFalse(self.django.get_all_supertags().exists())
+
+    def test_rebuild(self):
+        TagClosure.objects.all().delete()
+        TagClosure.objects.rebuild()
+        self.assertEqual(self.get_depth(self.django, self.django), 0)
+        self.assertEqual(self.get_depth(self.programming, self.django), 2)
+        self.assertEqual(TagClosure.objects.filter(depth__gt=0).count(), 6)
@@ -1,9 +1,15 @@
-from django.test import TestCase
-
-from django_taggsonomy.errors import (CommonSubtagExclusionError,
-    MutualExclusionError, MutuallyExclusiveSupertagsError, SelfExclusionError,
-    SimultaneousInclusionExclusionError)
-from django_taggsonomy.models import Tag, TagSet
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from django_taggsonomy.errors import (CircularInclusionError,
+    CommonSubtagExclusionError,
+    MutualExclusionError, MutuallyExclusiveSupertagsError, NoSuchTagError,
+    SelfExclusionError, SimultaneousInclusionExclusionError)
+from django_taggsonomy.models import (check_mutually_exclusive_tags,
+                                      get_mutually_exclusive_pairs, Tag,
+                                      TagClosure, TagSet)
+from django_taggsonomy.models.tags import get_prefix_end
 
 from .mixins import ExclusionSetupMixin, InclusionSetupMixin, FixtureSetupMixin
 
@@ -169,6 +175,30 @@ class TagExclusionTests(ExclusionSetupMixin, TestCase):
             self.tag2.exclude(self.tag1)
 
 
+class MutuallyExclusiveTagsTests(ExclusionSetupMixin, TestCase):
+    """
+    Tests for finding mutually exclusive tags among a set of tags
+    """
+
+    def test_get_mutually_exclusive_pairs(self):
+        with self.assertNumQueries(1):
+            pairs = get_mutually_exclusive_pairs(
+                {self.tag0, self.tag1, self.tag2}
+            )
+        self.assertEqual(pairs, {(self.tag0, self.tag1),
+                                 (self.tag0, self.tag2)})
+
+    def test_get_mutually_exclusive_pairs_without_exclusions(self):
+        self.assertEqual(
+            get_mutually_exclusive_pairs({self.tag1, self.tag2}), set()
+        )
+
+    def test_check_mutually_exclusive_tags(self):
+        self.assertTrue(check_mutually_exclusive_tags({self.tag0, self.tag2}))
+        self.assertFalse(check_mutually_exclusive_tags({self.tag1, self.tag2}))
+        self.assertFalse(check_mutually_exclusive_tags(set()))
+
+
 class TagInclusionTests(InclusionSetupMixin, TestCase):
     """
     Test for Tag model's inclusion mechanism
@@ -351,3 +381,200 @@ class SubtagTests(FixtureSetupMixin, TestCase):
         self.assertIn(self.django, indirect_subtags)
         self.assertNotIn(self.python, indirect_subtags)
         self.assertNotIn(self.javascript, indirect_subtags)
+
+
+class TagArgumentTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for resolving tag arguments to tags
+    """
+    fixtures = ['tags.json']
+
+    def test_get_tags_from_arguments(self):
+        with self.assertNumQueries(2):
+            tags = Tag.objects.get_tags_from_arguments(
+                self.python, 'Django', 'JavaScript', self.tagging.id,
+                self.programming.id, 'Python'
+            )
+        self.assertEqual(tags, {self.python, self.django, self.javascript,
+                                self.tagging, self.programming})
+
+    def test_nonexisting_arguments(self):
+        for argument in ('Rust', 0, 1.5):
+            with self.assertRaises(NoSuchTagError):
+                Tag.objects.get_tags_from_arguments('Python', argument)
+
+    def test_create_nonexisting(self):
+        names = ['New tag {}'.format(index) for index in range(20)]
+        with self.assertNumQueries(6):
+            tags = Tag.objects.get_tags_from_arguments(
+                'Python', *names, create_nonexisting=True
+            )
+        self.assertEqual({tag.name for tag in tags}, {'Python', *names})
+        self.assertTrue(all(tag.id for tag in tags))
+        new_tag = Tag.objects.get(name='New tag 0')
+        self.assertTrue(TagClosure.objects.filter(
+            ancestor=new_tag, descendant=new_tag, depth=0
+        ).exists())
+        self.assertEqual(
+            Tag.objects.get_tags_from_arguments('New tag 0', 'New tag 1',
+                                                create_nonexisting=True),
+            {new_tag, Tag.objects.get(name='New tag 1')}
+        )
+
+    def test_get_tags_by_argument(self):
+        with self.assertNumQueries(2):
+            tags_by_argument = Tag.objects.get_tags_by_argument(
+                [self.python, 'Django', self.tagging.id, 'Rust', 0, 1.5]
+            )
+        self.assertEqual(tags_by_argument, {self.python: self.python,
+                                            'Django': self.django,
+                                            self.tagging.id: self.tagging})
+
+
+class NamePrefixTests(TestCase):
+    """
+    Tests for finding tags by the prefixes of their names
+    """
+
+    def setUp(self):
+        for name in ('Python', 'pytest', 'PyPI', 'Django', 'pz',
+                     'py' + chr(0x10ffff), 'p' + chr(0x10ffff)):
+            Tag.objects.create(name=name)
+
+    def get_names(self, prefix, after=None):
+        return list(Tag.objects.with_name_prefix(
+            prefix, after=after
+        ).values_list('name', flat=True))
+
+    def test_prefix(self):
+        self.assertEqual(self.get_names('PY'),
+                         ['PyPI', 'pytest', 'Python', 'py' + chr(0x10ffff)])
+        self.assertEqual(self.get_names('py', after='pytest'),
+                         ['Python', 'py' + chr(0x10ffff)])
+        self.assertEqual(self.get_names('p' + chr(0x10ffff)),
+                         ['p' + chr(0x10ffff)])
+        self.assertEqual(len(self.get_names('')), 7)
+
+    def test_prefix_end(self):
+        self.assertEqual(get_prefix_end('py'), 'pz')
+        self.assertEqual(get_prefix_end('p' + chr(0x10ffff)), 'q')
+        self.assertIsNone(get_prefix_end(chr(0x10ffff) * 2))
+
+    def test_index_is_searched(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plans differ between databases')
+        plan = Tag.objects.with_name_prefix('py').explain()
+        self.assertIn('SEARCH', plan)
+        self.assertIn('taggsonomy_tag_name_lower', plan)
+
+
+class RelationChangeTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for changing the relations of a tag all at once
+    """
+    fixtures = ['tags.json']
+
+    def test_apply_relations(self):
+        new_tag = Tag.objects.create(name='New tag')
+        errors = Tag.objects.apply_relations(
+            new_tag,
+            add_subtags=['Django', 'Rust', new_tag.id],
+            add_supertags=[self.knowledge_management, self.programming],
+            add_exclusions=['Taggsonomy', 'Python', new_tag],
+        )
+        self.assertEqual(
+            [(relation, argument, type(error))
+             for relation, argument, error in errors],
+            [('add_subtags', 'Rust', NoSuchTagError),
+             ('add_supertags', self.programming,
+              MutuallyExclusiveSupertagsError),
+             ('add_exclusions', 'Python', CommonSubtagExclusionError),
+             ('add_exclusions', new_tag, SelfExclusionError)]
+        )
+        self.assertEqual(set(new_tag.get_direct_subtags()), {self.django})
+        self.assertEqual(set(new_tag.get_direct_supertags()),
+                         {self.knowledge_management})
+        self.assertEqual(set(new_tag.get_excluded_tags()), {self.taggsonomy})
+        # The closure table has been kept up to date, too.
+        self.assertIn(self.knowledge_management,
+                      self.django.get_all_supertags())
+
+    def test_changes_are_validated_against_each_other(self):
+        errors = Tag.objects.apply_relations(
+            self.python,
+            remove_subtags=[self.django],
+            add_exclusions=[self.django],
+        )
+        self.assertEqual(errors, [])
+        self.assertTrue(self.python.excludes(self.django))
+        self.assertFalse(self.python.includes(self.django))
+        errors = Tag.objects.apply_relations(self.javascript,
+                                             add_subtags=[self.programming])
+        self.assertIsInstance(errors[0][2], CircularInclusionError)
+
+    def test_mutual_exclusion(self):
+        TagSet.objects.create().add(self.python, self.taggsonomy)
+        errors = Tag.objects.apply_relations(
+            self.taggsonomy, add_exclusions=['Python', 'JavaScript']
+        )
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0][2], MutualExclusionError)
+        self.assertEqual(errors[0][2].pairs, {(self.taggsonomy, self.python)})
+        self.assertTrue(self.taggsonomy.excludes(self.javascript))
+
+    def test_check_relations_changes_nothing(self):
+        errors = Tag.objects.check_relations(
+            Tag(name='Unsaved'), add_subtags=['Python'],
+            add_exclusions=['Django']
+        )
+        self.assertIsInstance(errors[0][2],
+                              SimultaneousInclusionExclusionError)
+        self.assertEqual(list(self.python.get_direct_supertags()),
+                         [self.programming])
+        self.assertFalse(Tag.objects.filter(name='Unsaved').exists())
+
+    def test_query_count_is_constant(self):
+        tags = [Tag.objects.create(name='Tag {}'.format(index))
+                for index in range(10)]
+        # Let the graph loaded within the test's transaction be reused.
+        Tag.objects.apply_relations(self.taggsonomy, add_subtags=tags[:1])
+        with CaptureQueriesContext(connection) as context:
+            Tag.objects.apply_relations(self.taggsonomy,
+                                        add_subtags=tags[1:3])
+        with self.assertNumQueries(len(context.captured_queries)):
+            Tag.objects.apply_relations(self.taggsonomy,
+                                        add_subtags=tags[3:])
+
+
+@override_settings(TAGGSONOMY_HIERARCHY='cte')
+class RecursiveQueryInclusionTests(TagInclusionTests):
+    """
+    Tests for Tag model's inclusion mechanism, without a closure table
+    """
+
+
+@override_settings(TAGGSONOMY_HIERARCHY='cte')
+class RecursiveQuerySupertagTests(SupertagTests):
+    """
+    Tests for handling of supertags by tags, without a closure table
+    """
+
+
+@override_settings(TAGGSONOMY_HIERARCHY='cte')
+class RecursiveQuerySubtagTests(SubtagTests):
+    """
+    Tests for handling of subtags by tags, without a closure table
+    """
+
+    def test_get_all_subtags_is_chainable(self):
+        all_subtags = self.programming.get_all_subtags()
+        self.assertEqual({*all_subtags.filter(name__startswith='J')},
+                         {self.javascript})
+
+    def test_get_all_subtags_of_wide_hierarchy(self):
+        # More subtags than SQLite allows terms in a compound SELECT
+        subtags = Tag.objects.bulk_create(
+            Tag(name='Language {}'.format(number)) for number in range(600)
+        )
+        self.programming._inclusions.add(*subtags)
+        self.assertEqual(self.programming.get_all_subtags().count(), 603)
@@ -1,10 +1,16 @@
+from django.contrib.auth.models import Group
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from django_taggsonomy.errors import (
     CircularInclusionError, CommonSubtagExclusionError, MutualExclusionError,
     MutuallyExclusiveSupertagsError, NoSuchTagError,
     SupertagAdditionWouldRemoveExcludedError)
+from django_taggsonomy.graph import invalidate_graph
 from django_taggsonomy.models import Tag, TagSet
+from django_taggsonomy.models.tagsets import add_tags_to_tagsets
+from django_taggsonomy.utils import get_or_create_tagset_for_object
 
 from .mixins import ExclusionSetupMixin, InclusionSetupMixin, FixtureSetupMixin
 
@@ -211,6 +217,14 @@ class TagSetExclusionTests(ExclusionSetupMixin, TestCase):
             self.tagset.add(self.tag0, self.tag1)
         self.assertFalse(self.tagset.exists())
 
+    def test_adding_mutually_exclusive_tags_ERROR_names_pairs(self):
+        with self.assertRaises(MutualExclusionError) as context:
+            self.tagset.add(self.tag0, self.tag1, self.tag2)
+        self.assertEqual(context.exception.pairs, {(self.tag0, self.tag1),
+                                                   (self.tag0, self.tag2)})
+        self.assertEqual(str(context.exception),
+                         'foo excludes bar, foo excludes baz')
+
     def test_adding_tags_with_excluded_supertags_ERROR(self):
         subtag = Tag.objects.create(name='barbar')
         self.tag1.include(subtag)
@@ -233,6 +247,25 @@ class TagSetExclusionTests(ExclusionSetupMixin, TestCase):
         self.assertEqual(self.tagset.count(), 1)
         self.assertTrue(self.tag1 in self.tagset)
 
+    def test_adding_tag_excluding_many_present_tags(self):
+        unrelated_tag = Tag.objects.create(name='qux')
+
+        def count_queries_for_adding_tag0(number_of_present_tags):
+            tagset = TagSet.objects.create()
+            tags = Tag.objects.bulk_create(
+                Tag(name='{}-{}'.format(number_of_present_tags, number))
+                for number in range(number_of_present_tags)
+            )
+            self.tag0._exclusions.add(*tags)
+            tagset._tags.add(unrelated_tag, *tags)
+            with CaptureQueriesContext(connection) as context:
+                tagset.add(self.tag0)
+            self.assertEqual({*tagset.all()}, {self.tag0, unrelated_tag})
+            return len(context.captured_queries)
+
+        self.assertEqual(count_queries_for_adding_tag0(30),
+                         count_queries_for_adding_tag0(3))
+
     def test_adding_tag_with_supertag_excluding_already_present_tag(self):
         subtag = Tag.objects.create(name='barbar')
         self.tag1.include(subtag)
@@ -498,6 +531,23 @@ class NewInclusionRelationTests(FixtureSetupMixin, TestCase):
         self.assertIn(self.tagging, tagset)
         self.assertIn(self.knowledge_management, tagset)
 
+    def test_new_inclusion_adds_supertag_to_tagsets_of_subtags_when_update_enabled(self):
+        # Get the TagSet that already contains the Tag "Django" (and nothing else)
+        tagset = TagSet.objects.get(pk=3)
+        self.assertNotIn(self.web_development, tagset)
+        self.web_development.include(self.python, update_tagsets=True)
+        self.assertIn(self.web_development, tagset)
+
+    def test_new_inclusion_which_would_lead_to_silent_removal_of_tags_from_tagsets_of_subtags_ERROR(self):
+        tagset = TagSet.objects.create()
+        tagset._tags.add(self.django, self.knowledge_management)
+        backend = Tag.objects.create(name='Backend')
+        backend.exclude(self.knowledge_management)
+        with self.assertRaises(SupertagAdditionWouldRemoveExcludedError):
+            backend.include(self.python, update_tagsets=True)
+        self.assertFalse(backend.includes(self.python))
+        self.assertNotIn(backend, tagset)
+
     def test_new_inclusion_does_not_add_unrelated_supertags_when_update_enabled(self):
         # Get the TagSet that already contains the Tag "Django" (and nothing else)
         tagset = TagSet.objects.get(pk=3)
@@ -558,3 +608,129 @@ class NewInclusionRelationTests(FixtureSetupMixin, TestCase):
             self.programming.exclude(self.knowledge_management)
         with self.assertRaises(CommonSubtagExclusionError):
             self.knowledge_management.exclude(self.programming)
+
+
+class AddTagsToTagSetsTests(TestCase):
+    """
+    Tests for adding tags to many tag sets in bulk
+    """
+
+    def setUp(self):
+        self.tag0 = Tag.objects.create(name='foo')
+        self.tag1 = Tag.objects.create(name='bar')
+        self.tagsets = [TagSet.objects.create() for _ in range(5)]
+        self.tagsets[0]._tags.add(self.tag0)
+
+    def test_add_tags_to_tagsets(self):
+        add_tags_to_tagsets([tagset.id for tagset in self.tagsets[:4]],
+                            [self.tag0.id, self.tag1.id], batch_size=3)
+        for tagset in self.tagsets[:4]:
+            self.assertEqual({*tagset.all()}, {self.tag0, self.tag1})
+        self.assertFalse(self.tagsets[4].exists())
+
+    def test_add_tags_to_tagsets_from_queryset(self):
+        add_tags_to_tagsets(
+            TagSet.objects.values_list('id', flat=True), [self.tag1.id],
+            batch_size=2
+        )
+        self.assertEqual(TagSet._tags.through.objects.count(), 6)
+
+    def test_graph_is_loaded_once(self):
+        # As if the graph had changed within the test's transaction
+        invalidate_graph()
+        with CaptureQueriesContext(connection) as context:
+            add_tags_to_tagsets([tagset.id for tagset in self.tagsets],
+                                [self.tag0.id, self.tag1.id], batch_size=1)
+        graph_queries = [
+            query for query in context.captured_queries
+            if query['sql'].endswith('"django_taggsonomy_tag__exclusions"')
+        ]
+        self.assertEqual(len(graph_queries), 1)
+
+
+class TagPropagationTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for the Tag methods adding tags to the tag sets of other tags
+    """
+    fixtures = ['tags.json']
+
+    def setUp(self):
+        super(TagPropagationTests, self).setUp()
+        self.django_tagset = TagSet.objects.create()
+        self.django_tagset._tags.add(self.django)
+        self.python_tagset = TagSet.objects.create()
+        self.python_tagset._tags.add(self.python)
+
+    def test_add_tag_to_tagsets(self):
+        self.python.add_tag_to_tagsets(self.taggsonomy)
+        self.assertIn(self.taggsonomy, self.python_tagset)
+        self.assertNotIn(self.taggsonomy, self.django_tagset)
+
+    def test_add_tag_to_subtagsets(self):
+        self.programming.add_tag_to_subtagsets('Taggsonomy')
+        self.python.add_tag_to_subtagsets(self.tagging)
+        self.assertEqual(set(self.python_tagset.all()),
+                         {self.python, self.taggsonomy})
+        self.assertEqual(set(self.django_tagset.all()), {
+            self.django, self.taggsonomy, self.tagging,
+            self.knowledge_management
+        })
+
+    def test_add_supertags_to_tagset(self):
+        self.django.add_supertags_to_tagset(self.django_tagset)
+        self.assertEqual(set(self.django_tagset.all()),
+                         {self.django, self.python, self.programming})
+
+
+class TagSetBulkAddTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for adding tags to the tag sets of many objects at once
+    """
+    fixtures = ['tags.json']
+
+    def setUp(self):
+        super(TagSetBulkAddTests, self).setUp()
+        self.groups = [Group.objects.create(name='Group {}'.format(number))
+                       for number in range(5)]
+        self.existing_tagset = get_or_create_tagset_for_object(self.groups[0])
+        self.existing_tagset.add(self.knowledge_management)
+
+    def test_bulk_add_to_queryset(self):
+        TagSet.objects.bulk_add(Group.objects.all(), 'Django', batch_size=2)
+        for group in self.groups:
+            tagset = get_or_create_tagset_for_object(group)
+            self.assertEqual({*tagset.all()},
+                             {self.django, self.python, self.programming})
+
+    def test_bulk_add_to_instances(self):
+        TagSet.objects.bulk_add(self.groups[:2], self.tagging)
+        self.assertEqual(TagSet.objects.exclude(content_type=None).count(), 2)
+        self.assertEqual({*self.existing_tagset.all()},
+                         {self.tagging, self.knowledge_management})
+        self.assertEqual(
+            {*get_or_create_tagset_for_object(self.groups[1]).all()},
+            {self.tagging, self.knowledge_management}
+        )
+
+    def test_bulk_add_removes_excluded_tags(self):
+        TagSet.objects.bulk_add(Group.objects.all(), self.python)
+        self.assertEqual({*self.existing_tagset.all()},
+                         {self.python, self.programming})
+
+    def test_bulk_add_mutually_exclusive_tags_ERROR(self):
+        with self.assertRaises(MutualExclusionError):
+            TagSet.objects.bulk_add(Group.objects.all(), self.programming,
+                                    self.knowledge_management)
+        with self.assertRaises(MutuallyExclusiveSupertagsError):
+            TagSet.objects.bulk_add(Group.objects.all(), self.django,
+                                    self.tagging)
+        self.assertEqual(TagSet.objects.exclude(content_type=None).count(), 1)
+        self.assertEqual({*self.existing_tagset.all()},
+                         {self.knowledge_management})
+
+    def test_bulk_add_nonexisting_tag(self):
+        with self.assertRaises(NoSuchTagError):
+            TagSet.objects.bulk_add(Group.objects.all(), 'Rust')
+        TagSet.objects.bulk_add(Group.objects.all(), 'Rust',
+                                create_nonexisting=True)
+        self.assertEqual(Tag.objects.get(name='Rust').tagsets.count(), 5)
@@ -0,0 +1,195 @@
+from io import StringIO
+
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from django_taggsonomy.models import TagSet, TagUsage
+from django_taggsonomy.utils import get_or_create_tagset_for_object
+from django_taggsonomy.views import TagListView
+
+from .mixins import FixtureSetupMixin
+
+
+class TagUsageTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for the maintenance of the per-content-type tag usage counters
+    """
+    fixtures = ['tags.json']
+
+    def setUp(self):
+        super(TagUsageTests, self).setUp()
+        self.group_type = ContentType.objects.get_for_model(Group)
+        self.groups = [Group.objects.create(name=str(i)) for i in range(3)]
+        self.permission = Permission.objects.first()
+
+    def tagset_for(self, object_):
+        return get_or_create_tagset_for_object(object_)
+
+    def assertCounts(self, tag, total, groups=None):
+        self.assertEqual(tag.usage_count(), total)
+        self.assertEqual(tag.usage_count(self.group_type),
+                         total if groups is None else groups)
+
+    def test_add_counts_tag_and_supertags(self):
+        self.tagset_for(self.groups[0]).add(self.django)
+        self.tagset_for(self.groups[1]).add(self.python)
+        self.tagset_for(self.groups[1]).add(self.django)
+        self.assertCounts(self.django, 2)
+        self.assertCounts(self.python, 2)
+        self.assertCounts(self.programming, 2)
+        self.assertCounts(self.javascript, 0)
+
+    def test_counts_per_content_type(self):
+        self.tagset_for(self.groups[0]).add(self.python)
+        self.tagset_for(self.permission).add(self.python)
+        self.assertCounts(self.python, 2, groups=1)
+
+    def test_remove_only_counts_present_tags(self):
+        tagset = self.tagset_for(self.groups[0])
+        tagset.add(self.python)
+        tagset.remove(self.python, self.javascript)
+        self.assertCounts(self.python, 0)
+        self.assertCounts(self.programming, 1)
+        self.assertCounts(self.javascript, 0)
+
+    def test_clear_and_reverse_changes(self):
+        tagset = self.tagset_for(self.groups[0])
+        tagset.add(self.django)
+        tagset._tags.clear()
+        self.assertCounts(self.programming, 0)
+        self.tagging.tagsets.add(tagset, self.tagset_for(self.groups[1]))
+        self.assertCounts(self.tagging, 2)
+        self.tagging.tagsets.remove(tagset)
+        self.assertCounts(self.tagging, 1)
+
+    def test_deletion(self):
+        self.tagset_for(self.groups[0]).add(self.django)
+        self.groups[0].delete()
+        self.assertCounts(self.python, 0)
+        self.tagset_for(self.groups[1]).add(self.tagging)
+        self.tagging.delete()
+        self.assertFalse(TagUsage.objects.filter(tag_id=self.tagging.id))
+
+    def test_tagsets_without_object_are_not_counted(self):
+        self.tagset.add(self.python)
+        self.assertCounts(self.python, 0)
+
+    def test_bulk_paths(self):
+        TagSet.objects.bulk_add(self.groups, self.python)
+        self.assertCounts(self.programming, 3)
+        self.web_development.include(self.python, update_tagsets=True)
+        self.assertCounts(self.web_development, 3)
+        # Knowledge Management excludes Programming.
+        TagSet.objects.bulk_add(self.groups[1:], self.knowledge_management)
+        self.assertCounts(self.programming, 1)
+        self.assertCounts(self.knowledge_management, 2)
+
+    def test_rebuild_command(self):
+        TagSet.objects.bulk_add(self.groups, self.django)
+        self.tagset_for(self.permission).add(self.python)
+        counts = set(TagUsage.objects.values_list('tag', 'content_type',
+                                                  'count'))
+        TagUsage.objects.update(count=0)
+        call_command('rebuild_tag_counts', stdout=StringIO())
+        self.assertEqual(set(TagUsage.objects.values_list(
+            'tag', 'content_type', 'count')), counts)
+
+    def test_tag_list_does_not_aggregate(self):
+        TagSet.objects.bulk_add(self.groups, self.django)
+        view = TagListView()
+        with self.assertNumQueries(2):
+            counts = {tag.name: tag.usage_count()
+                      for tag in view.get_queryset()}
+        self.assertEqual(counts['Programming'], 3)
+        self.assertEqual(counts['Tagging'], 0)
+
+
+class RollupCountTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for the maintenance of the roll-up counts, i.e. of the objects tagged
+    with a tag or any of its descendants
+    """
+    fixtures = ['tags.json']
+
+    def setUp(self):
+        super(RollupCountTests, self).setUp()
+        self.groups = [Group.objects.create(name=str(i)) for i in range(4)]
+        # Tagged with a subtag only, without its supertags
+        self.tagset_for(self.groups[0])._tags.add(self.django)
+        self.tagset_for(self.groups[1]).add(self.python)
+        self.tagset_for(self.groups[2]).add(self.javascript)
+        self.tagset_for(self.groups[3]).add(self.tagging)
+
+    def tagset_for(self, object_):
+        return get_or_create_tagset_for_object(object_)
+
+    def assertRollupCounts(self, **counts):
+        for name, count in counts.items():
+            tag = getattr(self, name)
+            self.assertEqual(tag.rollup_count(), count, name)
+            # Compare with the distinct count over all subtags.
+            self.assertEqual(
+                TagSet.objects.exclude(content_type=None).filter(
+                    _tags__in=[tag, *tag.get_all_subtags()]
+                ).distinct().count(),
+                count, name
+            )
+
+    def test_rollup_counts(self):
+        self.assertRollupCounts(django=1, python=2, programming=3,
+                                web_development=1, knowledge_management=1,
+                                taggsonomy=0)
+        self.assertEqual(self.programming.usage_count(), 2)
+
+    def test_tagset_changes(self):
+        self.tagset_for(self.groups[1]).remove(self.python)
+        self.assertRollupCounts(python=1, programming=3)
+        self.tagset_for(self.groups[2])._tags.clear()
+        self.assertRollupCounts(programming=2, web_development=0)
+        self.python.tagsets.add(self.tagset_for(self.groups[2]))
+        self.assertRollupCounts(python=2, programming=3)
+        self.groups[0].delete()
+        self.assertRollupCounts(django=0, python=1, programming=2)
+
+    def test_inclusion_changes(self):
+        self.web_development.include(self.python)
+        self.assertRollupCounts(web_development=3)
+        self.programming.uninclude(self.python)
+        self.assertRollupCounts(programming=2, python=2)
+        self.django.tag_set.clear()
+        self.assertRollupCounts(python=1, web_development=2)
+        self.tagging.include(self.django)
+        self.assertRollupCounts(tagging=2, knowledge_management=2)
+
+    def test_include_updating_tagsets(self):
+        self.web_development.include(self.python, update_tagsets=True)
+        self.assertRollupCounts(web_development=3, programming=3)
+        self.assertEqual(self.web_development.usage_count(), 3)
+
+    def test_tag_deletion(self):
+        self.python.delete()
+        self.assertRollupCounts(programming=2, django=1)
+
+    def test_bulk_paths(self):
+        # Knowledge Management excludes Programming.
+        TagSet.objects.bulk_add(self.groups[:2], self.knowledge_management)
+        self.assertRollupCounts(knowledge_management=3, programming=3,
+                                python=2, django=1)
+        self.assertEqual(self.programming.usage_count(), 1)
+
+    def test_rebuild(self):
+        counts = set(TagUsage.objects.values_list('tag', 'content_type',
+                                                  'count', 'rollup_count'))
+        TagUsage.objects.all().delete()
+        TagUsage.objects.rebuild()
+        self.assertEqual(set(TagUsage.objects.values_list(
+            'tag', 'content_type', 'count', 'rollup_count')), counts)
+
+
+@override_settings(TAGGSONOMY_HIERARCHY='cte')
+class RecursiveQueryRollupCountTests(RollupCountTests):
+    """
+    Tests for the maintenance of the roll-up counts, without a closure table
+    """
@@ -0,0 +1,84 @@
+from django.contrib.auth.models import Group
+from django.test import TestCase, override_settings
+
+from django_taggsonomy.errors import NoSuchTagError
+from django_taggsonomy.querysets import TaggableQuerySet
+from django_taggsonomy.utils import get_or_create_tagset_for_object
+
+from .test_models.mixins import create_group, FixtureSetupMixin
+
+
+class TaggedWithTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for filtering taggable querysets by tags
+    """
+    fixtures = ['tags.json']
+
+    def setUp(self):
+        super(TaggedWithTests, self).setUp()
+        self.groups = TaggableQuerySet(model=Group)
+        self.django_group = create_group('Django', self.django)
+        self.js_group = create_group('JavaScript', self.javascript)
+        self.tagging_group = create_group('Tagging', self.tagging,
+                                               self.taggsonomy)
+        # Tagged with a subtag only, without its supertags
+        self.python_group = create_group('Python')
+        get_or_create_tagset_for_object(self.python_group)._tags.add(
+            self.django
+        )
+        self.untagged_group = create_group('Untagged')
+
+    def assertGroups(self, queryset, *groups):
+        self.assertEqual({*queryset}, {*groups})
+
+    def test_tagged_with_all(self):
+        self.assertGroups(self.groups.tagged_with(all=['Programming']),
+                          self.django_group, self.js_group)
+        self.assertGroups(
+            self.groups.tagged_with(all=[self.programming, self.python]),
+            self.django_group
+        )
+
+    def test_tagged_with_any(self):
+        self.assertGroups(
+            self.groups.tagged_with(any=[self.web_development.id,
+                                         self.tagging]),
+            self.js_group, self.tagging_group
+        )
+
+    def test_tagged_with_none(self):
+        self.assertGroups(
+            self.groups.tagged_with(none=[self.programming, 'Tagging']),
+            self.python_group, self.untagged_group
+        )
+
+    def test_tagged_with_combined(self):
+        self.assertGroups(
+            self.groups.filter(name__startswith='J').tagged_with(
+                all=[self.programming], any=[self.web_development],
+                none=[self.django]
+            ),
+            self.js_group
+        )
+
+    def test_tagged_with_subtags(self):
+        self.assertGroups(
+            self.groups.tagged_with(all=[self.programming],
+                                    include_subtags=True),
+            self.django_group, self.js_group, self.python_group
+        )
+        self.assertGroups(
+            self.groups.tagged_with(none=[self.python], include_subtags=True),
+            self.js_group, self.tagging_group, self.untagged_group
+        )
+
+    def test_tagged_with_nonexisting_tag_ERROR(self):
+        with self.assertRaises(NoSuchTagError):
+            self.groups.tagged_with(any=['Rust'])
+
+
+@override_settings(TAGGSONOMY_HIERARCHY='cte')
+class RecursiveQueryTaggedWithTests(TaggedWithTests):
+    """
+    Tests for filtering taggable querysets by tags, without a closure table
+    """
@@ -0,0 +1,139 @@
+from django.contrib.auth.models import Group, User
+from django.db import connection
+from django.db.models.signals import pre_delete
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from django_taggsonomy.models import TagSet
+from django_taggsonomy.registry import (_registry, get_taggable_models,
+                                       is_taggable, register)
+from django_taggsonomy.utils import (get_or_create_tagset_for_object,
+                                     get_tagset_for_object)
+
+from .test_models.mixins import FixtureSetupMixin
+from .testapp.models import Article
+
+
+class TagSetDeletionTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for deleting the tag sets of deleted objects of taggable models
+    """
+    fixtures = ['tags.json']
+
+    def setUp(self):
+        super(TagSetDeletionTests, self).setUp()
+        self.user = User.objects.create(username='user')
+        get_or_create_tagset_for_object(self.user).add(self.python)
+
+    def tearDown(self):
+        _registry.discard(User)
+
+    def create_groups(self, number):
+        groups = [Group.objects.create(name='Group {}'.format(index))
+                  for index in range(number)]
+        TagSet.objects.bulk_add(groups, self.django)
+        return Group.objects.filter(id__in=[group.id for group in groups])
+
+    def test_is_taggable(self):
+        self.assertTrue(is_taggable(Group))
+        self.assertFalse(is_taggable(User))
+        self.assertIs(register(User), User)
+        self.assertTrue(is_taggable(User))
+
+    def test_tagsets_of_taggable_models_are_deleted(self):
+        groups = self.create_groups(2)
+        groups.delete()
+        self.assertFalse(TagSet.objects.filter(content_type__model='group'))
+        self.assertEqual(self.django.usage_count(), 0)
+        self.assertEqual(self.python.usage_count(), 1)
+
+    def test_tagsets_of_other_models_are_kept(self):
+        user_id = self.user.id
+        self.user.delete()
+        self.assertTrue(TagSet.objects.filter(content_type__model='user',
+                                              object_id=user_id))
+
+    @override_settings(TAGGSONOMY_TAGGABLE_MODELS=['auth.User'])
+    def test_taggable_models_setting(self):
+        self.user.delete()
+        self.assertFalse(TagSet.objects.filter(content_type__model='user'))
+
+    def test_bulk_deletion_takes_constant_queries(self):
+        groups = self.create_groups(2)
+        with CaptureQueriesContext(connection) as context:
+            groups.delete()
+        groups = self.create_groups(6)
+        with self.assertNumQueries(len(context.captured_queries)):
+            groups.delete()
+
+    def test_other_models_are_fast_deleted(self):
+        # Deleting groups deletes the user-group relations without fetching
+        # them, which would be impossible with receivers for all models.
+        self.user.groups.add(*self.create_groups(2))
+        with CaptureQueriesContext(connection) as context:
+            Group.objects.all().delete()
+        self.assertFalse(any(
+            query['sql'].startswith('SELECT') and 'auth_user_groups' in
+            query['sql'] for query in context.captured_queries
+        ))
+
+    def test_rolled_back_deletions_are_ignored(self):
+        group, other_group = self.create_groups(2)
+        # As if the deletion of the group had failed after `pre_delete`
+        pre_delete.send(sender=Group, instance=group)
+        other_group.delete()
+        self.assertIsNotNone(get_tagset_for_object(group))
+        self.assertIsNone(get_tagset_for_object(other_group))
+
+
+class TaggableDecoratorTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for models decorated with `taggable`
+    """
+    fixtures = ['tags.json']
+
+    def create_articles(self, number):
+        articles = [Article.objects.create(title='Article {}'.format(index))
+                    for index in range(number)]
+        TagSet.objects.bulk_add(articles, self.django)
+        return Article.objects.filter(id__in=[article.id
+                                              for article in articles])
+
+    def test_article_is_taggable(self):
+        self.assertTrue(is_taggable(Article))
+        self.assertIn(Article, get_taggable_models())
+        self.assertIn(Group, get_taggable_models())
+        self.assertNotIn(User, get_taggable_models())
+
+    def test_tagsets_are_joined(self):
+        tagged = list(self.create_articles(2))
+        Article.objects.create(title='Untagged')
+        self.assertQuerySetEqual(
+            Article.objects.filter(tagsets___tags=self.python).order_by('id'),
+            tagged
+        )
+        with self.assertNumQueries(3):
+            articles = list(Article.objects.prefetch_related('tagsets___tags'))
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [{tag.name for tagset in article.tagsets.all()
+                  for tag in tagset._tags.all()} for article in articles],
+                [{'Django', 'Python', 'Programming'}] * 2 + [set()]
+            )
+
+    def test_tagsets_are_deleted(self):
+        articles = self.create_articles(2)
+        group = Group.objects.create(name='Group')
+        get_or_create_tagset_for_object(group).add(self.django)
+        articles.delete()
+        self.assertFalse(TagSet.objects.filter(content_type__model='article'))
+        self.assertEqual(self.django.usage_count(), 1)
+        self.assertEqual(self.programming.rollup_count(), 1)
+
+    def test_deletion_takes_constant_queries(self):
+        articles = self.create_articles(2)
+        with CaptureQueriesContext(connection) as context:
+            articles.delete()
+        articles = self.create_articles(6)
+        with self.assertNumQueries(len(context.captured_queries)):
+            articles.delete()
@@ -0,0 +1,120 @@
+from django.contrib.auth.models import Group
+from django.test import TestCase, override_settings
+
+from django_taggsonomy.graph import invalidate_graph
+from django_taggsonomy.models import Tag, TagSet
+from django_taggsonomy.suggestions import (_index, get_name_index,
+                                           invalidate_suggestions, NameIndex,
+                                           suggest_tags)
+
+from .test_models.mixins import FixtureSetupMixin
+
+
+class NameIndexTests(TestCase):
+    """
+    Tests for the sorted array of tag names
+    """
+
+    def setUp(self):
+        self.index = NameIndex(
+            tags=[(1, 'Python', 'blue'), (2, 'pytest', 'green'),
+                  (3, 'PyPI', 'red'), (4, 'Django', 'green'),
+                  (5, 'python', 'blue')],
+            counts={1: 2, 2: 5, 4: 9}
+        )
+
+    def get_names(self, *args, **kwargs):
+        return [record.name for record in self.index.suggest(*args, **kwargs)]
+
+    def test_prefix(self):
+        self.assertEqual(self.get_names('PY', 10),
+                         ['PyPI', 'pytest', 'Python', 'python'])
+        self.assertEqual(self.get_names('pyth', 1), ['Python'])
+        self.assertEqual(self.get_names('', 2), ['Django', 'PyPI'])
+        self.assertEqual(self.get_names('ython', 10), [])
+        self.assertEqual(self.index.suggest('dj', 10)[0],
+                         (4, 'Django', 'green'))
+
+    def test_after(self):
+        self.assertEqual(self.get_names('py', 10, after='pytest'),
+                         ['Python', 'python'])
+        self.assertEqual(self.get_names('py', 10, after='Python'), ['python'])
+        self.assertEqual(self.get_names('py', 10, after='zope'), [])
+
+    def test_popularity(self):
+        self.assertEqual(self.get_names('py', 3, order='popularity'),
+                         ['pytest', 'Python', 'PyPI'])
+
+    def test_exclude_ids(self):
+        self.assertEqual(self.get_names('py', 10, exclude_ids={1, 3}),
+                         ['pytest', 'python'])
+
+
+@override_settings(TAGGSONOMY_SUGGESTION_INDEX=True)
+class SuggestionTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for suggesting tags from the process-local name index
+    """
+    fixtures = ['tags.json']
+
+    @classmethod
+    def setUpClass(cls):
+        # Let the index and the tag graph be kept, as if the fixtures had been
+        # committed.
+        with cls.captureOnCommitCallbacks(execute=True):
+            super(SuggestionTests, cls).setUpClass()
+
+    def tearDown(self):
+        # The test case's changes are rolled back, so don't keep the index.
+        invalidate_suggestions()
+        invalidate_graph()
+
+    def get_names(self, *args, **kwargs):
+        return [record.name for record in suggest_tags(*args, **kwargs)]
+
+    def test_suggestions_are_answered_from_memory(self):
+        get_name_index()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_names('p', 10),
+                             ['Programming', 'Python'])
+
+    def test_unsuitable_tags_are_left_out(self):
+        tagset = TagSet.objects.create()
+        tagset.add(self.tagging)
+        # Knowledge Management excludes Programming and thus its subtags.
+        self.assertEqual(self.get_names('', 10, tagset_id=tagset.id),
+                         ['Taggsonomy', 'Web Development'])
+
+    def test_saving_a_tag_rebuilds_the_index(self):
+        index = get_name_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.python.name = 'Python 3'
+            self.python.save()
+            Tag.objects.get_tags_from_arguments('Pyramid',
+                                                create_nonexisting=True)
+        self.assertIsNot(get_name_index(), index)
+        self.assertEqual(self.get_names('py', 10), ['Pyramid', 'Python 3'])
+
+    def test_uncommitted_tags_are_not_kept(self):
+        Tag.objects.create(name='Rust')
+        self.assertEqual(self.get_names('r', 10), ['Rust'])
+        self.assertIsNone(_index.value)
+
+    def test_usage_counts_are_updated_on_commit(self):
+        index = get_name_index()
+        group, other_group = (Group.objects.create(name=name)
+                              for name in ('Group', 'Other group'))
+        with self.captureOnCommitCallbacks(execute=True):
+            TagSet.objects.bulk_add([group, other_group], self.javascript)
+        self.assertIs(get_name_index(), index)
+        self.assertEqual(index.counts[self.javascript.id], 2)
+        self.assertEqual(
+            self.get_names('', 2, order='popularity'),
+            ['JavaScript', 'Programming']
+        )
+
+    def test_invalid_order(self):
+        with self.assertRaises(ValueError):
+            suggest_tags('py', 10, order='usage')
+        with self.assertRaises(ValueError):
+            suggest_tags('py', 10, after='Python', order='popularity')
@@ -0,0 +1,74 @@
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.template import Context, Engine
+from django.test import override_settings, TestCase
+
+from django_taggsonomy.templatetags import taggsonomy
+from django_taggsonomy.utils import get_or_create_tagset_for_object
+
+from .test_models.mixins import FixtureSetupMixin
+
+
+@override_settings(ROOT_URLCONF='tests.urls')
+class TagItemsTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for rendering many tags at once
+    """
+    fixtures = ['tags.json']
+
+    def setUp(self):
+        super(TagItemsTests, self).setUp()
+        self.engine = Engine(
+            loaders=['django.template.loaders.app_directories.Loader'],
+            libraries={'static': 'django.templatetags.static',
+                       'taggsonomy': 'django_taggsonomy.templatetags.taggsonomy'}
+        )
+        self.group = Group.objects.create(name='Group')
+        self.group_tagset = get_or_create_tagset_for_object(self.group)
+        self.group_tagset.add(self.django, self.javascript)
+
+    def render(self, template_string, **context):
+        return self.engine.from_string(
+            '{% load taggsonomy %}' + template_string
+        ).render(Context(context))
+
+    def assertRendersLikeTagTemplatetag(self, tags, removable_from=None,
+                                        url=''):
+        self.assertEqual(
+            self.render('{% for tag in tags %}\n    {% tag tag '
+                        'removable_from=removable_from url=url %}\n  '
+                        '{% endfor %}', tags=tags,
+                        removable_from=removable_from, url=url),
+            self.render('{% tag_items tags removable_from=removable_from '
+                        'url=url %}', tags=tags,
+                        removable_from=removable_from, url=url)
+        )
+
+    def test_output_is_identical(self):
+        tags = list(self.group_tagset.all())
+        self.assertRendersLikeTagTemplatetag(tags)
+        self.assertRendersLikeTagTemplatetag(tags, url='/tags/{tag.id}/')
+        self.assertRendersLikeTagTemplatetag(tags, self.group_tagset)
+        for removable_from in (self.python.exclusions, self.python.subtags,
+                               self.python.supertags):
+            self.assertRendersLikeTagTemplatetag(tags, removable_from,
+                                                 url='{tag.name}')
+        self.assertRendersLikeTagTemplatetag([])
+
+    def test_removal_url_is_reversed_once(self):
+        with mock.patch.object(taggsonomy, 'reverse',
+                               wraps=taggsonomy.reverse) as reverse:
+            html = self.render('{% active_tags group %}', group=self.group)
+        reverse.assert_called_once()
+        self.assertIn('href=/tags/{}/remove/{}>'.format(self.group_tagset.id,
+                                                         self.javascript.id),
+                      html)
+
+    def test_add_tags_form_does_not_list_all_tags(self):
+        with self.assertNumQueries(1):
+            html = self.render('{% add_tags_form group %}', group=self.group)
+        self.assertNotIn('<option', html)
+        self.assertIn('data-autocomplete-url="/tags/autocomplete?tagset={}"'
+                      .format(self.group_tagset.id), html)
+        self.assertIn('taggsonomy/autocomplete.js', html)
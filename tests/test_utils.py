@@ -0,0 +1,160 @@
+from django.contrib.auth.models import Group, Permission
+from django.template import Context, Engine
+from django.test import TestCase, override_settings
+
+from django_taggsonomy.models import Tag, TagSet
+from django_taggsonomy.querysets import TaggableQuerySet
+from django_taggsonomy.utils import (facet_counts,
+                                     get_or_create_tagset_for_object,
+                                     get_or_create_tagsets_for_objects,
+                                     get_tagset_for_object, prefetch_tags)
+
+from .test_models.mixins import FixtureSetupMixin
+
+
+class GetOrCreateTagSetsForObjectsTests(TestCase):
+    """
+    Tests for getting or creating the tag sets of many objects at once
+    """
+
+    def setUp(self):
+        self.groups = [Group.objects.create(name='Group {}'.format(number))
+                       for number in range(3)]
+        self.permission = Permission.objects.first()
+        self.existing_tagset = get_or_create_tagset_for_object(self.groups[0])
+        # Make sure content types are cached
+        get_or_create_tagset_for_object(self.permission).delete()
+
+    def test_get_or_create_tagsets_for_objects(self):
+        objects = [*self.groups, self.permission]
+        with self.assertNumQueries(6):
+            # 1 query each for existing and created tag sets of each model,
+            # plus one for creating them
+            tagsets = get_or_create_tagsets_for_objects(objects)
+        self.assertEqual(tagsets.keys(), set(objects))
+        self.assertEqual(tagsets[self.groups[0]], self.existing_tagset)
+        for object_, tagset in tagsets.items():
+            self.assertEqual(tagset, get_or_create_tagset_for_object(object_))
+        self.assertEqual(TagSet.objects.count(), 4)
+
+    def test_get_existing_tagsets_for_objects(self):
+        get_or_create_tagsets_for_objects(self.groups)
+        with self.assertNumQueries(1):
+            tagsets = get_or_create_tagsets_for_objects(self.groups)
+        self.assertEqual(len(set(tagsets.values())), 3)
+
+    def test_unsaved_objects_ERROR(self):
+        with self.assertRaises(ValueError):
+            get_or_create_tagsets_for_objects([self.groups[0], Group()])
+
+
+class PrefetchTagsTests(TestCase):
+    """
+    Tests for fetching the tags of many objects at once
+    """
+
+    def setUp(self):
+        self.tag = Tag.objects.create(name='foo')
+        self.groups = [Group.objects.create(name='Group {}'.format(number))
+                       for number in range(3)]
+        for group in self.groups:
+            get_or_create_tagset_for_object(group).add(self.tag)
+        self.engine = Engine(
+            loaders=['django.template.loaders.app_directories.Loader'],
+            libraries={'taggsonomy': 'django_taggsonomy.templatetags.taggsonomy'}
+        )
+
+    def test_prefetch_tags(self):
+        groups = [*Group.objects.all()]
+        with self.assertNumQueries(2):
+            prefetch_tags(groups)
+        with self.assertNumQueries(0):
+            for group in groups:
+                self.assertEqual([*get_tagset_for_object(group).all()],
+                                 [self.tag])
+
+    def test_prefetch_tags_on_queryset(self):
+        queryset = TaggableQuerySet(model=Group).prefetch_tags()
+        with self.assertNumQueries(3):
+            groups = [*queryset.filter(name__startswith='Group')]
+        with self.assertNumQueries(3):
+            self.assertEqual(len(queryset), 3)
+            self.assertEqual(len([*queryset]), 3)
+        with self.assertNumQueries(0):
+            for group in groups:
+                self.assertIn(self.tag, get_or_create_tagset_for_object(group))
+
+    def test_tags_templatetag_uses_prefetched_tags(self):
+        template = self.engine.from_string(
+            '{% load taggsonomy %}{% for group in groups %}{% tags group %}'
+            '{% endfor %}'
+        )
+        groups = [*TaggableQuerySet(model=Group).prefetch_tags()]
+        with self.assertNumQueries(0):
+            html = template.render(Context({'groups': groups}))
+        self.assertEqual(html.count('foo'), 3)
+
+
+class FacetCountsTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for counting the objects of a queryset per tag
+    """
+    fixtures = ['tags.json']
+
+    def setUp(self):
+        super(FacetCountsTests, self).setUp()
+        self.groups = [Group.objects.create(name='Group {}'.format(number))
+                       for number in range(4)]
+        get_or_create_tagset_for_object(self.groups[0]).add(self.django)
+        get_or_create_tagset_for_object(self.groups[1]).add(self.javascript)
+        # Tagged with a subtag only, without its supertags
+        get_or_create_tagset_for_object(self.groups[2])._tags.add(self.python)
+        get_or_create_tagset_for_object(self.groups[3]).add(self.tagging)
+        # Not in the queryset
+        get_or_create_tagset_for_object(Permission.objects.first()).add(
+            self.python
+        )
+        self.queryset = Group.objects.filter(name__in=['Group 0', 'Group 1',
+                                                       'Group 2'])
+
+    def test_facet_counts(self):
+        with self.assertNumQueries(1):
+            counts = facet_counts(self.queryset)
+        self.assertEqual(counts, {
+            self.django.id: 1, self.python.id: 2, self.programming.id: 2,
+            self.javascript.id: 1, self.web_development.id: 1,
+        })
+
+    def test_facet_counts_for_given_tags(self):
+        self.assertEqual(
+            facet_counts(self.queryset, tags=['Python', self.tagging]),
+            {self.python.id: 2}
+        )
+
+    def test_rollup_facet_counts(self):
+        with self.assertNumQueries(1):
+            counts = facet_counts(self.queryset, rollup=True)
+        self.assertEqual(counts[self.programming.id], 3)
+        self.assertEqual(counts[self.python.id], 2)
+        self.assertNotIn(self.tagging.id, counts)
+        self.assertEqual(
+            TaggableQuerySet(model=Group).facet_counts(
+                tags=[self.programming, self.knowledge_management],
+                rollup=True
+            ),
+            {self.programming.id: 3, self.knowledge_management.id: 1}
+        )
+
+    def test_facet_counts_of_empty_querysets(self):
+        for queryset in (Group.objects.none(),
+                         Group.objects.filter(pk__in=[])):
+            for rollup in (False, True):
+                self.assertEqual(facet_counts(queryset, rollup=rollup), {})
+
+
+@override_settings(TAGGSONOMY_HIERARCHY='cte')
+class RecursiveQueryFacetCountsTests(FacetCountsTests):
+    """
+    Tests for counting the objects of a queryset per tag, without a closure
+    table
+    """
@@ -0,0 +1,91 @@
+from django.contrib.auth.models import Group
+from django.test import override_settings, TestCase
+from django.urls import reverse
+
+from django_taggsonomy.models import Tag, TagSet
+from django_taggsonomy.suggestions import invalidate_suggestions
+
+from .test_models.mixins import FixtureSetupMixin
+
+
+@override_settings(ROOT_URLCONF='tests.urls')
+class AutocompleteTests(FixtureSetupMixin, TestCase):
+    """
+    Tests for the autocomplete view for tag names
+    """
+    fixtures = ['tags.json']
+
+    def setUp(self):
+        super(AutocompleteTests, self).setUp()
+        self.pytest, _, _ = (Tag.objects.create(name=name)
+                             for name in ('pytest', 'PyPI', 'Pyramid'))
+
+    def get(self, **params):
+        response = self.client.get(reverse('taggsonomy:autocomplete-tags'),
+                                   params)
+        return response.status_code, response.json()
+
+    def get_names(self, **params):
+        return [tag['name'] for tag in self.get(**params)[1]['results']]
+
+    def test_prefix_matching_ignores_case(self):
+        self.assertEqual(self.get_names(q='py'),
+                         ['PyPI', 'Pyramid', 'pytest', 'Python'])
+        self.assertEqual(self.get_names(q='PYT'), ['pytest', 'Python'])
+        self.assertEqual(self.get_names(q='ython'), [])
+        self.assertEqual(self.get(q='dj')[1]['results'], [
+            {'id': self.django.id, 'name': 'Django',
+             'color': self.django.color}
+        ])
+
+    def test_pagination(self):
+        status, data = self.get(q='py', limit=3)
+        self.assertEqual([tag['name'] for tag in data['results']],
+                         ['PyPI', 'Pyramid', 'pytest'])
+        self.assertTrue(data['more'])
+        status, data = self.get(q='py', limit=3, after='pytest')
+        self.assertEqual([tag['name'] for tag in data['results']],
+                         ['Python'])
+        self.assertFalse(data['more'])
+
+    @override_settings(TAGGSONOMY_AUTOCOMPLETE_LIMIT=2)
+    def test_limit_is_capped(self):
+        self.assertEqual(self.get_names(q='py', limit=100),
+                         ['PyPI', 'Pyramid'])
+
+    def test_tags_of_tagset_are_left_out(self):
+        tagset = TagSet.objects.create()
+        tagset.add(self.python)
+        self.assertEqual(self.get_names(q='py', tagset=tagset.id),
+                         ['PyPI', 'Pyramid', 'pytest'])
+
+    def test_tags_excluded_by_tagset_are_left_out(self):
+        tagset = TagSet.objects.create()
+        tagset.add(self.tagging)
+        # Knowledge Management excludes Programming and thus its subtags.
+        self.assertEqual(self.get_names(q='', tagset=tagset.id),
+                         ['PyPI', 'Pyramid', 'pytest', 'Taggsonomy',
+                          'Web Development'])
+
+    def test_popularity(self):
+        group = Group.objects.create(name='Group')
+        TagSet.objects.bulk_add([group], self.pytest)
+        self.assertEqual(self.get_names(q='py', order='popularity'),
+                         ['pytest', 'PyPI', 'Pyramid', 'Python'])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.get(q='py', limit='many')[0], 400)
+        self.assertEqual(self.get(q='py', order='usage')[0], 400)
+        self.assertEqual(self.get(q='py', order='popularity',
+                                  after='PyPI')[0], 400)
+
+
+@override_settings(TAGGSONOMY_SUGGESTION_INDEX=True)
+class IndexedAutocompleteTests(AutocompleteTests):
+    """
+    Tests for the autocomplete view with the suggestion index
+    """
+
+    def tearDown(self):
+        # The test case's changes are rolled back, so don't keep the index.
+        invalidate_suggestions()
@@ -0,0 +1,8 @@
+from django.db import models
+
+from django_taggsonomy.registry import taggable
+
+
+@taggable
+class Article(models.Model):
+    title = models.CharField(max_length=100)
@@ -0,0 +1,6 @@
+from django.urls import include, path
+
+
+urlpatterns = [
+    path('tags/', include('django_taggsonomy.urls')),
+]